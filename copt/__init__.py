@@ -5,12 +5,23 @@ from . import datasets
 from . import tv_prox
 from . import utils
 from . import loss
+from . import operators
 from . import constraint
+from . import screening
+from . import path
+from .coordinate_descent import minimize_coordinate_descent
 from .frank_wolfe import minimize_frank_wolfe
+from .newton import minimize_newton_cg
+from .newton import minimize_proximal_lbfgs
+from .newton import minimize_subsampled_newton
 from .proximal_gradient import minimize_proximal_gradient
 from .randomized import minimize_saga
 from .randomized import minimize_svrg
 from .randomized import minimize_vrtos
 from .randomized import minimize_sfw
+from .randomized import minimize_prox_sgd
+from .randomized import minimize_sdca
+from .screening import minimize_screened
+from .screening import minimize_working_set
 from .splitting import minimize_primal_dual
 from .splitting import minimize_three_split
@@ -0,0 +1,434 @@
+"""Coordinate descent with residual updates."""
+import numpy as np
+from scipy import linalg, optimize, sparse
+
+from copt import loss as loss_module
+from copt import penalty as penalty_module
+from copt import utils
+
+_SQUARE, _LOG = 0, 1
+
+
+@utils.njit
+def _deriv(z, y, kind):
+    # .. derivative of the loss of one sample at the margin z ..
+    if kind == _SQUARE:
+        return z - y
+    if z < 0:
+        exp_z = np.exp(z)
+        return exp_z / (1 + exp_z) - y
+    return 1 / (1 + np.exp(-z)) - y
+
+
+@utils.njit
+def _block_step(blk, x, grad, block_ptr, block_alpha, lipschitz, l2, lower, upper, tmp):
+    """New coefficients of the block blk in tmp given the gradient of the
+    loss, returns the norm of the change."""
+    start, end = block_ptr[blk], block_ptr[blk + 1]
+    L = lipschitz[blk]
+    norm2 = 0.0
+    for j in range(start, end):
+        v = x[j] - (grad[j - start] + l2 * x[j]) / L
+        tmp[j - start] = v
+        norm2 += v * v
+    # .. group soft thresholding, the soft thresholding for a single feature ..
+    factor = 1.0
+    if block_alpha[blk] > 0:
+        norm = np.sqrt(norm2)
+        if norm <= block_alpha[blk] / L:
+            factor = 0.0
+        else:
+            factor = 1 - block_alpha[blk] / (L * norm)
+    change = 0.0
+    for j in range(start, end):
+        v = min(max(factor * tmp[j - start], lower[j]), upper[j])
+        tmp[j - start] = v
+        change += (v - x[j]) ** 2
+    return np.sqrt(change)
+
+
+@utils.njit
+def _column_grad(j, z, b, c, kind, data, indices, indptr):
+    g = 0.0
+    for p in range(indptr[j], indptr[j + 1]):
+        i = indices[p]
+        g += c[i] * data[p] * _deriv(z[i], b[i], kind)
+    return g
+
+
+@utils.njit(nogil=True)
+def _cd_epoch(
+    x,
+    z,
+    order,
+    b,
+    c,
+    kind,
+    data,
+    indices,
+    indptr,
+    block_ptr,
+    block_alpha,
+    lipschitz,
+    l2,
+    lower,
+    upper,
+    grad,
+    tmp,
+):
+    """Updates the blocks in order, returns the largest change."""
+    max_change = 0.0
+    for blk in order:
+        if lipschitz[blk] == 0:
+            continue
+        start, end = block_ptr[blk], block_ptr[blk + 1]
+        for j in range(start, end):
+            grad[j - start] = _column_grad(j, z, b, c, kind, data, indices, indptr)
+        change = _block_step(
+            blk, x, grad, block_ptr, block_alpha, lipschitz, l2, lower, upper, tmp
+        )
+        max_change = max(max_change, change)
+        # .. update the margins with the columns of the block ..
+        for j in range(start, end):
+            delta = tmp[j - start] - x[j]
+            if delta != 0:
+                for p in range(indptr[j], indptr[j + 1]):
+                    z[indices[p]] += delta * data[p]
+                x[j] = tmp[j - start]
+    return max_change
+
+
+@utils.njit
+def _sift_up(heap, pos, key, k):
+    while k > 0:
+        parent = (k - 1) // 2
+        if key[heap[parent]] >= key[heap[k]]:
+            break
+        heap[parent], heap[k] = heap[k], heap[parent]
+        pos[heap[parent]] = parent
+        pos[heap[k]] = k
+        k = parent
+
+
+@utils.njit
+def _sift_down(heap, pos, key, k):
+    n = heap.size
+    while True:
+        largest = k
+        for child in (2 * k + 1, 2 * k + 2):
+            if child < n and key[heap[child]] > key[heap[largest]]:
+                largest = child
+        if largest == k:
+            break
+        heap[largest], heap[k] = heap[k], heap[largest]
+        pos[heap[largest]] = largest
+        pos[heap[k]] = k
+        k = largest
+
+
+@utils.njit
+def _set_key(heap, pos, key, blk, value):
+    old = key[blk]
+    key[blk] = value
+    if value > old:
+        _sift_up(heap, pos, key, pos[blk])
+    else:
+        _sift_down(heap, pos, key, pos[blk])
+
+
+@utils.njit(nogil=True)
+def _greedy_epoch(
+    x,
+    z,
+    n_updates,
+    b,
+    c,
+    kind,
+    data,
+    indices,
+    indptr,
+    row_data,
+    row_indices,
+    row_indptr,
+    feature_block,
+    block_ptr,
+    block_alpha,
+    lipschitz,
+    l2,
+    lower,
+    upper,
+    full_grad,
+    tmp,
+):
+    """Gauss-Southwell: updates the block whose change is the largest.
+
+    The gradient of the loss full_grad is updated with the rows of the
+    samples whose margin changes, and the changes of the blocks are kept
+    in a max-heap, updated for the blocks that share one of these rows.
+    Returns the largest change at the start of the epoch.
+    """
+    n_blocks = block_ptr.size - 1
+    # .. recompute the gradient, to avoid the accumulation of rounding errors ..
+    for j in range(x.size):
+        full_grad[j] = _column_grad(j, z, b, c, kind, data, indices, indptr)
+    key = np.zeros(n_blocks)
+    for blk in range(n_blocks):
+        if lipschitz[blk] > 0:
+            start = block_ptr[blk]
+            key[blk] = _block_step(
+                blk, x, full_grad[start:], block_ptr, block_alpha, lipschitz,
+                l2, lower, upper, tmp,
+            )
+    heap = np.argsort(-key)
+    pos = np.empty(n_blocks, dtype=np.int64)
+    for k in range(n_blocks):
+        pos[heap[k]] = k
+    max_change = key[heap[0]]
+    dirty = np.zeros(n_blocks, dtype=np.bool_)
+    dirty_list = np.empty(n_blocks, dtype=np.int64)
+    for _ in range(n_updates):
+        blk = heap[0]
+        if key[blk] == 0:
+            break
+        start, end = block_ptr[blk], block_ptr[blk + 1]
+        _block_step(
+            blk, x, full_grad[start:], block_ptr, block_alpha, lipschitz, l2,
+            lower, upper, tmp,
+        )
+        n_dirty = 1
+        dirty[blk] = True
+        dirty_list[0] = blk
+        for j in range(start, end):
+            delta = tmp[j - start] - x[j]
+            if delta == 0:
+                continue
+            x[j] = tmp[j - start]
+            for p in range(indptr[j], indptr[j + 1]):
+                i = indices[p]
+                old = _deriv(z[i], b[i], kind)
+                z[i] += delta * data[p]
+                diff = c[i] * (_deriv(z[i], b[i], kind) - old)
+                for q in range(row_indptr[i], row_indptr[i + 1]):
+                    k = row_indices[q]
+                    full_grad[k] += diff * row_data[q]
+                    h = feature_block[k]
+                    if not dirty[h]:
+                        dirty[h] = True
+                        dirty_list[n_dirty] = h
+                        n_dirty += 1
+        for d in range(n_dirty):
+            h = dirty_list[d]
+            dirty[h] = False
+            value = 0.0
+            if lipschitz[h] > 0:
+                value = _block_step(
+                    h, x, full_grad[block_ptr[h]:], block_ptr, block_alpha,
+                    lipschitz, l2, lower, upper, tmp,
+                )
+            _set_key(heap, pos, key, h, value)
+    return max_change
+
+
+def _blocks(penalty, n_features):
+    """Block structure: first feature of each block and its penalty."""
+    if isinstance(penalty, penalty_module.GroupL1):
+        starts, alphas = [], []
+        feature = 0
+        for g in penalty.groups:
+            # .. features in no group are unpenalized blocks of size one ..
+            while feature < g[0]:
+                starts.append(feature)
+                alphas.append(0.0)
+                feature += 1
+            starts.append(g[0])
+            alphas.append(penalty.alpha)
+            feature = g[-1] + 1
+        starts.extend(range(feature, n_features))
+        alphas.extend([0.0] * (n_features - feature))
+        return np.array(starts + [n_features]), np.array(alphas, dtype=np.float64)
+    block_ptr = np.arange(n_features + 1)
+    if isinstance(penalty, penalty_module.L1Norm):
+        return block_ptr, np.full(n_features, float(penalty.alpha))
+    if penalty is None:
+        return block_ptr, np.zeros(n_features)
+    raise ValueError(
+        "minimize_coordinate_descent supports L1Norm and GroupL1 penalties, got %s"
+        % type(penalty).__name__
+    )
+
+
+def minimize_coordinate_descent(
+    loss,
+    penalty=None,
+    x0=None,
+    bounds=None,
+    selection="cyclic",
+    max_iter=100,
+    tol=1e-6,
+    verbose=0,
+    callback=None,
+):
+    """Coordinate descent for linear models with separable penalties.
+
+    Solves problems of the form
+
+        minimize_x loss(x) + penalty(x) subject to lower <= x <= upper
+
+    where loss is a SquareLoss or LogLoss. Each update minimizes the
+    quadratic upper bound of the loss along one coordinate (with GroupL1
+    along one group), with the Lipschitz constant of the loss in this
+    coordinate (in this group), and applies the proximal operator of the
+    penalty. The solver works on a CSC copy of the data matrix and keeps the
+    margins A x up to date, so that an update costs the number of nonzeros
+    of its columns.
+
+    Args:
+      loss: SquareLoss or LogLoss
+          Loss without intercept and offset. Its sample weights, scale and
+          squared l2 regularization alpha are taken into account.
+
+      penalty: L1Norm, GroupL1 or None
+          Penalty. With GroupL1, the groups are updated as blocks and the
+          features in no group are not penalized.
+
+      x0: array of shape (n_features,), optional
+          Initial guess, zero by default.
+
+      bounds: tuple (lower, upper), optional
+          Box constraints, scalars or arrays of shape (n_features,). They
+          cannot be combined with GroupL1.
+
+      selection: {"cyclic", "shuffle", "greedy"}
+          Order of the updates. "cyclic" visits the coordinates in order,
+          "shuffle" in a random order at each epoch and "greedy" updates the
+          coordinate with the largest change (Gauss-Southwell rule), kept
+          in a max-heap. The greedy rule also maintains the gradient, with a
+          CSR copy of the data matrix, at a cost per update that is the
+          number of nonzeros of the rows of the updated columns.
+
+      max_iter: int
+          Maximum number of epochs, an epoch being n_features updates.
+
+      tol: float
+          The algorithm stops when the largest change of a coordinate
+          (with GroupL1 the norm of the change of a group) in an epoch is
+          below tol.
+
+      verbose: int
+          Verbosity level.
+
+      callback: callable, optional
+          Called after each epoch with the local variables. The algorithm
+          exits if it returns False.
+
+    Returns:
+      res: OptimizeResult
+          The optimization result, with the solution x, success,
+          certificate (the largest change in the last epoch) and nit (the
+          number of epochs).
+
+    References:
+      Friedman, Jerome, Trevor Hastie, and Rob Tibshirani. `"Regularization
+      paths for generalized linear models via coordinate descent."
+      <https://www.jstatsoft.org/v33/i01>`_ Journal of Statistical Software
+      33.1 (2010).
+
+      Nutini, Julie, et al. `"Coordinate descent converges faster with the
+      Gauss-Southwell rule than random selection."
+      <https://arxiv.org/abs/1506.00552>`_ International Conference on
+      Machine Learning (2015).
+    """
+    if isinstance(loss, loss_module.LogLoss):
+        kind, curvature = _LOG, 0.25
+    elif isinstance(loss, loss_module.SquareLoss):
+        kind, curvature = _SQUARE, 1.0
+    else:
+        raise ValueError("minimize_coordinate_descent supports SquareLoss and LogLoss")
+    if loss.intercept or loss.offset is not None:
+        raise ValueError("minimize_coordinate_descent does not support intercepts")
+    if selection not in ("cyclic", "shuffle", "greedy"):
+        raise ValueError("Unknown selection %s" % selection)
+    if utils.is_linear_operator(loss.A):
+        raise ValueError("minimize_coordinate_descent requires the columns of A")
+
+    A = sparse.csc_matrix(loss.A, dtype=np.float64)
+    if loss.scale is not None:
+        A = sparse.csc_matrix(A @ sparse.diags(loss.scale))
+    A.sort_indices()
+    n_samples, n_features = A.shape
+    b = np.asarray(loss.b, dtype=np.float64).ravel()
+    weights = loss.sample_weight
+    c = np.full(n_samples, 1.0 / n_samples) if weights is None else (
+        weights / weights.sum()
+    )
+    block_ptr, block_alpha = _blocks(penalty, n_features)
+    n_blocks = block_alpha.size
+
+    lower = np.full(n_features, -np.inf)
+    upper = np.full(n_features, np.inf)
+    if bounds is not None:
+        if isinstance(penalty, penalty_module.GroupL1):
+            raise ValueError("bounds cannot be combined with GroupL1")
+        lower[:] = bounds[0]
+        upper[:] = bounds[1]
+        if np.any(lower > upper):
+            raise ValueError("lower bounds should not exceed upper bounds")
+
+    # .. Lipschitz constant of the loss in each block ..
+    col_norms = np.asarray(A.multiply(A).T.dot(c)).ravel()
+    lipschitz = np.empty(n_blocks)
+    for blk in range(n_blocks):
+        start, end = block_ptr[blk], block_ptr[blk + 1]
+        if end - start == 1:
+            lipschitz[blk] = col_norms[start]
+        else:
+            A_g = A[:, start:end]
+            gram = (A_g.T @ sparse.diags(c) @ A_g).toarray()
+            lipschitz[blk] = linalg.eigvalsh(gram)[-1]
+    lipschitz = curvature * lipschitz + loss.alpha
+
+    if x0 is None:
+        x = np.zeros(n_features)
+    else:
+        x = np.array(x0, dtype=np.float64).ravel()
+    x = np.clip(x, lower, upper)
+    z = A.dot(x)
+    max_block = int(np.diff(block_ptr).max()) if n_features else 1
+    tmp = np.zeros(max_block)
+    if selection == "greedy":
+        A_csr = A.tocsr()
+        feature_block = np.repeat(np.arange(n_blocks), np.diff(block_ptr))
+        grad = np.zeros(n_features)
+    else:
+        grad = np.zeros(max_block)
+
+    success = False
+    certificate = np.inf
+    it = 0
+    for it in range(1, max_iter + 1):
+        if selection == "greedy":
+            certificate = _greedy_epoch(
+                x, z, n_blocks, b, c, kind, A.data, A.indices, A.indptr,
+                A_csr.data, A_csr.indices, A_csr.indptr, feature_block,
+                block_ptr, block_alpha, lipschitz, loss.alpha, lower, upper,
+                grad, tmp,
+            )
+        else:
+            if selection == "shuffle":
+                order = np.random.permutation(n_blocks)
+            else:
+                order = np.arange(n_blocks)
+            certificate = _cd_epoch(
+                x, z, order, b, c, kind, A.data, A.indices, A.indptr, block_ptr,
+                block_alpha, lipschitz, loss.alpha, lower, upper, grad, tmp,
+            )
+        if verbose:
+            print("Epoch %s, largest change %.3e" % (it, certificate))
+        if callback is not None and callback(locals()) is False:
+            break
+        if certificate < tol:
+            success = True
+            break
+    return optimize.OptimizeResult(
+        x=x, success=success, certificate=certificate, nit=it
+    )
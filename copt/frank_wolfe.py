@@ -20,6 +20,7 @@ def backtracking_step_size(
     max_step_size,
     update_direction,
     norm_update_direction,
+    line_f_grad=None,
 ):
     """Backtracking step-size finding routine for FW-like algorithms
     
@@ -52,6 +53,12 @@ def backtracking_step_size(
         norm_update_direction: float
             Squared L2 norm of update_direction
 
+        line_f_grad: callable or None
+            Restriction of f_grad to a line, see
+            :func:`copt.utils.build_line_f_grad`. If given, trial step-sizes
+            only evaluate the objective and the gradient is computed once,
+            at the accepted step-size.
+
     Returns:
         step_size_t: float
             Step-size to be used to compute the next iterate.
@@ -68,6 +75,9 @@ def backtracking_step_size(
     ratio_decrease = 0.9
     ratio_increase = 2.0
     max_ls_iter = 100
+    if line_f_grad is None:
+        line_f_grad = utils.build_line_f_grad(None, f_grad, (), f_grad)
+    phi = line_f_grad(x, update_direction)
     if old_f_t is not None:
         tmp = (certificate ** 2) / (2 * (old_f_t - f_t) * norm_update_direction)
         lipschitz_t = max(min(tmp, lipschitz_t), lipschitz_t * ratio_decrease)
@@ -81,7 +91,7 @@ def backtracking_step_size(
                 -step_size_t * certificate
                 + 0.5 * (step_size_t ** 2) * lipschitz_t * norm_update_direction
             )
-        f_next, grad_next = f_grad(x + step_size_t * update_direction)
+        f_next = phi(step_size_t)
         if f_next - f_t <= rhs + EPS:
             # .. sufficient decrease condition verified ..
             break
@@ -91,6 +101,7 @@ def backtracking_step_size(
         warnings.warn(
             "Exhausted line search iterations in minimize_frank_wolfe", RuntimeWarning
         )
+    f_next, grad_next = phi(step_size_t, return_gradient=True)
     return step_size_t, lipschitz_t, f_next, grad_next
 
 
@@ -142,7 +153,8 @@ def minimize_frank_wolfe(
         specify the function.
 
     x0: array-like
-      Initial guess for solution.
+      Initial guess for solution. The iterates are float32 if x0 is
+      float32, and float64 otherwise.
 
     lmo: callable
       Takes as input a vector u of same size as x0 and returns both the update
@@ -224,7 +236,8 @@ def minimize_frank_wolfe(
     * :ref:`sphx_glr_auto_examples_frank_wolfe_plot_sparse_benchmark.py`
     * :ref:`sphx_glr_auto_examples_frank_wolfe_plot_vertex_overlap.py`
   """
-    x0 = np.asanyarray(x0, dtype=np.float)
+    x0 = np.asanyarray(x0)
+    x0 = x0.astype(utils.float_dtype(x0), copy=False)
     if tol < 0:
         raise ValueError("Tol must be non-negative")
     x = x0.copy()
@@ -244,6 +257,7 @@ def minimize_frank_wolfe(
         lipschitz_t = lipschitz
 
     func_and_grad = utils.build_func_grad(jac, fun, args, eps)
+    line_f_grad = utils.build_line_f_grad(jac, fun, args, func_and_grad)
 
     f_t, grad = func_and_grad(x)
     old_f_t = None
@@ -279,6 +293,7 @@ def minimize_frank_wolfe(
                 max_step_size,
                 update_direction,
                 norm_update_direction,
+                line_f_grad,
             )
         elif step == "DR":
             if lipschitz is None:
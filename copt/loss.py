@@ -1,12 +1,683 @@
 import numpy as np
-from scipy import sparse, special
+from scipy import linalg, sparse, special
 from scipy.sparse import linalg as splinalg
-from sklearn.utils.extmath import safe_sparse_dot
+from sklearn.utils.extmath import row_norms, safe_sparse_dot
 
-from copt.utils import safe_sparse_add, njit, prange
+from copt.utils import (
+    njit,
+    prange,
+    effective_n_jobs,
+    float_dtype,
+    gram_matrix,
+    is_linear_operator,
+    matvec,
+    power_iteration,
+    rmatvec,
+)
 
+# .. residuals below the smallest normal float32 are flushed to zero when
+# stored in the margins, as subnormal floats slow down the products with
+# A^T that follow ..
+_TINY = np.finfo(np.float32).tiny
 
-class LogLoss:
+
+@njit(nogil=True)
+def _log1pexp_residual(z, y, param):
+    """Return log(1 + exp(z)) - y z and sigmoid(z) - y, computed stably.
+
+    param is unused, see _sample_loss_kernels.
+    """
+    if z > 0:
+        exp_nz = np.exp(-z)
+        return z + np.log1p(exp_nz) - y * z, (1 - y - y * exp_nz) / (1 + exp_nz)
+    exp_z = np.exp(z)
+    return np.log1p(exp_z) - y * z, ((1 - y) * exp_z - y) / (1 + exp_z)
+
+
+@njit(nogil=True)
+def _huber_residual(z, y, delta):
+    """Return the Huber loss of z - y and its derivative, the clipped residual."""
+    r = z - y
+    if r > delta:
+        return delta * (r - 0.5 * delta), delta
+    if r < -delta:
+        return -delta * (r + 0.5 * delta), -delta
+    return 0.5 * r * r, r
+
+
+def _sample_loss_kernels(sample_loss):
+    """Compile the kernels of a loss of the form sum_i l(a_i^T x + c, b_i).
+
+    sample_loss(z, y, param) returns l(z, y) and its derivative with respect
+    to z (the residual), param is a float parameter of the loss. Returns a
+    fused kernel for CSR matrices and a kernel that computes the loss given
+    the margins. Both take the sample weights w, or None for unit weights.
+    """
+
+    @njit(nogil=True, parallel=True)
+    def csr_kernel(
+        A_data,
+        A_indices,
+        A_indptr,
+        b,
+        w,
+        x,
+        c,
+        param,
+        n_features,
+        return_gradient,
+        n_chunks,
+        Ax,
+    ):
+        # .. a single pass over the rows computes the margins, the loss and
+        # the residuals and scatters the latter into one gradient buffer
+        # per chunk of rows. Returns the (unnormalized) sums over samples
+        # and stores A x in Ax ..
+        n_samples = b.size
+        chunk_size = (n_samples + n_chunks - 1) // n_chunks
+        if return_gradient:
+            grad_chunks = np.zeros((n_chunks, n_features))
+        else:
+            grad_chunks = np.zeros((n_chunks, 0))
+        loss = 0.0
+        grad_c = 0.0
+        for k in prange(n_chunks):
+            for i in range(k * chunk_size, min((k + 1) * chunk_size, n_samples)):
+                z = 0.0
+                for j in range(A_indptr[i], A_indptr[i + 1]):
+                    z += A_data[j] * x[A_indices[j]]
+                Ax[i] = z
+                loss_i, r_i = sample_loss(z + c, b[i], param)
+                if w is not None:
+                    loss_i *= w[i]
+                    r_i *= w[i]
+                loss += loss_i
+                grad_c += r_i
+                if return_gradient:
+                    for j in range(A_indptr[i], A_indptr[i + 1]):
+                        grad_chunks[k, A_indices[j]] += r_i * A_data[j]
+        grad = np.zeros(n_features)
+        if return_gradient:
+            for j in prange(n_features):
+                for k in range(n_chunks):
+                    grad[j] += grad_chunks[k, j]
+        return loss, grad, grad_c
+
+    @njit(nogil=True, parallel=True)
+    def margins_kernel(z, b, w, param):
+        # .. loss of the margins z, overwritten with the residuals ..
+        loss = 0.0
+        for i in prange(z.size):
+            loss_i, r_i = sample_loss(z[i], b[i], param)
+            if w is not None:
+                loss_i *= w[i]
+                r_i *= w[i]
+            z[i] = r_i if abs(r_i) >= _TINY else 0.0
+            loss += loss_i
+        return loss
+
+    return csr_kernel, margins_kernel
+
+
+_logloss_csr, _logloss_residual = _sample_loss_kernels(_log1pexp_residual)
+_huber_csr, _huber_margins = _sample_loss_kernels(_huber_residual)
+
+
+@njit(nogil=True)
+def _csr_rows_dot(A_data, A_indices, A_indptr, X, idx):
+    """Return A[idx] X for A in CSR format, without copying the rows."""
+    out = np.zeros((idx.size, X.shape[1]), dtype=X.dtype)
+    for s in range(idx.size):
+        i = idx[s]
+        for j in range(A_indptr[i], A_indptr[i + 1]):
+            a_ij = A_data[j]
+            X_j = X[A_indices[j]]
+            for k in range(X.shape[1]):
+                out[s, k] += a_ij * X_j[k]
+    return out
+
+
+@njit(nogil=True)
+def _csr_rows_tdot(A_data, A_indices, A_indptr, R, idx, n_features):
+    """Return A[idx]^T R for A in CSR format, without copying the rows."""
+    out = np.zeros((n_features, R.shape[1]))
+    for s in range(idx.size):
+        i = idx[s]
+        for j in range(A_indptr[i], A_indptr[i + 1]):
+            a_ij = A_data[j]
+            out_j = out[A_indices[j]]
+            for k in range(R.shape[1]):
+                out_j[k] += a_ij * R[s, k]
+    return out
+
+
+@njit(nogil=True, parallel=True)
+def _softmax_residual(Z, y, w):
+    """Multinomial logistic loss of the margins Z, overwritten with residuals.
+
+    Row i of Z is replaced by softmax(Z[i]) - e_{y_i}, with the log-softmax
+    computed relative to the largest margin of the row. If w is not None,
+    the loss and the residuals of sample i are multiplied by w[i].
+    """
+    loss = 0.0
+    n_classes = Z.shape[1]
+    for i in prange(Z.shape[0]):
+        z_max = Z[i, 0]
+        for k in range(1, n_classes):
+            z_max = max(z_max, Z[i, k])
+        z_y = Z[i, y[i]]
+        sum_exp = 0.0
+        for k in range(n_classes):
+            Z[i, k] = np.exp(Z[i, k] - z_max)
+            sum_exp += Z[i, k]
+        loss_i = z_max + np.log(sum_exp) - z_y
+        for k in range(n_classes):
+            Z[i, k] /= sum_exp
+            if Z[i, k] < _TINY:
+                Z[i, k] = 0.0
+        Z[i, y[i]] -= 1
+        if w is not None:
+            loss_i *= w[i]
+            for k in range(n_classes):
+                Z[i, k] *= w[i]
+        loss += loss_i
+    return loss
+
+
+class _LinearLoss:
+    """Matrix-vector products with the data matrix of a loss f(A x).
+
+    Products are split across n_jobs threads, see :func:`copt.utils.matvec`.
+    The product A x is memoized on the last two points it was computed at,
+    keyed on the identity of A and the value of x, so that evaluating the
+    loss again on a point the solver just visited (e.g. from
+    :class:`copt.utils.Trace`) costs O(n_samples). Modifying A in place is
+    not detected.
+
+    A can also be a matrix-free linear operator, such as
+    scipy.sparse.linalg.LinearOperator or any object with shape, matvec
+    and rmatvec (see :func:`copt.utils.is_linear_operator`). It is then
+    only accessed through these products, and max_lipschitz is bounded by
+    the squared spectral norm instead of the largest squared row norm.
+
+    The squared spectral norm of A used by the lipschitz properties is
+    bounded from above once by power iteration with relative tolerance
+    lipschitz_tol (see :func:`copt.utils.power_iteration`) and cached, unless A is a
+    linear operator with a norm method (see :mod:`copt.operators`).
+    Assigning to A clears all the cached quantities, and the top singular
+    vector of the previous A warm-starts the next estimate.
+
+    Subclasses implement _f_grad_margins(x, z, return_gradient), the loss
+    (and gradient) given the margins z = A x + c. Losses of the form
+    sum_i l(a_i^T x + c, b_i) can instead set _csr_kernel and
+    _margins_kernel to the kernels returned by _sample_loss_kernels, and
+    _loss_param to the parameter of l. For CSR matrices, the loss and
+    gradient are then computed in a single pass over the rows of A.
+
+    With sample weights w, the loss is sum_i w_i l_i / sum_i w_i, i.e.,
+    integer weights count the copies of a sample (see
+    :func:`copt.utils.collapse_duplicates`). The lipschitz constants account
+    for the weights. The stochastic solvers take the same weights as their
+    sample_weight argument, while partial_deriv and partial_loss remain
+    per-sample functions.
+
+    The columns of A can be standardized on the fly with the per-column
+    vectors scale s and offset mu: the loss then uses the data matrix
+    (A - 1 mu^T) diag(s), whose products are computed as
+    A diag(s) x - 1 (mu^T diag(s) x) and diag(s) (A^T r - mu sum(r)), so
+    that A is neither copied nor densified.
+
+    The loss is computed in float32 if A and x are float32 (see
+    :func:`copt.utils.float_dtype`), in which case the margins and the
+    gradient are float32. Sums over samples (the loss value and the
+    gradient reductions of the fused kernels) are accumulated in float64.
+
+    f_grad_batch and loss_batch evaluate the loss on a subset of the
+    samples. For CSR matrices, the products with the selected rows read
+    them in place from the index arrays of A, at a cost proportional to
+    their number of nonzeros. Subclasses compute the loss of a batch with
+    _batch_residuals(z, idx).
+    """
+
+    n_jobs = 1
+    intercept = False
+    lipschitz_tol = 1e-4
+    _csr_kernel = None
+    _margins_kernel = None
+    _loss_param = 0.0
+    _sample_weight = None
+    _scale = None
+    _offset = None
+
+    @property
+    def A(self):
+        return self._A
+
+    @A.setter
+    def A(self, A):
+        self._A = A
+        for name in (
+            "_matvec_cache",
+            "_transpose_cache",
+            "_gram_cache",
+            "_spectral_cache",
+            "_row_norm_cache",
+        ):
+            self.__dict__.pop(name, None)
+
+    @property
+    def sample_weight(self):
+        return self._sample_weight
+
+    @sample_weight.setter
+    def sample_weight(self, sample_weight):
+        if sample_weight is not None:
+            sample_weight = np.asarray(sample_weight, dtype=np.float64).ravel()
+            if sample_weight.size != self.A.shape[0]:
+                raise ValueError("Dimensions of A and sample_weight do not coincide")
+            if np.any(sample_weight < 0) or not np.any(sample_weight > 0):
+                raise ValueError(
+                    "sample_weight must be nonnegative and have a positive entry"
+                )
+        self._sample_weight = sample_weight
+        for name in ("_gram_cache", "_spectral_cache"):
+            self.__dict__.pop(name, None)
+
+    @property
+    def scale(self):
+        return self._scale
+
+    @scale.setter
+    def scale(self, scale):
+        self._scale = self._column_vector(scale, "scale")
+
+    @property
+    def offset(self):
+        return self._offset
+
+    @offset.setter
+    def offset(self, offset):
+        self._offset = self._column_vector(offset, "offset")
+
+    def _column_vector(self, v, name):
+        if v is not None:
+            v = np.asarray(v, dtype=np.float64).ravel()
+            if v.size != self.A.shape[1]:
+                raise ValueError("Dimensions of A and %s do not coincide" % name)
+        caches = ("_matvec_cache", "_gram_cache", "_spectral_cache", "_row_norm_cache")
+        for name in caches:
+            self.__dict__.pop(name, None)
+        return v
+
+    def _scaled_coef(self, x_):
+        """Coefficients u = diag(scale) x_ of A and the shift offset^T u.
+
+        The margins are A u - shift. x_ holds one or several flattened
+        columns, in which case shift has one entry per column.
+        """
+        if self._scale is None and self._offset is None:
+            return x_, 0.0
+        X = x_.reshape(self.A.shape[1], -1)
+        if self._scale is not None:
+            X = (self._scale[:, None] * X).astype(x_.dtype, copy=False)
+        shift = 0.0
+        if self._offset is not None:
+            shift = self._offset.dot(X)
+            shift = shift[0] if X.shape[1] == 1 else shift
+        return X.ravel(), shift
+
+    def _unscaled_grad(self, g, r_sum):
+        """Gradient diag(scale) (g - offset r_sum) with respect to x_ from the
+        gradient g = A^T r with respect to u, r_sum being the sum of r."""
+        if self._scale is None and self._offset is None:
+            return g
+        G = g.reshape(self.A.shape[1], -1)
+        if self._offset is not None:
+            G = G - np.outer(self._offset, r_sum)
+        if self._scale is not None:
+            G = self._scale[:, None] * G
+        return G.ravel()
+
+    def _total_weight(self, idx=None):
+        """Sum of the weights of the samples idx (default all samples)."""
+        w = self._sample_weight
+        if w is None:
+            return self.A.shape[0] if idx is None else idx.size
+        return w.sum() if idx is None else w[idx].sum()
+
+    def _squared_norm(self):
+        """Squared spectral norm of A, cached."""
+        if "_spectral_cache" not in self.__dict__:
+            self._spectral_cache = self._compute_squared_norm()
+        return self._spectral_cache
+
+    def _compute_squared_norm(self):
+        # .. of diag(sqrt(w)) A with sample weights w ..
+        A = self.A
+        if self._scale is not None or self._offset is not None:
+            A = splinalg.LinearOperator(
+                self.A.shape, matvec=self._column_matvec, rmatvec=self._column_rmatvec
+            )
+        elif is_linear_operator(A) and callable(getattr(A, "norm", None)):
+            # .. structured operators (see copt.operators) know their norm ..
+            w = self._sample_weight
+            max_weight = 1.0 if w is None else w.max()
+            return max_weight * float(self.A.norm()) ** 2
+        s2, self._top_singular_vector = power_iteration(
+            A,
+            getattr(self, "_top_singular_vector", None),
+            tol=self.lipschitz_tol,
+            n_jobs=self.n_jobs,
+            sample_weight=self._sample_weight,
+        )
+        return s2
+
+    def _squared_row_norms(self):
+        """Squared euclidean norms of the rows of A, cached."""
+        if is_linear_operator(self.A):
+            raise ValueError("The row norms of a linear operator are not available")
+        if "_row_norm_cache" not in self.__dict__:
+            if self._scale is None and self._offset is None:
+                self._row_norm_cache = row_norms(self.A, squared=True)
+            else:
+                # .. ||diag(s) (a_i - mu)||^2 = (a_i * a_i)^T s^2
+                # - 2 a_i^T (s^2 mu) + ||diag(s) mu||^2 ..
+                s2 = np.ones(self.A.shape[1])
+                if self._scale is not None:
+                    s2 = self._scale ** 2
+                A2 = self.A.multiply(self.A) if sparse.issparse(self.A) else self.A ** 2
+                norms = np.asarray(safe_sparse_dot(A2, s2, dense_output=True)).ravel()
+                if self._offset is not None:
+                    norms -= 2 * matvec(self.A, s2 * self._offset)
+                    norms += s2.dot(self._offset ** 2)
+                self._row_norm_cache = np.maximum(norms, 0)
+        return self._row_norm_cache
+
+    def _max_squared_row_norm(self):
+        # .. largest squared norm of the rows of diag(sqrt(w)) A, relative to
+        # the average weight, since the stochastic solvers scale the
+        # gradient of sample i by w_i n_samples / sum(w) ..
+        w = self._sample_weight
+        if is_linear_operator(self.A):
+            # .. the squared spectral norm is an upper bound ..
+            max_norm = self._squared_norm()
+        elif w is None:
+            return self._squared_row_norms().max()
+        else:
+            max_norm = (w * self._squared_row_norms()).max()
+        return max_norm if w is None else max_norm * w.size / w.sum()
+
+    def __call__(self, x):
+        return self.f_grad(x, return_gradient=False)
+
+    def _dtype(self, x):
+        """Dtype of the computations at x, see copt.utils.float_dtype."""
+        if is_linear_operator(self.A):
+            return float_dtype(x)
+        return float_dtype(self.A, x)
+
+    def _as_float(self, x):
+        x = np.asarray(x)
+        return x.astype(self._dtype(x), copy=False).ravel()
+
+    def _split(self, x):
+        x = self._as_float(x)
+        if self.intercept:
+            return x[:-1], x[-1]
+        return x, 0.0
+
+    def _grad_output(self, x_, grad, grad_c):
+        """Gradient with respect to x_ and the intercept, in the dtype of x_."""
+        grad = np.asarray(grad).astype(x_.dtype, copy=False)
+        if not self.intercept:
+            return grad
+        return np.concatenate((grad, np.ravel(grad_c).astype(x_.dtype)))
+
+    def _lookup_matvec(self, x):
+        cache = self.__dict__.setdefault("_matvec_cache", [])
+        for k, (A, key, value) in enumerate(cache):
+            if A is self.A and key.shape == x.shape and np.array_equal(key, x):
+                cache.insert(0, cache.pop(k))
+                return value
+        return None
+
+    def _remember_matvec(self, x, value):
+        cache = self.__dict__.setdefault("_matvec_cache", [])
+        cache.insert(0, (self.A, x.copy(), value))
+        del cache[2:]
+
+    def _cached_matvec(self, x):
+        value = self._lookup_matvec(x)
+        if value is None:
+            value = self._matvec(x)
+            self._remember_matvec(x, value)
+        return value
+
+    def f_grad(self, x, return_gradient=True):
+        x_, c = self._split(x)
+        Ax = self._lookup_matvec(x_)
+        if Ax is None and self._csr_kernel is not None and sparse.isspmatrix_csr(
+            self.A
+        ):
+            # .. single fused pass over the rows of A ..
+            n_samples, n_features = self.A.shape
+            u, shift = self._scaled_coef(x_)
+            Ax = np.empty(n_samples, dtype=x_.dtype)
+            loss, grad, grad_c = self._csr_kernel(
+                self.A.data,
+                self.A.indices,
+                self.A.indptr,
+                self.b,
+                self._sample_weight,
+                u,
+                c - shift,
+                self._loss_param,
+                n_features,
+                return_gradient,
+                min(effective_n_jobs(self.n_jobs), n_samples),
+                Ax,
+            )
+            if shift:
+                Ax -= shift
+            if return_gradient:
+                grad = self._unscaled_grad(grad, grad_c)
+            self._remember_matvec(x_, Ax)
+            return self._finalize(x_, loss, grad, grad_c, return_gradient)
+        if Ax is None:
+            Ax = self._cached_matvec(x_)
+        return self._f_grad_margins(x_, Ax + c, return_gradient)
+
+    def f_grad_batch(self, x, idx, return_gradient=True):
+        """Loss and gradient averaged over the samples idx.
+
+        Args:
+          x: array-like
+              Coefficients, as in f_grad.
+
+          idx: array of ints or boolean mask
+              Indices of the samples, possibly repeated.
+
+          return_gradient: bool
+              Whether to return the gradient as well.
+
+        Returns:
+          loss: float
+              Average loss over the samples idx, plus the regularization.
+
+          grad: ndarray
+              Its gradient with respect to x, only if return_gradient.
+        """
+        x_, c = self._split(x)
+        idx = self._batch_indices(idx)
+        n_batch = self._total_weight(idx) if idx.size else 1.0
+        z = self._rows_matvec(x_, idx) + c
+        # .. z now holds the residuals ..
+        loss = self._batch_residuals(z, idx)
+        loss = loss / n_batch + 0.5 * self.alpha * x_.dot(x_)
+        if not return_gradient:
+            return loss
+        grad = self._rows_rmatvec(z, idx) / n_batch + self.alpha * x_
+        return loss, self._grad_output(x_, grad, z.sum(0) / n_batch)
+
+    def loss_batch(self, x, idx):
+        """Loss averaged over the samples idx, see f_grad_batch."""
+        return self.f_grad_batch(x, idx, return_gradient=False)
+
+    def _batch_indices(self, idx):
+        idx = np.asarray(idx)
+        if idx.dtype == bool:
+            return np.flatnonzero(idx)
+        return idx.astype(np.intp, copy=False).ravel()
+
+    def _batch_residuals(self, z, idx):
+        # .. loss of the margins z of the samples idx, overwritten with ..
+        # .. the residuals ..
+        w = self._sample_weight
+        return self._margins_kernel(
+            z, self.b[idx], None if w is None else w[idx], self._loss_param
+        )
+
+    def _rows_matvec(self, x_, idx):
+        """A[idx] x_, of shape (idx.size,) or (idx.size, n_columns).
+
+        x_ holds one or several (n_columns) flattened columns of length
+        A.shape[1].
+        """
+        n_features = self.A.shape[1]
+        u, shift = self._scaled_coef(x_)
+        X = u.reshape(n_features, -1)
+        if sparse.isspmatrix_csr(self.A):
+            Z = _csr_rows_dot(self.A.data, self.A.indices, self.A.indptr, X, idx)
+        elif is_linear_operator(self.A):
+            # .. the rows of an operator are not accessible, compute the ..
+            # .. full products and keep the subset ..
+            Z = np.column_stack([matvec(self.A, X[:, k]) for k in range(X.shape[1])])
+            Z = Z[idx]
+        else:
+            # .. copying the rows of a dense matrix costs as much as the ..
+            # .. product itself ..
+            Z = np.asarray(safe_sparse_dot(self.A[idx], X, dense_output=True))
+        Z = Z.ravel() if X.shape[1] == 1 else Z
+        if self._offset is not None:
+            Z -= shift
+        return Z
+
+    def _rows_rmatvec(self, r, idx):
+        """A[idx]^T r, flattened as x_ in _rows_matvec."""
+        n_samples, n_features = self.A.shape
+        R = r[:, None] if r.ndim == 1 else r
+        if sparse.isspmatrix_csr(self.A):
+            out = _csr_rows_tdot(
+                self.A.data, self.A.indices, self.A.indptr, R, idx, n_features
+            )
+        elif is_linear_operator(self.A):
+            R_full = np.zeros((n_samples, R.shape[1]))
+            np.add.at(R_full, idx, R)
+            out = np.column_stack(
+                [rmatvec(self.A, R_full[:, k]) for k in range(R.shape[1])]
+            )
+        else:
+            out = np.asarray(safe_sparse_dot(self.A[idx].T, R, dense_output=True))
+        r_sum = R.sum(0) if self._offset is not None else 0.0
+        return self._unscaled_grad(out.ravel(), r_sum)
+
+    def _f_grad_margins(self, x_, z, return_gradient):
+        # .. z now holds the residuals ..
+        loss = self._margins_kernel(z, self.b, self._sample_weight, self._loss_param)
+        grad = grad_c = None
+        if return_gradient:
+            grad = self._rmatvec(z)
+            grad_c = z.sum()
+        return self._finalize(x_, loss, grad, grad_c, return_gradient)
+
+    def _finalize(self, x_, loss, grad, grad_c, return_gradient):
+        n_samples = self._total_weight()
+        loss = loss / n_samples + 0.5 * self.alpha * x_.dot(x_)
+
+        if not return_gradient:
+            return loss
+
+        grad /= n_samples
+        grad += self.alpha * x_
+        return loss, self._grad_output(x_, grad, grad_c / n_samples)
+
+    def line_f_grad(self, x, direction):
+        """Restriction of f_grad to the line x + t * direction.
+
+        Args:
+          x: array-like
+              Starting point.
+
+          direction: array-like
+              Direction of the line, same shape as x.
+
+        Returns:
+          phi: callable
+              phi(t, return_gradient=False) returns the loss (and gradient
+              if return_gradient) at x + t * direction. Since
+              A (x + t d) = A x + t A d, both products are computed once and
+              each evaluation costs O(n_samples), plus a product with A^T
+              when the gradient is requested.
+        """
+        x_, c = self._split(x)
+        d_, d_c = self._split(direction)
+        Ax = self._cached_matvec(x_)
+        Ad = self._matvec(d_)
+
+        def phi(t, return_gradient=False):
+            x_t = x_ + t * d_
+            Ax_t = Ax + t * Ad
+            if return_gradient:
+                # .. likely the next iterate, keep it for later calls ..
+                self._remember_matvec(x_t, Ax_t)
+            return self._f_grad_margins(x_t, Ax_t + (c + t * d_c), return_gradient)
+
+        return phi
+
+    def _matvec(self, x):
+        u, shift = self._scaled_coef(x)
+        z = self._A_dot(u)
+        if self._offset is not None:
+            z -= shift
+        return z
+
+    def _rmatvec(self, r):
+        r_sum = r.sum(0) if self._offset is not None else 0.0
+        return self._unscaled_grad(self._A_tdot(r), r_sum)
+
+    def _column_matvec(self, v):
+        # .. product with a single column of coefficients ..
+        u, shift = self._scaled_coef(np.ravel(v))
+        return matvec(self.A, u, self.n_jobs) - shift
+
+    def _column_rmatvec(self, r):
+        r = np.ravel(r)
+        return self._unscaled_grad(rmatvec(self.A, r, self.n_jobs), r.sum())
+
+    def _A_dot(self, u):
+        return matvec(self.A, u, self.n_jobs)
+
+    def _A_tdot(self, r):
+        return rmatvec(self.A, r, self.n_jobs, self._transpose())
+
+    def _transpose(self):
+        # .. CSR copy of A^T, used by _rmatvec when the per-thread buffers
+        # would take more memory than the copy itself ..
+        n_jobs = effective_n_jobs(self.n_jobs)
+        if n_jobs <= 1 or not sparse.isspmatrix_csr(self.A):
+            return None
+        cache = getattr(self, "_transpose_cache", None)
+        if cache is not None and cache[0] is self.A:
+            return cache[1]
+        copy_bytes = self.A.nnz * (self.A.data.itemsize + self.A.indices.itemsize)
+        if n_jobs * self.A.shape[1] * 8 < copy_bytes:
+            return None
+        A_T = self.A.T.tocsr()
+        self._transpose_cache = (self.A, A_T)
+        return A_T
+
+
+class LogLoss(_LinearLoss):
     r"""Logistic loss function.
 
   The logistic loss function is defined as
@@ -21,24 +692,46 @@ class LogLoss:
   The input vector b verifies :math:`0 \leq b_i \leq 1`. When it comes from
   class labels, it should have the values 0 or 1.
 
+  Matrix-vector products with A are computed with n_jobs threads (-1 means
+  all the threads available to numba).
+
+  With sample_weight w, the average over samples is replaced by the
+  weighted average :math:`\sum_i w_i \ell_i / \sum_i w_i`. In particular,
+  since the loss is linear in b, a sample repeated w times can be replaced
+  by a single copy of weight w and label the mean of the copies' labels
+  (see :func:`copt.utils.collapse_duplicates`).
+
+  With scale s and offset mu (vectors of size n_features), the columns of
+  A are standardized on the fly, i.e., the loss is evaluated on the
+  matrix (A - 1 mu^T) diag(s) without forming it, so that sparse data can
+  be centered without being densified.
+
   References:
     http://fa.bianp.net/blog/2019/evaluate_logistic/
   """
 
-    def __init__(self, A, b, alpha=0.0):
+    _csr_kernel = staticmethod(_logloss_csr)
+    _margins_kernel = staticmethod(_logloss_residual)
+
+    def __init__(
+        self, A, b, alpha=0.0, n_jobs=1, sample_weight=None, scale=None, offset=None
+    ):
         if A is None:
             A = sparse.eye(b.size, b.size, format="csr")
-        self.A = A
         if np.max(b) > 1 or np.min(b) < 0:
             raise ValueError("b can only contain values between 0 and 1 ")
         if not A.shape[0] == b.size:
             raise ValueError("Dimensions of A and b do not coincide")
+        if sparse.issparse(A):
+            A = sparse.csr_matrix(A)
+        self.A = A
         self.b = b
         self.alpha = alpha
         self.intercept = False
-
-    def __call__(self, x):
-        return self.f_grad(x, return_gradient=False)
+        self.n_jobs = n_jobs
+        self.sample_weight = sample_weight
+        self.scale = scale
+        self.offset = offset
 
     def _sigma(self, z, idx):
         z0 = np.zeros_like(z)
@@ -73,108 +766,67 @@ class LogLoss:
         out[~idx] = ((1 - b_nidx) - b_nidx * exp_nx) / (1 + exp_nx)
         return out
 
-    def f_grad(self, x, return_gradient=True):
-        if self.intercept:
-            x_, c = x[:-1], x[-1]
-        else:
-            x_, c = x, 0.0
-        z = safe_sparse_dot(self.A, x_, dense_output=True).ravel() + c
-        loss = np.mean((1 - self.b) * z - self.logsig(z))
-        penalty = safe_sparse_dot(x_.T, x_, dense_output=True).ravel()[0]
-        loss += 0.5 * self.alpha * penalty
-
-        if not return_gradient:
-            return loss
-
-        z0_b = self.expit_b(z, self.b)
-
-        grad = safe_sparse_add(self.A.T.dot(z0_b) / self.A.shape[0], self.alpha * x_)
-        grad = np.asarray(grad).ravel()
-        grad_c = z0_b.mean()
-        if self.intercept:
-            return np.concatenate((grad, [grad_c]))
+    def _second_derivative(self, z, idx=None):
+        # .. d_i = w_i sigma(z_i) (1 - sigma(z_i)) / sum(w) at the margins z
+        # of the samples idx (default all samples), in place ..
+        special.expit(z, out=z)
+        z *= 1 - z
+        if self._sample_weight is not None:
+            z *= self._sample_weight if idx is None else self._sample_weight[idx]
+        z /= self._total_weight(idx)
+        return z
 
-        return loss, grad
+    def hessian_mv(self, x, sample_idx=None):
+        """Return a callable that returns matrix-vector products with the Hessian.
 
-    def hessian_mv(self, x):
-        """Return a callable that returns matrix-vector products with the Hessian."""
+        The product with s is computed as A^T (d * (A s)) + alpha s, where d
+        is the second derivative of the loss at the margins, so that neither
+        A nor diag(d) A is copied.
 
-        n_samples, n_features = self.A.shape
-        if self.intercept:
-            x_, c = x[:-1], x[-1]
+        If sample_idx (an array of row indices, possibly repeated) is given,
+        the loss is averaged over these rows only (sub-sampled Hessian), and
+        the cost of a product is proportional to the number of indices.
+        """
+        x_, c = self._split(x)
+        n_features = x_.size
+        if sample_idx is None:
+            _matvec, _rmatvec = self._matvec, self._rmatvec
+            z = self._cached_matvec(x_) + c
         else:
-            x_, c = x, 0.0
+            sample_idx = self._batch_indices(sample_idx)
 
-        z = special.expit(safe_sparse_dot(self.A, x_, dense_output=True).ravel() + c)
+            def _matvec(v):
+                return self._rows_matvec(v, sample_idx)
 
-        # The mat-vec product of the Hessian
-        d = z * (1 - z)
-        if sparse.issparse(self.A):
-            dX = safe_sparse_dot(
-                sparse.dia_matrix((d, 0), shape=(n_samples, n_samples)), self.A
-            )
-        else:
-            # Precompute as much as possible
-            dX = d[:, np.newaxis] * self.A
+            def _rmatvec(r):
+                return self._rows_rmatvec(r, sample_idx)
 
-        if self.intercept:
-            # Calculate the double derivative with respect to intercept
-            # In the case of sparse matrices this returns a matrix object.
-            dd_intercept = np.squeeze(np.array(dX.sum(axis=0)))
+            z = _matvec(x_) + c
+        d = self._second_derivative(z, sample_idx)
 
         def _Hs(s):
-            ret = np.empty_like(s)
-            ret[:n_features] = self.A.T.dot(dX.dot(s[:n_features]))
-            ret[:n_features] += self.alpha * s[:n_features]
-
-            # For the fit intercept case.
+            s_, s_c = self._split(s)
+            u = _matvec(s_)
+            if self.intercept:
+                u += s_c
+            u *= d
+            ret = np.empty(n_features + self.intercept, dtype=x_.dtype)
+            ret[:n_features] = _rmatvec(u)
+            ret[:n_features] += self.alpha * s_
             if self.intercept:
-                ret[:n_features] += s[-1] * dd_intercept
-                ret[-1] = dd_intercept.dot(s[:n_features])
-                ret[-1] += d.sum() * s[-1]
-            return ret / n_samples
+                ret[-1] = u.sum()
+            return ret
 
         return _Hs
 
     def hessian_trace(self, x):
-        """Return a callable that returns matrix-vector products with the Hessian."""
-
-        n_samples, n_features = self.A.shape
+        """Trace of the Hessian at x."""
+        x_, c = self._split(x)
+        d = self._second_derivative(self._cached_matvec(x_) + c)
+        trace = d.dot(self._squared_row_norms()) + self.alpha * x_.size
         if self.intercept:
-            x_, c = x[:-1], x[-1]
-        else:
-            x_, c = x, 0.0
-
-        z = special.expit(safe_sparse_dot(self.A, x_, dense_output=True).ravel() + c)
-
-        # The mat-vec product of the Hessian
-        d = z * (1 - z)
-        if sparse.issparse(self.A):
-            dX = safe_sparse_dot(
-                sparse.dia_matrix((d, 0), shape=(n_samples, n_samples)), self.A
-            )
-        else:
-            # Precompute as much as possible
-            dX = d[:, np.newaxis] * self.A
-
-        if self.intercept:
-            # Calculate the double derivative with respect to intercept
-            # In the case of sparse matrices this returns a matrix object.
-            dd_intercept = np.squeeze(np.array(dX.sum(axis=0)))
-
-        def _Hs(s):
-            ret = np.empty_like(s)
-            ret[:n_features] = self.A.T.dot(dX.dot(s[:n_features]))
-            ret[:n_features] += self.alpha * s[:n_features]
-
-            # For the fit intercept case.
-            if self.intercept:
-                ret[:n_features] += s[-1] * dd_intercept
-                ret[-1] = dd_intercept.dot(s[:n_features])
-                ret[-1] += d.sum() * s[-1]
-            return ret / n_samples
-
-        return _Hs
+            trace += d.sum()
+        return trace
 
     @property
     def partial_deriv(self):
@@ -195,20 +847,72 @@ class LogLoss:
         return log_deriv
 
     @property
-    def lipschitz(self):
-        s = splinalg.svds(self.A, k=1, return_singular_vectors=False)[0]
-        return 0.25 * (s * s) / self.A.shape[0] + self.alpha
+    def partial_loss(self):
+        @njit(parallel=True)
+        def log_loss(p, y):
+            # log(1 + exp(p)) - y * p, computed in a stable way
+            out = np.zeros_like(p)
+            for i in prange(p.size):
+                if p[i] > 0:
+                    out[i] = p[i] + np.log1p(np.exp(-p[i])) - y[i] * p[i]
+                else:
+                    out[i] = np.log1p(np.exp(p[i])) - y[i] * p[i]
+            return out
+
+        return log_loss
 
     @property
-    def max_lipschitz(self):
-        from sklearn.utils.extmath import row_norms
+    def partial_conjugate(self):
+        @njit(parallel=True)
+        def log_conjugate(u, y):
+            # convex conjugate of the logistic loss, an entropy
+            out = np.zeros_like(u)
+            for i in prange(u.size):
+                s = u[i] + y[i]
+                if s < 0 or s > 1:
+                    out[i] = np.inf
+                elif 0 < s < 1:
+                    out[i] = s * np.log(s) + (1 - s) * np.log(1 - s)
+            return out
+
+        return log_conjugate
+
+    @property
+    def partial_dual_update(self):
+        @njit
+        def log_dual_update(p, y, dual, q):
+            # maximize over a the dual objective restricted to one sample
+            #   -conj(-a) - (a - dual) * p - q (a - dual)^2 / 2
+            # with Newton's method on s = y - a, which lies in [0, 1]
+            s_old = y - dual
+            s = min(max(s_old, 1e-10), 1 - 1e-10)
+            for _ in range(50):
+                delta = s_old - s
+                grad = p + q * delta - np.log(s / (1 - s))
+                hess = -1.0 / (s * (1 - s)) - q
+                s_next = s - grad / hess
+                if s_next <= 0:
+                    s_next = 0.5 * s
+                elif s_next >= 1:
+                    s_next = 0.5 * (1 + s)
+                if abs(s_next - s) < 1e-12:
+                    s = s_next
+                    break
+                s = s_next
+            return y - s
+
+        return log_dual_update
 
-        max_squared_sum = row_norms(self.A, squared=True).max()
+    @property
+    def lipschitz(self):
+        return 0.25 * self._squared_norm() / self._total_weight() + self.alpha
 
-        return 0.25 * max_squared_sum + self.alpha
+    @property
+    def max_lipschitz(self):
+        return 0.25 * self._max_squared_row_norm() + self.alpha
 
 
-class SquareLoss:
+class SquareLoss(_LinearLoss):
     r"""Squared loss.
 
   The Squared loss is defined as
@@ -216,30 +920,130 @@ class SquareLoss:
   .. math::
       \frac{1}{2n}\|A x - b\|^2 + \frac{1}{2} \alpha \|x\|^2
 
-  where :math:`\|\cdot\|` is the euclidean norm.
+  where :math:`\|\cdot\|` is the euclidean norm. Matrix-vector products
+  with A are computed with n_jobs threads.
+
+  When gram is True, :math:`A^T A`, :math:`A^T b` and :math:`\|b\|^2` are
+  computed once (see :func:`copt.utils.gram_matrix`) and the loss and
+  gradient are evaluated in O(n_features^2) operations, independent of
+  n_samples. With gram="auto" this mode is used for tall matrices, where
+  it is cheaper than a product with A. The loss value is then computed as
+  :math:`x^T A^T A x - 2 x^T A^T b + \|b\|^2`, which loses precision
+  when the residual is small, so this mode is off by default. The Gram matrix is recomputed if A
+  or b are replaced, and accounts for scale and offset (see
+  :class:`copt.loss.LogLoss`).
   """
 
-    def __init__(self, A, b, alpha=0):
+    def __init__(
+        self,
+        A,
+        b,
+        alpha=0,
+        n_jobs=1,
+        gram=False,
+        sample_weight=None,
+        scale=None,
+        offset=None,
+    ):
         if A is None:
             A = sparse.eye(b.size, b.size, format="csr")
         self.b = b
         self.alpha = alpha
         self.A = A
         self.name = "square"
+        self.n_jobs = n_jobs
+        self.gram = gram
+        self.sample_weight = sample_weight
+        self.scale = scale
+        self.offset = offset
 
-    def __call__(self, x):
-        z = safe_sparse_dot(self.A, x, dense_output=True).ravel() - self.b
-        pen = self.alpha * safe_sparse_dot(x.T, x, dense_output=True).ravel()[0]
-        return 0.5 * (z * z).mean() + 0.5 * pen
+    def _use_gram(self):
+        if self.gram != "auto":
+            return bool(self.gram)
+        if is_linear_operator(self.A):
+            return False
+        n_samples, n_features = self.A.shape
+        nnz = self.A.nnz if sparse.issparse(self.A) else n_samples * n_features
+        return (
+            n_samples >= 10 * n_features
+            and n_features <= 4096
+            and n_features ** 2 <= nnz
+        )
 
-    def f_grad(self, x, return_gradient=True):
-        z = safe_sparse_dot(self.A, x, dense_output=True).ravel() - self.b
-        pen = self.alpha * safe_sparse_dot(x.T, x, dense_output=True).ravel()[0]
-        loss = 0.5 * (z * z).mean() + 0.5 * pen
+    def _gram(self):
+        cache = getattr(self, "_gram_cache", None)
+        if cache is None or cache[0] is not self.A or cache[1] is not self.b:
+            A, b = self.A, self.b
+            if self._sample_weight is not None:
+                # .. A^T W A is the Gram matrix of diag(sqrt(w)) A ..
+                sqrt_w = np.sqrt(self._sample_weight)
+                if sparse.issparse(A):
+                    A = sparse.diags(sqrt_w).dot(A).tocsr()
+                else:
+                    A = sqrt_w[:, None] * A
+                b = sqrt_w * b
+            gram, Atb, bb = gram_matrix(A, b, self.n_jobs)
+            if self._offset is not None:
+                # .. (A - 1 mu^T)^T W (A - 1 mu^T) from the weighted column
+                # sums m = A^T w of A ..
+                w = self._sample_weight
+                mu = self._offset
+                m = rmatvec(self.A, np.ones(self.A.shape[0]) if w is None else w)
+                gram = gram - np.outer(m, mu) - np.outer(mu, m)
+                gram += self._total_weight() * np.outer(mu, mu)
+                Atb = Atb - mu * (self.b.sum() if w is None else w.dot(self.b))
+            if self._scale is not None:
+                gram = self._scale[:, None] * gram * self._scale
+                Atb = self._scale * Atb
+            cache = (self.A, self.b, gram, Atb, bb)
+            self._gram_cache = cache
+        return cache[2:]
+
+    def _f_grad_gram(self, x, Gx, return_gradient):
+        _, Atb, bb = self._gram()
+        n_samples = self._total_weight()
+        # .. ||A x - b||^2 = x^T G x - 2 x^T A^T b + ||b||^2 ..
+        sq_norm = max(x.dot(Gx) - 2 * x.dot(Atb) + bb, 0.0)
+        loss = 0.5 * sq_norm / n_samples + 0.5 * self.alpha * x.dot(x)
         if not return_gradient:
             return loss
-        grad = safe_sparse_add(self.A.T.dot(z) / self.A.shape[0], self.alpha * x.T)
-        return loss, np.asarray(grad).ravel()
+        grad = (Gx - Atb) / n_samples + self.alpha * x
+        return loss, grad.astype(x.dtype, copy=False)
+
+    def f_grad(self, x, return_gradient=True):
+        if not self._use_gram():
+            return super().f_grad(x, return_gradient)
+        x = self._as_float(x)
+        gram = self._gram()[0]
+        return self._f_grad_gram(x, gram.dot(x), return_gradient)
+
+    def line_f_grad(self, x, direction):
+        if not self._use_gram():
+            return super().line_f_grad(x, direction)
+        x = self._as_float(x)
+        direction = self._as_float(direction)
+        gram = self._gram()[0]
+        Gx, Gd = gram.dot(x), gram.dot(direction)
+
+        def phi(t, return_gradient=False):
+            return self._f_grad_gram(x + t * direction, Gx + t * Gd, return_gradient)
+
+        return phi
+
+    def _f_grad_margins(self, x, z, return_gradient):
+        # .. z now holds the residuals ..
+        loss = self._batch_residuals(z, slice(None))
+        grad = self._rmatvec(z) if return_gradient else None
+        return self._finalize(x, loss, grad, z.sum(), return_gradient)
+
+    def _batch_residuals(self, z, idx):
+        z -= self.b[idx]
+        if self._sample_weight is None:
+            return 0.5 * z.dot(z)
+        w = self._sample_weight[idx]
+        loss = 0.5 * z.dot(w * z)
+        z *= w
+        return loss
 
     @property
     def partial_deriv(self):
@@ -248,42 +1052,232 @@ class SquareLoss:
             return p - y
         return square_deriv
 
+    @property
+    def partial_loss(self):
+        @njit
+        def square_loss(p, y):
+            return 0.5 * (p - y) ** 2
+
+        return square_loss
+
+    @property
+    def partial_conjugate(self):
+        @njit
+        def square_conjugate(u, y):
+            return 0.5 * u * u + u * y
+
+        return square_conjugate
+
+    @property
+    def partial_dual_update(self):
+        @njit
+        def square_dual_update(p, y, dual, q):
+            # closed form maximizer of the dual objective restricted to
+            # one sample, see partial_dual_update in LogLoss
+            return dual + (y - p - dual) / (1 + q)
+
+        return square_dual_update
+
+    def _compute_squared_norm(self):
+        if self._use_gram():
+            return linalg.eigvalsh(self._gram()[0])[-1]
+        return super()._compute_squared_norm()
+
     @property
     def lipschitz(self):
-        s = splinalg.svds(self.A, k=1, return_singular_vectors=False)[0]
-        return (s * s) / self.A.shape[0] + self.alpha
+        return self._squared_norm() / self._total_weight() + self.alpha
 
+    @property
+    def max_lipschitz(self):
+        return self._max_squared_row_norm() + self.alpha
 
-class HuberLoss:
-    """Huber loss"""
 
-    def __init__(self, A, b, alpha=0, delta=1):
+class HuberLoss(_LinearLoss):
+    r"""Huber loss.
+
+  The Huber loss is defined as
+
+  .. math::
+      \frac{1}{n}\sum_{i=1}^n h_\delta(\bs{a}_i^T \bs{x} - b_i)
+      + \frac{1}{2} \alpha \|\bs{x}\|^2
+
+  where :math:`h_\delta(r) = r^2 / 2` if :math:`|r| \leq \delta` and
+  :math:`\delta (|r| - \delta / 2)` otherwise. For CSR matrices the loss
+  and gradient are computed in a single pass over the rows of A.
+  """
+
+    _csr_kernel = staticmethod(_huber_csr)
+    _margins_kernel = staticmethod(_huber_margins)
+
+    def __init__(
+        self,
+        A,
+        b,
+        alpha=0,
+        delta=1,
+        n_jobs=1,
+        sample_weight=None,
+        scale=None,
+        offset=None,
+    ):
+        if sparse.issparse(A):
+            A = sparse.csr_matrix(A)
         self.delta = delta
         self.A = A
         self.b = b
         self.alpha = alpha
         self.name = "huber"
+        self.n_jobs = n_jobs
+        self.sample_weight = sample_weight
+        self.scale = scale
+        self.offset = offset
 
-    def __call__(self, x):
-        return self.f_grad(x, return_gradient=False)
+    @property
+    def _loss_param(self):
+        return float(self.delta)
 
-    def f_grad(self, x, return_gradient=True):
-        z = safe_sparse_dot(self.A, x, dense_output=True).ravel() - self.b
-        idx = np.abs(z) < self.delta
-        loss = 0.5 * np.sum(z[idx] * z[idx])
-        loss += np.sum(self.delta * (np.abs(z[~idx]) - 0.5 * self.delta))
-        loss = (
-            loss / z.size
-            + 0.5 * self.alpha * safe_sparse_dot(x.T, x, dense_output=True).ravel()[0]
-        )
+    @property
+    def partial_deriv(self):
+        delta = float(self.delta)
+
+        @njit(parallel=True)
+        def huber_deriv(p, y):
+            # .. the residual clipped at delta ..
+            out = np.zeros_like(p)
+            for i in prange(p.size):
+                out[i] = min(max(p[i] - y[i], -delta), delta)
+            return out
+
+        return huber_deriv
+
+    @property
+    def partial_loss(self):
+        delta = float(self.delta)
+
+        @njit(parallel=True)
+        def huber_loss(p, y):
+            out = np.zeros_like(p)
+            for i in prange(p.size):
+                out[i] = _huber_residual(p[i], y[i], delta)[0]
+            return out
+
+        return huber_loss
+
+    @property
+    def lipschitz(self):
+        return self._squared_norm() / self._total_weight() + self.alpha
+
+    @property
+    def max_lipschitz(self):
+        return self._max_squared_row_norm() + self.alpha
+
+
+class MultinomialLogLoss(_LinearLoss):
+    r"""Multinomial logistic (softmax cross-entropy) loss.
+
+  The multinomial logistic loss is defined as
+
+  .. math::
+      \frac{1}{n}\sum_{i=1}^n \log\Big(\sum_{k=1}^K \exp(\bs{a}_i^T
+      \bs{X}_{:k})\Big) - \bs{a}_i^T \bs{X}_{:b_i}
+      + \frac{1}{2} \alpha \|\bs{X}\|^2_F
+
+  where the coefficients :math:`\bs{X}` have shape (n_features, K) and
+  :math:`b_i \in \{0, \ldots, K - 1\}` is the class of sample i. The
+  solvers work with the flattened coefficients x = X.ravel(), and the
+  gradient has the same shape as x. With intercept, the last K entries of
+  x are the intercepts of each class.
+
+  The margins A X are computed with a single multi-column product, so a
+  gradient costs one pass over A (and one over A^T) for all the classes.
+  The loss is meant for the full-gradient solvers: it has no per-sample
+  partial_deriv, since the stochastic solvers only handle scalar margins.
+
+  Args:
+    A: ndarray or sparse matrix, shape (n_samples, n_features)
+
+    b: array-like of ints, shape (n_samples,)
+        Class labels, in {0, ..., n_classes - 1}.
+
+    alpha: float
+        Amount of squared L2 regularization.
+
+    n_classes: int or None
+        Number of classes, by default max(b) + 1.
+
+    sample_weight: array-like or None
+        Weights of the samples, see :class:`copt.loss.LogLoss`.
+
+    scale, offset: array-like or None
+        Per-feature scale and offset of the columns of A, see
+        :class:`copt.loss.LogLoss`.
+  """
+
+    def __init__(
+        self,
+        A,
+        b,
+        alpha=0.0,
+        n_classes=None,
+        sample_weight=None,
+        scale=None,
+        offset=None,
+    ):
+        b = np.asarray(b)
+        if not A.shape[0] == b.size:
+            raise ValueError("Dimensions of A and b do not coincide")
+        labels = b.astype(np.intp)
+        if n_classes is None:
+            n_classes = labels.max() + 1
+        if np.any(labels != b) or labels.min() < 0 or labels.max() >= n_classes:
+            raise ValueError(
+                "b can only contain integers between 0 and n_classes - 1"
+            )
+        if sparse.issparse(A):
+            A = sparse.csr_matrix(A)
+        self.A = A
+        self.b = b
+        self._labels = labels
+        self.n_classes = int(n_classes)
+        self.alpha = alpha
+        self.intercept = False
+        self.name = "multinomial"
+        self.sample_weight = sample_weight
+        self.scale = scale
+        self.offset = offset
+
+    def _split(self, x):
+        x = self._as_float(x)
+        if self.intercept:
+            return x[: -self.n_classes], x[-self.n_classes :]
+        return x, 0.0
+
+    def _A_dot(self, x):
+        X = x.reshape(self.A.shape[1], self.n_classes)
+        return np.asarray(safe_sparse_dot(self.A, X, dense_output=True))
+
+    def _A_tdot(self, R):
+        return np.asarray(safe_sparse_dot(self.A.T, R, dense_output=True)).ravel()
+
+    def _f_grad_margins(self, x_, Z, return_gradient):
+        # .. Z now holds the residuals ..
+        loss = _softmax_residual(Z, self._labels, self._sample_weight)
+        n_samples = self._total_weight()
+        loss = loss / n_samples + 0.5 * self.alpha * x_.dot(x_)
         if not return_gradient:
             return loss
-        grad = self.A[idx].T.dot(z[idx]) / self.A.shape[0] + self.alpha * x.T
-        grad = np.asarray(grad)
-        grad += self.A[~idx].T.dot(self.delta * np.sign(z[~idx])) / self.A.shape[0]
-        return loss, np.asarray(grad).ravel()
+        grad = self._rmatvec(Z) / n_samples + self.alpha * x_
+        return loss, self._grad_output(x_, grad, Z.sum(0) / n_samples)
+
+    def _batch_residuals(self, Z, idx):
+        w = self._sample_weight
+        return _softmax_residual(Z, self._labels[idx], None if w is None else w[idx])
 
     @property
     def lipschitz(self):
-        s = splinalg.svds(self.A, k=1, return_singular_vectors=False)[0]
-        return (s * s) / self.A.shape[0] + self.alpha
\ No newline at end of file
+        # .. the Hessian of the log-sum-exp is bounded by I / 2 ..
+        return 0.5 * self._squared_norm() / self._total_weight() + self.alpha
+
+    @property
+    def max_lipschitz(self):
+        return 0.5 * self._max_squared_row_norm() + self.alpha
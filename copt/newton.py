@@ -0,0 +1,793 @@
+# python3
+"""Newton-type methods."""
+import warnings
+import numpy as np
+from scipy import linalg, optimize
+from copt import utils
+
+
+def minimize_newton_cg(
+    f_grad,
+    x0,
+    hessian_mv,
+    prox=None,
+    args=(),
+    tol=1e-6,
+    max_iter=100,
+    max_iter_cg=100,
+    max_iter_inner=100,
+    lipschitz=None,
+    verbose=0,
+    callback=None,
+    max_iter_backtracking=50,
+    backtracking_factor=0.5,
+):
+    """Hessian-free (proximal) Newton method.
+
+    Solves problems of the form
+
+            minimize_x f(x) + g(x)
+
+    where f is a twice differentiable function for which we have access to
+    products with its Hessian and g is a (possibly non-smooth) function with
+    a proximal operator, such as :class:`copt.penalty.L1Norm` or
+    :class:`copt.penalty.GroupL1`.
+
+    Without prox, the Newton direction is computed by conjugate gradient
+    on the Hessian, with a tolerance that decreases with the norm of the
+    gradient, and the step size is chosen by an Armijo line search.
+
+    With prox, the next iterate minimizes the quadratic model of f plus g,
+    computed by accelerated proximal gradient (FISTA) on the model. The
+    model is damped by a multiple of the identity, which is increased by
+    backtracking until the model upper bounds f at the next iterate (this
+    guarantees that f + g decreases, and a large damping gives a proximal
+    gradient step). The damping starts at a multiple of the gradient mapping
+    at each iteration, so it vanishes at the solution.
+
+    Every iteration requires one gradient and a few tens of Hessian-vector
+    products. For losses in :mod:`copt.loss`, a Hessian-vector product costs
+    two matrix-vector products with the data matrix.
+
+    Args:
+      f_grad: callable
+        Returns the function value and gradient of the objective function.
+            ``f_grad(x, *args) -> float, ndarray``
+
+      x0 : array-like
+        Initial guess.
+
+      hessian_mv: callable
+        ``hessian_mv(x, *args)`` returns a callable that computes the
+        product of the Hessian at x with a vector, for example
+        :meth:`copt.loss.LogLoss.hessian_mv`.
+
+      prox : callable or None
+        prox(x, step_size) returns the proximal operator of g at x with
+        parameter step_size.
+
+      args : tuple
+        Extra arguments passed to f_grad and hessian_mv.
+
+      tol: float
+        Tolerance of the stopping criterion. The iteration stops when the
+        norm of the gradient (or the gradient mapping if prox is given) is
+        below this tolerance.
+
+      max_iter : int
+        Maximum number of (outer) iterations.
+
+      max_iter_cg : int
+        Maximum number of conjugate gradient iterations per Newton step.
+
+      max_iter_inner : int
+        Maximum number of FISTA iterations on the model per proximal Newton
+        step.
+
+      lipschitz : float or None
+        Upper bound on the largest eigenvalue of the Hessian, used as inverse
+        step size in the FISTA iterations. It is available for the losses in
+        :mod:`copt.loss` as the ``lipschitz`` property. If None, it is
+        estimated at each iteration by power iteration on the Hessian.
+
+      verbose : int
+        Verbosity level, from 0 (no output) to 2 (output on each iteration)
+
+      callback : callable.
+        callback function (optional). Takes a single argument (x) with the
+        current coefficients in the algorithm. The algorithm will exit if
+        callback returns False.
+
+      max_iter_backtracking: int
+        Maximum number of backtracking iterations of the line search (or of
+        the damping with prox).
+
+      backtracking_factor: float
+        The amount to backtrack by during line search. With prox, the
+        damping is divided by this factor instead.
+
+    Returns:
+      res : OptimizeResult
+        The optimization result represented as a
+        ``scipy.optimize.OptimizeResult`` object. Important attributes are:
+        ``x`` the solution array, ``success`` a Boolean flag indicating if
+        the optimizer exited successfully and ``nhev`` the number of
+        Hessian-vector products. See `scipy.optimize.OptimizeResult`
+        for a description of other attributes.
+
+    References:
+      Nocedal, Jorge, and Stephen Wright. "Numerical optimization", chapter 7.
+      Springer, 2006.
+
+      Lee, Jason D., Yuekai Sun, and Michael A. Saunders. `"Proximal Newton-type
+      methods for minimizing composite functions."
+      <https://arxiv.org/abs/1206.1623>`_ SIAM Journal on Optimization, 2014.
+    """
+    x = np.array(x0, dtype=np.float64).ravel()
+    if not max_iter_backtracking > 0:
+        raise ValueError("Line search iterations need to be greater than 0")
+
+    def func_and_grad(x):
+        return f_grad(x, *args)
+
+    line_f_grad = utils.build_line_f_grad(True, f_grad, args, func_and_grad)
+
+    success = False
+    certificate = np.inf
+    n_hessian_mv = 0
+    top_eigenvector = None
+    fk, grad_fk = func_and_grad(x)
+    it = 0
+    for it in range(max_iter):
+        if prox is None:
+            certificate = np.linalg.norm(grad_fk)
+        else:
+            certificate = np.linalg.norm(x - prox(x - grad_fk, 1.0))
+        if verbose > 1:
+            print("Iteration %s, f(x) = %s, certificate = %s" % (it, fk, certificate))
+        if callback is not None:
+            if callback(locals()) is False:  # pylint: disable=g-bool-id-comparison
+                break
+        if certificate < tol:
+            success = True
+            break
+
+        hess_p = hessian_mv(x, *args)
+        # .. forcing sequence, gives superlinear convergence ..
+        inner_tol = min(0.5, np.sqrt(certificate)) * certificate
+        if prox is None:
+            direction, n_mv = _conjugate_gradient(
+                hess_p, grad_fk, inner_tol, max_iter_cg
+            )
+            n_hessian_mv += n_mv
+            phi = line_f_grad(x, direction)
+            step_size = _armijo_step_size(
+                phi,
+                fk,
+                grad_fk.dot(direction),
+                max_iter_backtracking,
+                backtracking_factor,
+            )
+        else:
+            if lipschitz is None:
+                hessian_lipschitz, top_eigenvector, n_mv = _top_eigenvalue(
+                    hess_p, top_eigenvector, x.size
+                )
+                n_hessian_mv += n_mv
+            else:
+                hessian_lipschitz = lipschitz
+            # .. damping of the model, vanishes at the solution ..
+            direction, phi, n_mv, _ = _damped_proximal_step(
+                hess_p,
+                hessian_lipschitz,
+                x,
+                fk,
+                grad_fk,
+                prox,
+                1e-3 * certificate,
+                line_f_grad,
+                inner_tol,
+                max_iter_inner,
+                max_iter_backtracking,
+                backtracking_factor,
+            )
+            n_hessian_mv += n_mv
+            step_size = 1.0
+        fk, grad_fk = phi(step_size, return_gradient=True)
+        x = x + step_size * direction
+    else:
+        warnings.warn(
+            "minimize_newton_cg did not reach the desired tolerance level",
+            RuntimeWarning,
+        )
+
+    return optimize.OptimizeResult(
+        x=x, success=success, certificate=certificate, nit=it, nhev=n_hessian_mv
+    )
+
+
+def minimize_subsampled_newton(
+    f_grad,
+    x0,
+    hessian_mv,
+    n_samples,
+    prox=None,
+    args=(),
+    sample_size=None,
+    tol=1e-6,
+    max_iter=100,
+    max_iter_cg=100,
+    max_iter_inner=100,
+    lipschitz=None,
+    verbose=0,
+    callback=None,
+    max_iter_backtracking=50,
+    backtracking_factor=0.5,
+):
+    """Sub-sampled Hessian-free (proximal) Newton method.
+
+    Variant of :func:`minimize_newton_cg` for objectives that are an average
+    over many samples, in which the Hessian is replaced by the Hessian of
+    the average over a random subset of the samples, drawn with replacement
+    at every iteration. The cost of the Hessian-vector products is then
+    proportional to the size of the subset instead of n_samples, while the
+    gradient is computed exactly.
+
+    The subset size starts at sample_size and doubles (up to n_samples,
+    where the exact Hessian is used) every time the sub-sampled model is
+    not accurate enough: when it overestimates the decrease of the
+    objective (the unit step is rejected by the line search or, with prox,
+    the damping of the model has to be increased) or when an iteration
+    does not reduce the norm of the gradient (mapping) by a factor 10.
+
+    Args:
+      f_grad: callable
+        Returns the function value and gradient of the objective function.
+            ``f_grad(x, *args) -> float, ndarray``
+
+      x0 : array-like
+        Initial guess.
+
+      hessian_mv: callable
+        ``hessian_mv(x, sample_idx, *args)`` returns a callable that computes
+        the product with the Hessian at x of the average over the samples
+        sample_idx (an array of indices, or None for all the samples), for
+        example :meth:`copt.loss.LogLoss.hessian_mv`.
+
+      n_samples: int
+        Number of samples.
+
+      prox : callable or None
+        prox(x, step_size) returns the proximal operator of g at x with
+        parameter step_size.
+
+      args : tuple
+        Extra arguments passed to f_grad and hessian_mv.
+
+      sample_size: int or None
+        Initial number of samples in the Hessian. Defaults to
+        max(100, 10 * n_features).
+
+      tol: float
+        Tolerance of the stopping criterion. The iteration stops when the
+        norm of the gradient (or the gradient mapping if prox is given) is
+        below this tolerance.
+
+      max_iter : int
+        Maximum number of (outer) iterations.
+
+      max_iter_cg : int
+        Maximum number of conjugate gradient iterations per Newton step.
+
+      max_iter_inner : int
+        Maximum number of FISTA iterations on the model per proximal Newton
+        step.
+
+      lipschitz : float or None
+        Upper bound on the largest eigenvalue of the Hessian, see
+        :func:`minimize_newton_cg`.
+
+      verbose : int
+        Verbosity level, from 0 (no output) to 2 (output on each iteration)
+
+      callback : callable.
+        callback function (optional). Takes a single argument (x) with the
+        current coefficients in the algorithm. The algorithm will exit if
+        callback returns False.
+
+      max_iter_backtracking: int
+        Maximum number of backtracking iterations of the line search (or of
+        the damping with prox).
+
+      backtracking_factor: float
+        The amount to backtrack by during line search. With prox, the
+        damping is divided by this factor instead.
+
+    Returns:
+      res : OptimizeResult
+        The optimization result represented as a
+        ``scipy.optimize.OptimizeResult`` object. Important attributes are:
+        ``x`` the solution array, ``success`` a Boolean flag indicating if
+        the optimizer exited successfully, ``nhev`` the number of
+        Hessian-vector products and ``sample_size`` the final size of the
+        subset. See `scipy.optimize.OptimizeResult` for a description of
+        other attributes.
+
+    References:
+      Roosta-Khorasani, Farbod, and Michael W. Mahoney. `"Sub-sampled Newton
+      methods." <https://arxiv.org/abs/1601.04737>`_ Mathematical
+      Programming, 2019.
+
+      Bollapragada, Raghu, Richard H. Byrd, and Jorge Nocedal. `"Exact and
+      inexact subsampled Newton methods for optimization."
+      <https://arxiv.org/abs/1609.08502>`_ IMA Journal of Numerical Analysis,
+      2019.
+    """
+    x = np.array(x0, dtype=np.float64).ravel()
+    if not max_iter_backtracking > 0:
+        raise ValueError("Line search iterations need to be greater than 0")
+    if sample_size is None:
+        sample_size = max(100, 10 * x.size)
+    sample_size = min(int(sample_size), n_samples)
+
+    def func_and_grad(x):
+        return f_grad(x, *args)
+
+    line_f_grad = utils.build_line_f_grad(True, f_grad, args, func_and_grad)
+
+    success = False
+    certificate = np.inf
+    n_hessian_mv = 0
+    top_eigenvector = None
+    model_rejected = False
+    fk, grad_fk = func_and_grad(x)
+    it = 0
+    for it in range(max_iter):
+        previous_certificate = certificate
+        if prox is None:
+            certificate = np.linalg.norm(grad_fk)
+        else:
+            certificate = np.linalg.norm(x - prox(x - grad_fk, 1.0))
+        if model_rejected or certificate > 0.1 * previous_certificate:
+            sample_size = min(2 * sample_size, n_samples)
+        if verbose > 1:
+            print(
+                "Iteration %s, f(x) = %s, certificate = %s, sample size = %s"
+                % (it, fk, certificate, sample_size)
+            )
+        if callback is not None:
+            if callback(locals()) is False:  # pylint: disable=g-bool-id-comparison
+                break
+        if certificate < tol:
+            success = True
+            break
+
+        if sample_size < n_samples:
+            # .. sorted, so that the rows of the subset are read in order ..
+            sample_idx = np.sort(np.random.randint(0, n_samples, sample_size))
+        else:
+            sample_idx = None
+        hess_p = hessian_mv(x, sample_idx, *args)
+        inner_tol = min(0.5, np.sqrt(certificate)) * certificate
+        if prox is None:
+            direction, n_mv = _conjugate_gradient(
+                hess_p, grad_fk, inner_tol, max_iter_cg
+            )
+            n_hessian_mv += n_mv
+            phi = line_f_grad(x, direction)
+            step_size = _armijo_step_size(
+                phi,
+                fk,
+                grad_fk.dot(direction),
+                max_iter_backtracking,
+                backtracking_factor,
+            )
+            model_rejected = step_size < 1
+        else:
+            if lipschitz is None:
+                hessian_lipschitz, top_eigenvector, n_mv = _top_eigenvalue(
+                    hess_p, top_eigenvector, x.size
+                )
+                n_hessian_mv += n_mv
+            else:
+                hessian_lipschitz = lipschitz
+            damping = 1e-3 * certificate
+            direction, phi, n_mv, final_damping = _damped_proximal_step(
+                hess_p,
+                hessian_lipschitz,
+                x,
+                fk,
+                grad_fk,
+                prox,
+                damping,
+                line_f_grad,
+                inner_tol,
+                max_iter_inner,
+                max_iter_backtracking,
+                backtracking_factor,
+            )
+            n_hessian_mv += n_mv
+            step_size = 1.0
+            model_rejected = final_damping > damping
+        fk, grad_fk = phi(step_size, return_gradient=True)
+        x = x + step_size * direction
+    else:
+        warnings.warn(
+            "minimize_subsampled_newton did not reach the desired tolerance level",
+            RuntimeWarning,
+        )
+
+    return optimize.OptimizeResult(
+        x=x,
+        success=success,
+        certificate=certificate,
+        nit=it,
+        nhev=n_hessian_mv,
+        sample_size=sample_size,
+    )
+
+
+def minimize_proximal_lbfgs(
+    fun,
+    x0,
+    prox=None,
+    jac="2-point",
+    tol=1e-6,
+    max_iter=500,
+    args=(),
+    verbose=0,
+    callback=None,
+    memory=10,
+    max_iter_inner=100,
+    max_iter_backtracking=50,
+    backtracking_factor=0.5,
+    eps=1e-8,
+):
+    """Limited-memory proximal quasi-Newton method.
+
+    Solves problems of the form
+
+            minimize_x f(x) + g(x)
+
+    where f is a differentiable function and we have access to the proximal
+    operator of g.
+
+    The curvature of f is modeled by an L-BFGS matrix built from the last
+    memory pairs of differences of iterates and gradients, in the compact
+    representation B = gamma I - W M W^T, where W has 2 * memory columns.
+    Without prox, the step is given by the two-loop recursion and an Armijo
+    line search. With prox, the next iterate minimizes the model of f plus
+    g, computed by accelerated proximal gradient (FISTA) on the model. An
+    inner iteration costs O(n_features * memory) plus one proximal operator
+    and never touches the data, which is cheap for separable penalties such
+    as :class:`copt.penalty.L1Norm`, :class:`copt.constraint.LinfBall` (box)
+    or :class:`copt.penalty.GroupL1`. For penalties with an expensive
+    proximal operator the model is solved inexactly, with a tolerance that
+    decreases with the gradient mapping. The model is damped as in
+    :func:`minimize_newton_cg`.
+
+    Args:
+      fun : callable
+        The objective function to be minimized.
+            ``fun(x, *args) -> float``
+        where x is an 1-D array with shape (n,) and `args`
+        is a tuple of the fixed parameters needed to completely
+        specify the function.
+
+      x0 : ndarray, shape (n,)
+        Initial guess.
+
+      prox : callable, optional.
+        Proximal operator g.
+
+      jac : {callable,  '2-point', bool}, optional
+        Method for computing the gradient vector, see
+        :func:`minimize_proximal_gradient`.
+
+      tol: float, optional
+        Tolerance of the optimization procedure. The iteration stops when
+        the gradient mapping (with unit step size) is below this tolerance.
+
+      max_iter : int, optional.
+        Maximum number of iterations.
+
+      args : tuple, optional
+        Extra arguments passed to the objective function and its
+        derivatives.
+
+      verbose : int, optional.
+        Verbosity level, from 0 (no output) to 2 (output on each iteration)
+
+      callback : callable.
+        callback function (optional). Takes a single argument (x) with the
+        current coefficients in the algorithm. The algorithm will exit if
+        callback returns False.
+
+      memory : int
+        Number of pairs stored in the L-BFGS model.
+
+      max_iter_inner : int
+        Maximum number of FISTA iterations on the model per iteration.
+
+      max_iter_backtracking: int
+        Maximum number of backtracking iterations of the line search (or of
+        the damping with prox).
+
+      backtracking_factor: float
+        The amount to backtrack by during line search.
+
+      eps: float or ndarray
+        If jac is approximated, use this value for the step size.
+
+    Returns:
+      res : The optimization result represented as a
+        ``scipy.optimize.OptimizeResult`` object. Important attributes are:
+        ``x`` the solution array, ``success`` a Boolean flag indicating if
+        the optimizer exited successfully. See `scipy.optimize.OptimizeResult`
+        for a description of other attributes.
+
+    References:
+      Byrd, Richard H., Jorge Nocedal, and Robert B. Schnabel. "Representations
+      of quasi-Newton matrices and their use in limited memory methods."
+      Mathematical Programming, 1994.
+
+      Lee, Jason D., Yuekai Sun, and Michael A. Saunders. `"Proximal Newton-type
+      methods for minimizing composite functions."
+      <https://arxiv.org/abs/1206.1623>`_ SIAM Journal on Optimization, 2014.
+    """
+    x = np.array(x0, dtype=np.float64).ravel()
+    if not max_iter_backtracking > 0:
+        raise ValueError("Line search iterations need to be greater than 0")
+
+    func_and_grad = utils.build_func_grad(jac, fun, args, eps)
+    line_f_grad = utils.build_line_f_grad(jac, fun, args, func_and_grad)
+
+    success = False
+    certificate = np.inf
+    # .. pairs of differences of iterates (s) and gradients (y) ..
+    s_list, y_list = [], []
+    fk, grad_fk = func_and_grad(x)
+    gamma = utils.init_lipschitz(func_and_grad, x)
+    it = 0
+    for it in range(max_iter):
+        if prox is None:
+            certificate = np.linalg.norm(grad_fk)
+        else:
+            certificate = np.linalg.norm(x - prox(x - grad_fk, 1.0))
+        if verbose > 1:
+            print("Iteration %s, f(x) = %s, certificate = %s" % (it, fk, certificate))
+        if callback is not None:
+            if callback(locals()) is False:  # pylint: disable=g-bool-id-comparison
+                break
+        if certificate < tol:
+            success = True
+            break
+
+        if prox is None:
+            direction = -_lbfgs_inverse_mv(grad_fk, s_list, y_list, gamma)
+            phi = line_f_grad(x, direction)
+            step_size = _armijo_step_size(
+                phi,
+                fk,
+                grad_fk.dot(direction),
+                max_iter_backtracking,
+                backtracking_factor,
+            )
+        else:
+            hess_p, hessian_lipschitz = _lbfgs_compact(s_list, y_list, gamma)
+            inner_tol = min(0.5, np.sqrt(certificate)) * certificate
+            direction, phi, _, _ = _damped_proximal_step(
+                hess_p,
+                hessian_lipschitz,
+                x,
+                fk,
+                grad_fk,
+                prox,
+                1e-3 * certificate,
+                line_f_grad,
+                inner_tol,
+                max_iter_inner,
+                max_iter_backtracking,
+                backtracking_factor,
+            )
+            step_size = 1.0
+        f_next, grad_next = phi(step_size, return_gradient=True)
+        s = step_size * direction
+        y = grad_next - grad_fk
+        sy = s.dot(y)
+        # .. skip the pair if the curvature condition does not hold ..
+        if sy > 1e-10 * np.linalg.norm(s) * np.linalg.norm(y):
+            s_list.append(s)
+            y_list.append(y)
+            if len(s_list) > memory:
+                s_list.pop(0)
+                y_list.pop(0)
+            gamma = y.dot(y) / sy
+        x = x + s
+        fk, grad_fk = f_next, grad_next
+    else:
+        warnings.warn(
+            "minimize_proximal_lbfgs did not reach the desired tolerance level",
+            RuntimeWarning,
+        )
+
+    return optimize.OptimizeResult(
+        x=x, success=success, certificate=certificate, nit=it
+    )
+
+
+def _conjugate_gradient(hess_p, grad, tol, max_iter):
+    """Approximately solve hess_p(p) = -grad by conjugate gradient.
+
+    Stops early on directions of non-positive curvature, in which case the
+    last iterate (or -grad on the first iteration) is returned. Returns the
+    direction and the number of Hessian-vector products.
+    """
+    p = np.zeros_like(grad)
+    residual = grad.copy()
+    d = -residual
+    rr = residual.dot(residual)
+    k = 0
+    for k in range(max_iter):
+        if np.sqrt(rr) <= tol:
+            return p, k
+        Hd = hess_p(d)
+        curvature = d.dot(Hd)
+        if curvature <= 0:
+            if k == 0:
+                p = d
+            return p, k + 1
+        alpha = rr / curvature
+        p += alpha * d
+        residual += alpha * Hd
+        rr_next = residual.dot(residual)
+        d *= rr_next / rr
+        d -= residual
+        rr = rr_next
+    return p, k + 1
+
+
+def _armijo_step_size(phi, fk, slope, max_iter_backtracking, backtracking_factor):
+    """Backtracking line search for the Armijo condition, starting at 1."""
+    step_size = 1.0
+    for _ in range(max_iter_backtracking):
+        if phi(step_size) <= fk + 1e-4 * step_size * slope:
+            break
+        step_size *= backtracking_factor
+    else:
+        warnings.warn("Maximum number of line-search iterations reached")
+    return step_size
+
+
+def _damped_proximal_step(
+    hess_p,
+    lipschitz,
+    x,
+    fk,
+    grad,
+    prox,
+    damping,
+    line_f_grad,
+    tol,
+    max_iter_inner,
+    max_iter_backtracking,
+    backtracking_factor,
+):
+    """Minimize the quadratic model of f with Hessian hess_p plus g.
+
+    The model is damped by damping times the identity, which is increased
+    by backtracking until the model upper bounds f at the next iterate, so
+    that f + g decreases. A large damping gives a proximal gradient step.
+    Returns the direction, the restriction of f to it (see
+    :func:`copt.utils.build_line_f_grad`), the number of Hessian-vector
+    products and the final damping.
+    """
+    n_mv = 0
+    y = x
+    for _ in range(max_iter_backtracking):
+
+        def model_hess_p(s):
+            return hess_p(s) + damping * s
+
+        direction, y, k = _proximal_newton_direction(
+            model_hess_p, x, y, grad, prox, lipschitz + damping, tol, max_iter_inner
+        )
+        n_mv += k + 1
+        phi = line_f_grad(x, direction)
+        rhs = fk + grad.dot(direction) + 0.5 * direction.dot(model_hess_p(direction))
+        if phi(1.0) <= rhs:
+            break
+        damping /= backtracking_factor
+    else:
+        warnings.warn("Maximum number of line-search iterations reached")
+    return direction, phi, n_mv, damping
+
+
+def _proximal_newton_direction(hess_p, x, y0, grad, prox, lipschitz, tol, max_iter):
+    """Minimize the model grad^T (y - x) + (y - x)^T H (y - x) / 2 + g(y) by FISTA.
+
+    Starts from y0. Returns the direction y - x, the minimizer y and the
+    number of Hessian-vector products.
+    """
+    step_size = 1.0 / lipschitz
+    y = y0.copy()
+    w = y0.copy()
+    tk = 1.0
+    k = 0
+    for k in range(max_iter):
+        y_next = prox(w - step_size * (grad + hess_p(w - x)), step_size)
+        t_next = (1 + np.sqrt(1 + 4 * tk * tk)) / 2
+        delta = y_next - y
+        w = y_next + ((tk - 1.0) / t_next) * delta
+        y = y_next
+        tk = t_next
+        if np.linalg.norm(delta) * lipschitz <= tol:
+            break
+    return y - x, y, k + 1
+
+
+def _lbfgs_inverse_mv(grad, s_list, y_list, gamma):
+    """Product of the inverse L-BFGS matrix with grad (two-loop recursion)."""
+    q = grad.copy()
+    rho = [1.0 / s.dot(y) for s, y in zip(s_list, y_list)]
+    alpha = np.empty(len(s_list))
+    for i in range(len(s_list) - 1, -1, -1):
+        alpha[i] = rho[i] * s_list[i].dot(q)
+        q -= alpha[i] * y_list[i]
+    q /= gamma
+    for i in range(len(s_list)):
+        beta = rho[i] * y_list[i].dot(q)
+        q += (alpha[i] - beta) * s_list[i]
+    return q
+
+
+def _lbfgs_compact(s_list, y_list, gamma):
+    """Compact representation B = gamma I - W M W^T of the L-BFGS matrix.
+
+    Returns a callable that computes products with B and its largest
+    eigenvalue.
+    """
+    if not s_list:
+        return lambda v: gamma * v, gamma
+    S = np.array(s_list)
+    Y = np.array(y_list)
+    SY = S.dot(Y.T)
+    L = np.tril(SY, -1)
+    middle = np.block([[gamma * S.dot(S.T), L], [L.T, -np.diag(np.diag(SY))]])
+    W = np.vstack((gamma * S, Y))
+    middle_inv = linalg.pinvh(middle)
+
+    def hess_p(v):
+        return gamma * v - W.T.dot(middle_inv.dot(W.dot(v)))
+
+    # .. B acts as gamma I on the orthogonal of the range of W^T ..
+    R = linalg.qr(W.T, mode="r")[0][: W.shape[0]]
+    low_rank = linalg.eigvalsh(R.dot(middle_inv).dot(R.T))
+    return hess_p, gamma - min(low_rank.min(), 0.0)
+
+
+def _top_eigenvalue(hess_p, v0, n_features, tol=1e-2, max_iter=20):
+    """Estimate the largest eigenvalue of the Hessian by power iteration.
+
+    The estimate is inflated by the norm of the residual so that it is
+    likely an upper bound. Returns the estimate, the eigenvector to
+    warm-start the next call and the number of Hessian-vector products.
+    """
+    if v0 is None:
+        v = np.random.randn(n_features)
+    else:
+        v = v0.copy()
+    v /= np.linalg.norm(v)
+    eigenvalue = 0.0
+    k = 0
+    for k in range(max_iter):
+        w = hess_p(v)
+        eigenvalue = v.dot(w)
+        residual = np.linalg.norm(w - eigenvalue * v)
+        norm_w = np.linalg.norm(w)
+        if norm_w == 0:
+            break
+        v = w / norm_w
+        if residual <= tol * eigenvalue:
+            break
+    return 1.1 * (eigenvalue + residual), v, k + 1
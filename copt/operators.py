@@ -0,0 +1,267 @@
+"""Matrix-free structured linear operators.
+
+The operators in this module are scipy.sparse.linalg.LinearOperator
+instances, so that they can be passed as the L argument of
+:func:`copt.minimize_primal_dual` and as the data matrix of the losses in
+:mod:`copt.loss`. They act on flattened (C order) arrays and their products
+cost O(n) or O(n log n), without forming the matrix. Each of them has a
+norm method returning its spectral norm (or an upper bound on it). The
+products of float32 inputs are float32 (see :func:`copt.utils.float_dtype`).
+"""
+import numpy as np
+from scipy.sparse import linalg as splinalg
+
+from copt import utils
+
+
+def _spectral_norm(A):
+    """Spectral norm of A, from its norm method if it has one."""
+    if utils.is_linear_operator(A) and callable(getattr(A, "norm", None)):
+        return A.norm()
+    return np.sqrt(utils.power_iteration(A)[0])
+
+
+def _as_shape(shape):
+    if np.isscalar(shape):
+        return (int(shape),)
+    return tuple(int(s) for s in shape)
+
+
+class FiniteDifferences(splinalg.LinearOperator):
+    """Forward differences of an n-dimensional array along each of its axes.
+
+    For an input x of shape `shape` (flattened), the output is the
+    concatenation of the flattened np.diff(x, axis=k) for k = 0, ..., ndim - 1.
+    The l1 norm of the output is then the anisotropic total variation of x,
+    e.g. for shape=(n_rows, n_cols) it is the 2D total variation of
+    :func:`copt.tv_prox.prox_tv2d`.
+
+    Args:
+      shape: int or tuple of ints
+          Shape of the (1D, 2D, 3D or higher dimensional) input array.
+    """
+
+    def __init__(self, shape):
+        self.grid_shape = _as_shape(shape)
+        n_features = int(np.prod(self.grid_shape))
+        n_rows = sum(n_features // n * (n - 1) for n in self.grid_shape)
+        super().__init__(np.float64, (n_rows, n_features))
+
+    def _matvec(self, x):
+        x = np.asarray(x)
+        x = x.astype(utils.float_dtype(x), copy=False).reshape(self.grid_shape)
+        return np.concatenate(
+            [np.diff(x, axis=k).ravel() for k in range(len(self.grid_shape))]
+        )
+
+    def _rmatvec(self, r):
+        r = np.asarray(r)
+        r = r.astype(utils.float_dtype(r), copy=False).ravel()
+        out = np.zeros(self.grid_shape, dtype=r.dtype)
+        start = 0
+        for k, n in enumerate(self.grid_shape):
+            diff_shape = self.grid_shape[:k] + (n - 1,) + self.grid_shape[k + 1:]
+            end = start + int(np.prod(diff_shape))
+            rk = r[start:end].reshape(diff_shape)
+            # .. the adjoint of the forward difference is minus the backward one ..
+            head = (slice(None),) * k
+            out[head + (slice(1, None),)] += rk
+            out[head + (slice(None, -1),)] -= rk
+            start = end
+        return out.ravel()
+
+    def norm(self):
+        """Spectral norm (exact).
+
+        D^T D is the sum over the axes of path-graph Laplacians, whose
+        largest eigenvalue is 4 sin^2(pi (n - 1) / (2 n)).
+        """
+        n = np.array(self.grid_shape, dtype=np.float64)
+        return np.sqrt(np.sum(4 * np.sin(np.pi * (n - 1) / (2 * n)) ** 2))
+
+
+class Convolution(splinalg.LinearOperator):
+    """Convolution with a kernel, computed with the FFT.
+
+    The output has the same shape as the input and the kernel is centered,
+    i.e. entry (k - 1) // 2 along each axis of the kernel is its origin.
+
+    Args:
+      kernel: ndarray
+          Convolution kernel, with as many dimensions as shape.
+
+      shape: int or tuple of ints
+          Shape of the input array.
+
+      mode: {"circular", "zero"}
+          Boundary conditions. With "circular" the input is extended
+          periodically and the operator is diagonalized by the FFT. With
+          "zero" the input is extended by zeros, as in
+          scipy.signal.convolve(x, kernel, mode="same") for odd-sized
+          kernels.
+    """
+
+    def __init__(self, kernel, shape, mode="circular"):
+        self.grid_shape = _as_shape(shape)
+        kernel = np.asarray(kernel, dtype=np.float64)
+        if kernel.ndim != len(self.grid_shape):
+            raise ValueError(
+                "kernel has %s dimensions but the input has %s"
+                % (kernel.ndim, len(self.grid_shape))
+            )
+        if mode == "circular":
+            if any(k > n for k, n in zip(kernel.shape, self.grid_shape)):
+                raise ValueError("kernel is larger than the input")
+            self._fft_shape = self.grid_shape
+            # .. wrap the kernel around so that its center is at the origin ..
+            padded = np.zeros(self.grid_shape)
+            padded[tuple(slice(0, k) for k in kernel.shape)] = kernel
+            padded = np.roll(
+                padded,
+                [-((k - 1) // 2) for k in kernel.shape],
+                axis=tuple(range(kernel.ndim)),
+            )
+            self._kernel_fft = np.fft.rfftn(padded)
+            self._crop = tuple(slice(0, n) for n in self.grid_shape)
+        elif mode == "zero":
+            # .. large enough for the circular convolution to be linear ..
+            self._fft_shape = tuple(
+                n + k - 1 for n, k in zip(self.grid_shape, kernel.shape)
+            )
+            self._kernel_fft = np.fft.rfftn(kernel, self._fft_shape)
+            self._crop = tuple(
+                slice((k - 1) // 2, (k - 1) // 2 + n)
+                for n, k in zip(self.grid_shape, kernel.shape)
+            )
+        else:
+            raise ValueError("mode should be 'circular' or 'zero', got %r" % mode)
+        self.kernel = kernel
+        self.mode = mode
+        n_features = int(np.prod(self.grid_shape))
+        super().__init__(np.float64, (n_features, n_features))
+
+    def _apply(self, x, kernel_fft, crop_in, crop_out):
+        x = np.asarray(x)
+        padded = np.zeros(self._fft_shape)
+        padded[crop_in] = x.reshape(self.grid_shape)
+        out = np.fft.irfftn(np.fft.rfftn(padded) * kernel_fft, self._fft_shape)
+        # .. numpy's FFT computes in double precision ..
+        return out[crop_out].astype(utils.float_dtype(x)).ravel()
+
+    def _matvec(self, x):
+        input_region = tuple(slice(0, n) for n in self.grid_shape)
+        return self._apply(x, self._kernel_fft, input_region, self._crop)
+
+    def _rmatvec(self, r):
+        # .. the adjoint is the correlation, whose transfer function is ..
+        # .. the complex conjugate of the kernel's ..
+        input_region = tuple(slice(0, n) for n in self.grid_shape)
+        return self._apply(r, np.conj(self._kernel_fft), self._crop, input_region)
+
+    def norm(self):
+        """Spectral norm, exact for circular boundary conditions.
+
+        For zero boundary conditions the operator is a submatrix of a
+        circular convolution and this is an upper bound.
+        """
+        return np.abs(self._kernel_fft).max()
+
+
+class Kronecker(splinalg.LinearOperator):
+    """Kronecker product of two matrices or linear operators.
+
+    The product is computed as (A kron B) vec(X) = vec(A X B^T), where vec
+    flattens in C order, without forming A kron B.
+
+    Args:
+      A, B: ndarray, sparse matrix or LinearOperator
+          Factors of the product.
+    """
+
+    def __init__(self, A, B):
+        self.A = A
+        self.B = B
+        shape = (A.shape[0] * B.shape[0], A.shape[1] * B.shape[1])
+        super().__init__(np.float64, shape)
+
+    @staticmethod
+    def _product(A, B, X):
+        # .. A X B^T, written with left products only so that ..
+        # .. LinearOperator factors use their matmat ..
+        AX = np.asarray(A @ X)
+        return np.asarray(B @ AX.T).T
+
+    def _matvec(self, x):
+        X = np.asarray(x).reshape(self.A.shape[1], self.B.shape[1])
+        return self._product(self.A, self.B, X).ravel()
+
+    def _rmatvec(self, r):
+        R = np.asarray(r).reshape(self.A.shape[0], self.B.shape[0])
+        return self._product(self.A.T, self.B.T, R).ravel()
+
+    def norm(self):
+        """Spectral norm, the product of the norms of the factors.
+
+        The norms of factors without a norm method are estimated by power
+        iteration.
+        """
+        return _spectral_norm(self.A) * _spectral_norm(self.B)
+
+
+class RowSubsampling(splinalg.LinearOperator):
+    """Subset of the rows of a matrix or linear operator.
+
+    The rows are selected from the output of A, so that the rows of a
+    matrix are not copied and operators such as :class:`Convolution` can be
+    subsampled (e.g. for inpainting or compressed sensing problems).
+
+    Args:
+      A: int, ndarray, sparse matrix or LinearOperator
+          Operator whose rows are selected. An integer n stands for the
+          n x n identity, in which case the operator extracts the entries
+          indices of its input.
+
+      indices: array of ints
+          Indices of the selected rows, possibly repeated.
+    """
+
+    def __init__(self, A, indices):
+        self.A = A
+        self.indices = np.asarray(indices, dtype=np.int64).ravel()
+        n_rows = A if np.isscalar(A) else A.shape[0]
+        n_features = A if np.isscalar(A) else A.shape[1]
+        if self.indices.size and (
+            self.indices.min() < 0 or self.indices.max() >= n_rows
+        ):
+            raise ValueError("indices out of range for %s rows" % n_rows)
+        super().__init__(np.float64, (self.indices.size, int(n_features)))
+
+    def _matvec(self, x):
+        x = np.asarray(x)
+        x = x.astype(utils.float_dtype(x), copy=False).ravel()
+        if not np.isscalar(self.A):
+            x = utils.matvec(self.A, x)
+        return x[self.indices]
+
+    def _rmatvec(self, r):
+        n_rows = self.A if np.isscalar(self.A) else self.A.shape[0]
+        r = np.asarray(r)
+        r = r.astype(utils.float_dtype(r), copy=False).ravel()
+        out = np.zeros(n_rows, dtype=r.dtype)
+        np.add.at(out, self.indices, r)
+        if not np.isscalar(self.A):
+            out = utils.rmatvec(self.A, out)
+        return out
+
+    def norm(self):
+        """Upper bound on the spectral norm.
+
+        The selection has norm sqrt of the largest number of repetitions of
+        an index, which multiplies the norm of A.
+        """
+        if not self.indices.size:
+            return 0.0
+        norm = np.sqrt(np.bincount(self.indices).max())
+        if not np.isscalar(self.A):
+            norm *= _spectral_norm(self.A)
+        return norm
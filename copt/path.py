@@ -0,0 +1,282 @@
+"""Regularization paths with warm starts."""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy import linalg, optimize
+
+from copt import penalty as penalty_module
+from copt import proximal_gradient, randomized, utils
+
+
+def _n_coef(loss):
+    """Number of coefficients and of intercepts of the loss."""
+    n_classes = getattr(loss, "n_classes", 1)
+    n_intercept = n_classes if loss.intercept else 0
+    return loss.A.shape[1] * n_classes, n_intercept
+
+
+def _dual_norm(pen, g):
+    """Dual norm of g for a penalty built with alpha=1."""
+    if isinstance(pen, penalty_module.L1Norm):
+        return np.abs(g).max()
+    if isinstance(pen, penalty_module.GroupL1):
+        return max(np.linalg.norm(g[grp]) for grp in pen.groups)
+    if isinstance(pen, penalty_module.TraceNorm):
+        return linalg.svdvals(g.reshape(pen.shape))[0]
+    raise ValueError(
+        "alpha_max is implemented for L1Norm, GroupL1 and TraceNorm, got %s"
+        % type(pen).__name__
+    )
+
+
+def alpha_max(loss, penalty, penalty_args=()):
+    """Smallest regularization parameter for which zero is a solution.
+
+    Zero minimizes loss + penalty(alpha) if and only if the dual norm of
+    the gradient of the loss at zero is at most alpha. The unpenalized
+    coefficients, i.e. the intercept and, with GroupL1, the features that
+    are in no group, are first set to minimize the loss with the penalized
+    coefficients at zero, and the gradient is taken there.
+
+    Args:
+      loss: loss object
+          One of the losses of :mod:`copt.loss`.
+
+      penalty: class
+          Class of the penalty: L1Norm, GroupL1 or TraceNorm.
+
+      penalty_args: tuple
+          Arguments of the penalty after alpha, e.g. (groups,) for GroupL1.
+
+    Returns:
+      alpha_max: float
+    """
+    n_coef, n_intercept = _n_coef(loss)
+    pen = penalty(1.0, *penalty_args)
+    x = np.zeros(n_coef + n_intercept)
+    free = np.zeros(x.size, dtype=bool)
+    free[n_coef:] = True
+    if isinstance(pen, penalty_module.GroupL1):
+        free[:n_coef] = True
+        for grp in pen.groups:
+            free[grp] = False
+    if free.any():
+
+        def f_grad_free(c):
+            x[free] = c
+            f, grad = loss.f_grad(x)
+            return f, grad[free]
+
+        opt = optimize.minimize(
+            f_grad_free, np.zeros(free.sum()), jac=True, method="L-BFGS-B",
+            options={"gtol": 1e-10}
+        )
+        x[free] = opt.x
+    grad = loss.f_grad(x)[1][:n_coef]
+    return float(_dual_norm(pen, grad))
+
+
+def _make_solve(loss, penalty, penalty_args, solver, step_size, tol, max_iter):
+    """Function solving the problem for one alpha from a warm start."""
+    n_coef, n_intercept = _n_coef(loss)
+    if solver is randomized.minimize_saga:
+        # .. the functions passed to SAGA are created once, so that its ..
+        # .. compiled epoch is reused across alphas ..
+        f_deriv = loss.partial_deriv
+        prox = penalty(1.0, *penalty_args).prox_factory(n_coef)
+        b = np.asarray(loss.b, dtype=np.float64)
+
+        def solve(alpha, x, state):
+            res = solver(
+                f_deriv,
+                loss.A,
+                b,
+                x[:n_coef],
+                step_size,
+                prox=prox,
+                prox_scale=alpha,
+                alpha=loss.alpha,
+                max_iter=max_iter,
+                tol=tol,
+                verbose=0,
+                warm_start=state,
+                fit_intercept=loss.intercept,
+                sample_weight=loss.sample_weight,
+                scale=loss.scale,
+                offset=loss.offset,
+            )
+            x = res.x if not n_intercept else np.append(res.x, res.intercept)
+            return x, res
+
+        return solve
+
+    def solve(alpha, x, state):
+        pen = penalty(alpha, *penalty_args)
+        if n_intercept:
+
+            def prox(y, s):
+                # .. the intercepts are not penalized ..
+                return np.concatenate((pen.prox(y[:n_coef], s), y[n_coef:]))
+
+        else:
+            prox = pen.prox
+        if step_size is not None:
+            step = float(step_size)
+        elif state is not None:
+            # .. the line search starts from the last step size ..
+            step = (state.step_size, "backtracking")
+        else:
+            step = "backtracking"
+        res = solver(
+            loss.f_grad, x, prox=prox, jac=True, step=step, tol=tol, max_iter=max_iter
+        )
+        return res.x, res
+
+    return solve
+
+
+def _solve_segment(
+    alphas, loss, penalty, penalty_args, solver, step_size, x0, tol, max_iter, verbose
+):
+    """Solutions, iterations and success flags along a segment of the grid."""
+    solve = _make_solve(loss, penalty, penalty_args, solver, step_size, tol, max_iter)
+    n_coef = _n_coef(loss)[0]
+    x = np.array(x0, dtype=np.float64)
+    state = None
+    out = []
+    for alpha in alphas:
+        x, state = solve(alpha, x, state)
+        if verbose:
+            print(
+                "alpha = %.3e, %s iterations, %s nonzero coefficients"
+                % (alpha, state.nit, np.count_nonzero(x[:n_coef]))
+            )
+        out.append((x.copy(), state.nit, state.success))
+    return out
+
+
+def regularization_path(
+    loss,
+    penalty,
+    alphas=None,
+    penalty_args=(),
+    n_alphas=10,
+    eps=1e-3,
+    solver=None,
+    step_size=None,
+    x0=None,
+    tol=1e-6,
+    max_iter=500,
+    n_jobs=1,
+    verbose=0,
+):
+    """Solutions of loss + penalty(alpha) for a decreasing grid of alphas.
+
+    Each problem is warm-started from the solution of the previous one. The
+    quantities that do not depend on alpha are computed once: the step size
+    (the line search of the proximal gradient starts from the step size of
+    the previous problem) and, for SAGA, the
+    derivative of the loss, the proximal operator (compiled for alpha=1 and
+    rescaled through prox_scale, so that the SAGA epoch is compiled once
+    for the whole path), its memory terms and its support matrix.
+
+    Args:
+      loss: loss object
+          One of the losses of :mod:`copt.loss`. Its alpha (the squared
+          l2 regularization) is kept fixed along the path.
+
+      penalty: class
+          Class of the penalty, instantiated as penalty(alpha,
+          *penalty_args), e.g. copt.penalty.L1Norm. With SAGA, it should be
+          a norm with a prox_factory method (L1Norm or GroupL1).
+
+      alphas: array-like, optional
+          Decreasing regularization parameters. By default, n_alphas values
+          spaced evenly on a log scale from alpha_max (see
+          :func:`alpha_max`) to eps * alpha_max.
+
+      penalty_args: tuple
+          Arguments of the penalty after alpha, e.g. (groups,) for GroupL1.
+
+      n_alphas, eps:
+          Size and extent of the default grid of alphas.
+
+      solver: callable, optional
+          :func:`copt.minimize_proximal_gradient` (default) or
+          :func:`copt.minimize_saga`.
+
+      step_size: float, optional
+          Step size of the solver. By default the proximal gradient uses a
+          backtracking line search, started from the step size of the
+          previous problem, and SAGA 1 / (3 loss.max_lipschitz).
+
+      x0: array, optional
+          Starting point of the first problem (of each segment with
+          n_jobs > 1), zero by default. With an intercept, its last
+          entries are the intercepts, as in the losses (SAGA starts from a
+          zero intercept).
+
+      tol, max_iter:
+          Tolerance and maximum number of iterations (epochs for SAGA) of
+          each problem.
+
+      n_jobs: int
+          Number of processes. The grid is split into n_jobs contiguous
+          segments, each of them solved with warm starts in its own process
+          (with its own copy of the loss). -1 means all the CPUs. The
+          processes are spawned, so scripts calling this function with
+          n_jobs > 1 need an ``if __name__ == "__main__":`` guard.
+
+      verbose: int
+          Verbosity level.
+
+    Returns:
+      res: OptimizeResult
+          With the regularization parameters alphas, the solutions coefs
+          (of shape (len(alphas), size of x)) and the number of iterations
+          nit and success flag of each problem.
+    """
+    if solver is None:
+        solver = proximal_gradient.minimize_proximal_gradient
+    if solver not in (
+        proximal_gradient.minimize_proximal_gradient,
+        randomized.minimize_saga,
+    ):
+        raise ValueError("solver should be minimize_proximal_gradient or minimize_saga")
+    if alphas is None:
+        a_max = alpha_max(loss, penalty, penalty_args)
+        alphas = a_max * np.logspace(0, np.log10(eps), n_alphas)
+    alphas = np.asarray(alphas, dtype=np.float64).ravel()
+    if np.any(np.diff(alphas) > 0):
+        raise ValueError("alphas should be decreasing")
+    n_coef, n_intercept = _n_coef(loss)
+    if x0 is None:
+        x0 = np.zeros(n_coef + n_intercept)
+
+    if solver is randomized.minimize_saga:
+        if n_intercept > 1:
+            raise ValueError("minimize_saga does not support MultinomialLogLoss")
+        if step_size is None:
+            step_size = 1.0 / (3 * loss.max_lipschitz)
+    args = (loss, penalty, penalty_args, solver, step_size, x0, tol, max_iter, verbose)
+
+    segments = np.array_split(np.arange(alphas.size), utils.effective_n_jobs(n_jobs))
+    segments = [alphas[s] for s in segments if s.size]
+    if len(segments) == 1:
+        results = [_solve_segment(segments[0], *args)]
+    else:
+        # .. processes rather than threads: the loss caches and the
+        # parallel numba kernels are not safe to share between threads ..
+        with ProcessPoolExecutor(
+            max_workers=len(segments), mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            futures = [executor.submit(_solve_segment, a, *args) for a in segments]
+            results = [future.result() for future in futures]
+    results = [r for segment in results for r in segment]
+    return optimize.OptimizeResult(
+        alphas=alphas,
+        coefs=np.array([r[0] for r in results]),
+        nit=np.array([r[1] for r in results]),
+        success=np.array([r[2] for r in results]),
+    )
@@ -42,7 +42,8 @@ def minimize_proximal_gradient(
 
     x0 : ndarray, shape (n,)
         Initial guess. Array of real elements of size (n,),
-        where 'n' is the number of independent variables.
+        where 'n' is the number of independent variables. The iterates
+        are float32 if x0 is float32, and float64 otherwise.
 
     jac : {callable,  '2-point', bool}, optional
         Method for computing the gradient vector. If it is a callable,
@@ -77,9 +78,12 @@ def minimize_proximal_gradient(
         current coefficients in the algorithm. The algorithm will exit if
         callback returns False.
 
-    step : "backtracking" or callable.
+    step : "backtracking", callable, float or tuple.
         Step-size strategy to use. "backtracking" will use a backtracking line-search,
-        while callable will use the value returned by step(locals()).
+        while callable will use the value returned by step(locals()). A float
+        is a fixed step size, and a tuple (step_size, "backtracking") starts
+        the line search from step_size, e.g., the step_size of a previous
+        result, instead of estimating it.
 
     accelerated: boolean
         Whether to use the accelerated variant of the algorithm.
@@ -109,7 +113,11 @@ def minimize_proximal_gradient(
   Examples:
     * :ref:`sphx_glr_auto_examples_plot_group_lasso.py`
   """
-    x = np.asarray(x0).flatten()
+    x = np.asarray(x0)
+    x = x.astype(utils.float_dtype(x)).ravel()
+    # .. for float32 iterates, the sufficient decrease condition is ..
+    # .. checked up to their precision ..
+    ls_eps = np.finfo(np.float32).eps if x.dtype == np.float32 else 0.0
     if max_iter_backtracking <= 0:
         raise ValueError("Line search iterations need to be greater than 0")
 
@@ -126,11 +134,12 @@ def minimize_proximal_gradient(
     func_and_grad = utils.build_func_grad(jac, fun, args, eps)
 
     # find initial step-size
-    if step == "backtracking":
+    # .. to avoid step_size being undefined upon return ..
+    step_size = None
+    if not isinstance(step, str) and not hasattr(step, "__call__"):
+        step_size, step = utils.parse_step_size(step)
+    if step == "backtracking" and step_size is None:
         step_size = 1.8 / utils.init_lipschitz(func_and_grad, x0)
-    else:
-        # to avoid step_size being undefined upon return
-        step_size = None
 
     n_iterations = 0
     certificate_list = []
@@ -159,7 +168,7 @@ def minimize_proximal_gradient(
                         + grad_fk.dot(update_direction)
                         + update_direction.dot(update_direction) / (2.0 * step_size)
                     )
-                    if f_next <= rhs:
+                    if f_next <= rhs + ls_eps * abs(fk):
                         # .. step size found ..
                         break
                     else:
@@ -224,26 +233,28 @@ def minimize_proximal_gradient(
                 tk = t_next
                 x = x_next.copy()
 
-            elif step == "backtracking":
+            elif step in ("backtracking", "fixed"):
                 current_step_size = step_size
                 x_next = prox(yk - current_step_size * grad_fk, current_step_size)
-                for _ in range(max_iter_backtracking):
-                    update_direction = x_next - yk
-                    if func_and_grad(x_next)[0] <= func_and_grad(yk)[0] + grad_fk.dot(
-                        update_direction
-                    ) + update_direction.dot(update_direction) / (
-                        2.0 * current_step_size
-                    ):
-                        # .. step size found ..
-                        break
+                if step == "backtracking":
+                    for _ in range(max_iter_backtracking):
+                        update_direction = x_next - yk
+                        f_yk = func_and_grad(yk)[0]
+                        if func_and_grad(x_next)[0] <= f_yk + grad_fk.dot(
+                            update_direction
+                        ) + update_direction.dot(update_direction) / (
+                            2.0 * current_step_size
+                        ) + ls_eps * abs(f_yk):
+                            # .. step size found ..
+                            break
+                        else:
+                            # .. backtracking, reduce step size ..
+                            current_step_size *= backtracking_factor
+                            x_next = prox(
+                                yk - current_step_size * grad_fk, current_step_size
+                            )
                     else:
-                        # .. backtracking, reduce step size ..
-                        current_step_size *= backtracking_factor
-                        x_next = prox(
-                            yk - current_step_size * grad_fk, current_step_size
-                        )
-                else:
-                    warnings.warn("Maxium number of line-search iterations reached")
+                        warnings.warn("Maxium number of line-search iterations reached")
                 t_next = (1 + np.sqrt(1 + 4 * tk * tk)) / 2
                 yk = x_next + ((tk - 1.0) / t_next) * (x_next - x)
 
@@ -256,6 +267,8 @@ def minimize_proximal_gradient(
                     certificate_list.append(certificate)
                 tk = t_next
                 x = x_next.copy()
+            else:
+                raise ValueError("Step-size strategy not understood")
 
             if certificate < tol:
                 success = True
@@ -1,5 +1,7 @@
 """Module that contains randomized (also known as stochastic) algorithms."""
 from collections import defaultdict
+import queue
+import threading
 import numpy as np
 from scipy import sparse, optimize
 
@@ -55,6 +57,226 @@ def _support_matrix(A_indices, A_indptr, reverse_blocks_indices, n_blocks):
     return BS_data, BS_indices[:counter_indptr], BS_indptr
 
 
+def _extend_support(A, rblocks_indices, n_blocks, support=None, support_counts=None):
+    """Support matrix of A and its column counts, reusing those of its first rows.
+
+  Args:
+    A: sparse.csr_matrix
+        Data matrix.
+
+    rblocks_indices, n_blocks:
+        Block structure, as in _support_matrix.
+
+    support, support_counts: optional
+        Support matrix and column counts of the first rows of A, as
+        returned by a previous call. Only the remaining rows are processed.
+
+  Returns:
+    support: sparse.csr_matrix of shape (n_samples, n_blocks)
+
+    support_counts: array of shape (n_blocks,)
+        Number of samples whose extended support contains each block.
+  """
+    n_prev = 0 if support is None else support.shape[0]
+    A_new = A[n_prev:]
+    bs_data, bs_indices, bs_indptr = _support_matrix(
+        A_new.indices, A_new.indptr, rblocks_indices, n_blocks
+    )
+    support_new = sparse.csr_matrix(
+        (bs_data, bs_indices, bs_indptr), shape=(A_new.shape[0], n_blocks)
+    )
+    counts_new = np.asarray(support_new.sum(0), dtype=float).ravel()
+    if support is None:
+        return support_new, counts_new
+    support = sparse.vstack((support, support_new), format="csr")
+    return support, support_counts + counts_new
+
+
+def _check_warm_start(warm_start, x, n_samples, n_features, n_blocks, memory):
+    """Check that warm_start comes from a problem with the same columns and blocks.
+
+  Args:
+    warm_start: OptimizeResult
+        Result of a previous call, see minimize_saga and minimize_svrg.
+
+    x: array
+        Starting point of the new problem.
+
+    n_samples, n_features, n_blocks:
+        Dimensions of the new problem.
+
+    memory: bool
+        Whether warm_start holds the memory terms of SAGA.
+
+  Returns:
+    n_prev: int
+        Number of samples of the previous problem.
+  """
+    if x.shape != (n_features,):
+        raise ValueError("Dimensions of A and x0 do not coincide")
+    if warm_start.get("x") is not None and np.shape(warm_start.x) != (n_features,):
+        raise ValueError("warm_start was computed with a different number of features")
+    support = warm_start.support
+    support_counts = warm_start.support_counts
+    if memory:
+        if np.ndim(warm_start.memory_gradient) != 1:
+            raise ValueError("warm_start.memory_gradient should be one-dimensional")
+        n_prev = warm_start.memory_gradient.size
+        if np.shape(warm_start.gradient_average) != (n_features,):
+            raise ValueError(
+                "warm_start was computed with a different number of features"
+            )
+    else:
+        n_prev = 0 if support is None else support.shape[0]
+    if n_prev > n_samples:
+        raise ValueError("warm_start has more samples than A")
+    if (support is None) != (support_counts is None):
+        raise ValueError("warm_start should have both support and support_counts")
+    if support is not None:
+        if support.shape != (n_prev, n_blocks):
+            raise ValueError(
+                "warm_start was computed with a different number of samples "
+                "or block structure"
+            )
+        counts = np.asarray(support.sum(0), dtype=float).ravel()
+        if np.shape(support_counts) != (n_blocks,) or np.any(counts != support_counts):
+            raise ValueError("warm_start.support_counts does not match its support")
+    return n_prev
+
+
+def _reweighting(support_counts, n_samples):
+    """Diagonal reweighting of the blocks from their support counts."""
+    d = support_counts.copy()
+    idx = d != 0
+    d[idx] = n_samples / d[idx]
+    d[~idx] = 1
+    return d
+
+
+def _sample_scaling(sample_weight, n_samples):
+    """Scaling of the per-sample gradients for the sample weights w.
+
+    The weighted objective sum_i w_i f_i / sum_i w_i equals
+    (1 / n_samples) sum_i s_i f_i with s_i = n_samples w_i / sum_i w_i.
+    """
+    if sample_weight is None:
+        return np.ones(n_samples)
+    sample_weight = np.asarray(sample_weight, dtype=np.float64).ravel()
+    if sample_weight.size != n_samples:
+        raise ValueError("Dimensions of A and sample_weight do not coincide")
+    if np.any(sample_weight < 0) or not np.any(sample_weight > 0):
+        raise ValueError("sample_weight must be nonnegative and have a positive entry")
+    return sample_weight * (n_samples / sample_weight.sum())
+
+
+def _column_transform(scale, offset, n_features, fit_intercept):
+    """Validated per-feature scale and offset of the columns of A.
+
+    The solvers then use the data matrix (A - 1 offset^T) diag(scale). The
+    scale is applied to the entries of A as they are read. The offset is
+    absorbed by the intercept: with u = scale * x, the margins are
+    (a_i - offset)^T u + c = a_i^T u + c', where c' = c - offset^T u is
+    the intercept that the solvers update, so that the rows of A stay
+    sparse. This reparametrization requires fit_intercept.
+    """
+    if scale is not None:
+        scale = np.asarray(scale, dtype=np.float64).ravel()
+        if scale.size != n_features:
+            raise ValueError("Dimensions of A and scale do not coincide")
+    if offset is not None:
+        offset = np.asarray(offset, dtype=np.float64).ravel()
+        if offset.size != n_features:
+            raise ValueError("Dimensions of A and offset do not coincide")
+        if not fit_intercept:
+            raise ValueError("offset requires fit_intercept=True")
+    return scale, offset
+
+
+def _offset_shift(x, scale, offset):
+    """Difference offset^T (scale * x) between the intercept c and the
+    intercept c' updated by the solvers, see _column_transform."""
+    if offset is None:
+        return 0.0
+    return offset.dot(x if scale is None else scale * x)
+
+
+@utils.njit(nogil=True)
+def _saga_epoch(
+    x,
+    intercept,
+    idx,
+    memory_gradient,
+    gradient_average,
+    intercept_average,
+    grad_tmp,
+    step_size,
+    prox_step_size,
+    A_data,
+    A_indices,
+    A_indptr,
+    b,
+    f_deriv,
+    prox,
+    alpha,
+    fit_intercept,
+    scaling,
+    scale,
+    d,
+    bs_indices,
+    bs_indptr,
+    blocks_indptr,
+):
+    # .. the data and the functions are arguments rather than closure ..
+    # .. variables, so that the compiled epoch is reused by the calls to ..
+    # .. minimize_saga with the same f_deriv and prox ..
+    n_samples = memory_gradient.size
+    # .. inner iteration of the SAGA algorithm..
+    for i in idx:
+
+        # .. gradient estimate ..
+        p = intercept[0]
+        for j in range(A_indptr[i], A_indptr[i + 1]):
+            j_idx = A_indices[j]
+            a_j = A_data[j]
+            if scale is not None:
+                a_j *= scale[j_idx]
+            p += x[j_idx] * a_j
+        grad_i = scaling[i] * f_deriv(np.array([p]), np.array([b[i]]))[0]
+        if fit_intercept:
+            intercept[0] -= step_size * (
+                grad_i - memory_gradient[i] + intercept_average[0]
+            )
+            intercept_average[0] += (grad_i - memory_gradient[i]) / n_samples
+        for j in range(A_indptr[i], A_indptr[i + 1]):
+            j_idx = A_indices[j]
+            a_j = A_data[j]
+            if scale is not None:
+                a_j *= scale[j_idx]
+            grad_tmp[j_idx] = (grad_i - memory_gradient[i]) * a_j
+
+        # .. update coefficients ..
+        # .. first iterate on blocks ..
+        for h_j in range(bs_indptr[i], bs_indptr[i + 1]):
+            h = bs_indices[h_j]
+            # .. then iterate on features inside block ..
+            for b_j in range(blocks_indptr[h], blocks_indptr[h + 1]):
+                bias_term = d[h] * (gradient_average[b_j] + alpha * x[b_j])
+                x[b_j] -= step_size * (grad_tmp[b_j] + bias_term)
+        prox(x, i, bs_indices, bs_indptr, d, prox_step_size)
+
+        # .. update memory terms ..
+        for j in range(A_indptr[i], A_indptr[i + 1]):
+            j_idx = A_indices[j]
+            a_j = A_data[j]
+            if scale is not None:
+                a_j *= scale[j_idx]
+            tmp = (grad_i - memory_gradient[i]) * a_j
+            tmp /= n_samples
+            gradient_average[j_idx] += tmp
+            grad_tmp[j_idx] = 0
+        memory_gradient[i] = grad_i
+
+
 def minimize_saga(
     f_deriv,
     A,
@@ -67,12 +289,20 @@ def minimize_saga(
     tol=1e-6,
     verbose=1,
     callback=None,
+    warm_start=None,
+    fit_intercept=False,
+    order="random",
+    block_size=None,
+    sample_weight=None,
+    scale=None,
+    offset=None,
+    prox_scale=1.0,
 ):
     r"""Stochastic average gradient augmented (SAGA) algorithm.
 
     This algorithm can solve linearly-parametrized loss functions of the form
 
-        minimize_x \sum_{i}^n_samples f(A_i^T x, b_i) + alpha ||x||_2^2 + g(x)
+        minimize_x \sum_{i}^n_samples f(A_i^T x + c, b_i) + alpha ||x||_2^2 + g(x)
 
     where g is a function for which we have access to its proximal operator.
 
@@ -107,15 +337,66 @@ def minimize_saga(
           and/or debugging. If ye, the result will have extra members trace_func,
           trace_time.
 
+      warm_start: OptimizeResult or None, optional
+          Result of a previous call to minimize_saga on a data matrix whose
+          rows are the first rows of A (for example, before new samples
+          were appended). Its memory terms and support matrix are reused, and
+          only the appended rows are processed and have their memory terms
+          initialized at x0. Typically x0 is set to ``warm_start.x``.
+
+      fit_intercept: bool
+          Whether to fit an unpenalized intercept c. The intercept is kept
+          as a separate scalar, A is not augmented with a column of ones.
+          If False, c = 0.
+
+      order: {"random", "block", "block_shuffle"}
+          Order in which the samples are visited within an epoch. "random"
+          is a random permutation. "block" visits contiguous blocks of
+          block_size rows in random order, so that the CSR slice, targets
+          and memory terms of a block are streamed into cache once.
+          "block_shuffle" also shuffles the rows inside each block. See
+          :func:`copt.utils.epoch_order`.
+
+      block_size: int or None, optional
+          Number of rows per block for the block orders. If None, it is
+          chosen so that a block fits in cache, see
+          :func:`copt.utils.row_block_size`.
+
+      sample_weight: array-like or None, optional
+          Nonnegative weights of the samples. The sum over samples is then
+          the weighted average sum_i w_i f(A_i^T x + c, b_i) / sum_i w_i,
+          as in the sample_weight of the loss, whose max_lipschitz accounts
+          for the weights. Duplicated samples can be collapsed into weighted
+          ones with :func:`copt.utils.collapse_duplicates`.
+
+      scale, offset: array-like or None, optional
+          Per-feature scale s and offset mu of the columns of A, as in the
+          losses of :mod:`copt.loss`. The solver then uses the data matrix
+          (A - 1 mu^T) diag(s) without forming it: s multiplies the entries
+          of A as they are read and mu is absorbed in the intercept, so that
+          the rows of A remain sparse. An offset requires fit_intercept.
+
+      prox_scale: float
+          Factor multiplying the step size passed to prox. For a norm g,
+          the proximal operator of prox_scale * g is that of g with a step
+          size multiplied by prox_scale, so that a prox compiled once can be
+          used for several regularization parameters (see
+          :func:`copt.path.regularization_path`). The compiled epoch is
+          reused by the calls with the same f_deriv and prox.
+
 
     Returns:
       opt: OptimizeResult
           The optimization result represented as a
           ``scipy.optimize.OptimizeResult`` object. Important attributes are:
-          ``x`` the solution array, ``success`` a Boolean flag indicating if
+          ``x`` the solution array, ``intercept`` the intercept c,
+          ``success`` a Boolean flag indicating if
           the optimizer exited successfully and ``message`` which describes
           the cause of the termination. See `scipy.optimize.OptimizeResult`
-          for a description of other attributes.
+          for a description of other attributes. The internal state of the
+          algorithm (``memory_gradient``, ``gradient_average``, ``support``
+          and ``support_counts``) is also returned so that it can be passed
+          as warm_start.
 
 
     References:
@@ -145,10 +426,7 @@ def minimize_saga(
         blocks = sparse.eye(n_features, n_features, format="csr")
 
     if prox is None:
-
-        @utils.njit
-        def prox(x, i, indices, indptr, d, step_size):
-            pass
+        prox = _no_prox
 
     A_data = A.data
     A_indices = A.indices
@@ -157,71 +435,102 @@ def minimize_saga(
 
     rblocks_indices = blocks.T.tocsr().indices
     blocks_indptr = blocks.indptr
-    bs_data, bs_indices, bs_indptr = _support_matrix(
-        A_indices, A_indptr, rblocks_indices, blocks.shape[0]
-    )
-    csr_blocks_1 = sparse.csr_matrix((bs_data, bs_indices, bs_indptr))
+    if warm_start is None:
+        n_prev = 0
+        support, support_counts = _extend_support(
+            A, rblocks_indices, blocks.shape[0]
+        )
+    else:
+        n_prev = _check_warm_start(
+            warm_start, x, n_samples, n_features, blocks.shape[0], memory=True
+        )
+        support, support_counts = _extend_support(
+            A,
+            rblocks_indices,
+            blocks.shape[0],
+            warm_start.support,
+            warm_start.support_counts,
+        )
+    bs_indices = support.indices
+    bs_indptr = support.indptr
 
     # .. diagonal reweighting ..
-    d = np.array(csr_blocks_1.sum(0), dtype=np.float).ravel()
-    idx = d != 0
-    d[idx] = n_samples / d[idx]
-    d[~idx] = 1
-
-    @utils.njit(nogil=True)
-    def _saga_epoch(x, idx, memory_gradient, gradient_average, grad_tmp, step_size):
-        # .. inner iteration of the SAGA algorithm..
-        for i in idx:
-
-            # .. gradient estimate ..
-            p = 0.0
-            for j in range(A_indptr[i], A_indptr[i + 1]):
-                j_idx = A_indices[j]
-                p += x[j_idx] * A_data[j]
-            grad_i = f_deriv(np.array([p]), np.array([b[i]]))[0]
-            for j in range(A_indptr[i], A_indptr[i + 1]):
-                j_idx = A_indices[j]
-                grad_tmp[j_idx] = (grad_i - memory_gradient[i]) * A_data[j]
-
-            # .. update coefficients ..
-            # .. first iterate on blocks ..
-            for h_j in range(bs_indptr[i], bs_indptr[i + 1]):
-                h = bs_indices[h_j]
-                # .. then iterate on features inside block ..
-                for b_j in range(blocks_indptr[h], blocks_indptr[h + 1]):
-                    bias_term = d[h] * (gradient_average[b_j] + alpha * x[b_j])
-                    x[b_j] -= step_size * (grad_tmp[b_j] + bias_term)
-            prox(x, i, bs_indices, bs_indptr, d, step_size)
-
-            # .. update memory terms ..
-            for j in range(A_indptr[i], A_indptr[i + 1]):
-                j_idx = A_indices[j]
-                tmp = (grad_i - memory_gradient[i]) * A_data[j]
-                tmp /= n_samples
-                gradient_average[j_idx] += tmp
-                grad_tmp[j_idx] = 0
-            memory_gradient[i] = grad_i
+    d = _reweighting(support_counts, n_samples)
+    scaling = _sample_scaling(sample_weight, n_samples)
+    scale, offset = _column_transform(scale, offset, n_features, fit_intercept)
 
     # .. initialize memory terms ..
     memory_gradient = np.zeros(n_samples)
     gradient_average = np.zeros(n_features)
+    intercept = np.zeros(1)
+    if n_prev > 0:
+        memory_gradient[:n_prev] = warm_start.memory_gradient
+        gradient_average[:] = warm_start.gradient_average * (n_prev / n_samples)
+        if fit_intercept:
+            intercept[0] = warm_start.intercept - _offset_shift(x, scale, offset)
+    if 0 < n_prev < n_samples:
+        # .. memory terms of the new samples are their gradients at x ..
+        A_new = A[n_prev:]
+        u = x if scale is None else scale * x
+        p = utils.safe_sparse_dot(A_new, u, dense_output=True).ravel()
+        p += intercept[0]
+        grad_new = scaling[n_prev:] * f_deriv(p, np.asarray(b[n_prev:], dtype=float))
+        memory_gradient[n_prev:] = grad_new
+        grad_avg_new = A_new.T.dot(grad_new) / n_samples
+        gradient_average += grad_avg_new if scale is None else scale * grad_avg_new
+    intercept_average = np.array([memory_gradient.mean()])
     grad_tmp = np.zeros(n_features)
-    idx = np.arange(n_samples)
+    if block_size is None:
+        block_size = utils.row_block_size(A)
     success = False
     if callback is not None:
         callback(locals())
     for it in range(max_iter):
         x_old = x.copy()
-        np.random.shuffle(idx)
-        _saga_epoch(x, idx, memory_gradient, gradient_average, grad_tmp, step_size)
+        intercept_old = intercept[0]
+        idx = utils.epoch_order(n_samples, order, block_size)
+        _saga_epoch(
+            x,
+            intercept,
+            idx,
+            memory_gradient,
+            gradient_average,
+            intercept_average,
+            grad_tmp,
+            step_size,
+            step_size * prox_scale,
+            A_data,
+            A_indices,
+            A_indptr,
+            b,
+            f_deriv,
+            prox,
+            alpha,
+            fit_intercept,
+            scaling,
+            scale,
+            d,
+            bs_indices,
+            bs_indptr,
+            blocks_indptr,
+        )
         if callback is not None:
             callback(locals())
 
-        diff_norm = np.abs(x - x_old).sum()
+        diff_norm = np.abs(x - x_old).sum() + abs(intercept[0] - intercept_old)
         if diff_norm < tol:
             success = True
             break
-    return optimize.OptimizeResult(x=x, success=success, nit=it)
+    return optimize.OptimizeResult(
+        x=x,
+        intercept=intercept[0] + _offset_shift(x, scale, offset),
+        success=success,
+        nit=it,
+        memory_gradient=memory_gradient,
+        gradient_average=gradient_average,
+        support=support,
+        support_counts=support_counts,
+    )
 
 
 def minimize_svrg(
@@ -236,12 +545,19 @@ def minimize_svrg(
     tol=1e-6,
     verbose=False,
     callback=None,
+    warm_start=None,
+    fit_intercept=False,
+    order="random",
+    block_size=None,
+    sample_weight=None,
+    scale=None,
+    offset=None,
 ):
     r"""Stochastic average gradient augmented (SAGA) algorithm.
 
     The SAGA algorithm can solve optimization problems of the form
 
-        argmin_{x \in R^p} \sum_{i}^n_samples f(A_i^T x, b_i) + alpha *
+        argmin_{x \in R^p} \sum_{i}^n_samples f(A_i^T x + c, b_i) + alpha *
         ||x||_2^2 +
                                             + beta * ||x||_1
 
@@ -278,12 +594,38 @@ def minimize_svrg(
           and/or debugging. If ye, the result will have extra members
           trace_func, trace_time.
 
+      warm_start: OptimizeResult or None, optional
+          Result of a previous call to minimize_svrg on a data matrix whose
+          rows are the first rows of A. Its support matrix is reused and only
+          the appended rows are processed. Typically x0 is set to
+          ``warm_start.x``.
+
+      fit_intercept: bool
+          Whether to fit an unpenalized intercept c. The intercept is kept
+          as a separate scalar, A is not augmented with a column of ones.
+          If False, c = 0.
+
+      order: {"random", "block", "block_shuffle"}
+          Order in which the samples are visited within an epoch, see
+          :func:`copt.minimize_saga`.
+
+      block_size: int or None, optional
+          Number of rows per block for the block orders. If None, it is
+          chosen so that a block fits in cache.
+
+      sample_weight: array-like or None, optional
+          Nonnegative weights of the samples, see :func:`copt.minimize_saga`.
+
+      scale, offset: array-like or None, optional
+          Standardization of the columns of A, see :func:`copt.minimize_saga`.
+
 
     Returns:
       opt: OptimizeResult
           The optimization result represented as a
           ``scipy.optimize.OptimizeResult`` object. Important attributes are:
-          ``x`` the solution array, ``success`` a Boolean flag indicating if
+          ``x`` the solution array, ``intercept`` the intercept c,
+          ``success`` a Boolean flag indicating if
           the optimizer exited successfully and ``message`` which describes
           the cause of the termination. See `scipy.optimize.OptimizeResult`
           for a description of other attributes.
@@ -320,10 +662,7 @@ def minimize_svrg(
         blocks = sparse.eye(n_features, n_features, format="csr")
 
     if prox is None:
-
-        @utils.njit
-        def prox(x, i, indices, indptr, d, step_size):
-            pass
+        prox = _no_prox
 
     A_data = A.data
     A_indices = A.indices
@@ -332,49 +671,87 @@ def minimize_svrg(
 
     rblocks_indices = blocks.T.tocsr().indices
     blocks_indptr = blocks.indptr
-    bs_data, bs_indices, bs_indptr = _support_matrix(
-        A_indices, A_indptr, rblocks_indices, blocks.shape[0]
-    )
-    csr_blocks_1 = sparse.csr_matrix((bs_data, bs_indices, bs_indptr))
+    if warm_start is None:
+        support, support_counts = _extend_support(
+            A, rblocks_indices, blocks.shape[0]
+        )
+    else:
+        _check_warm_start(
+            warm_start, x, n_samples, n_features, blocks.shape[0], memory=False
+        )
+        support, support_counts = _extend_support(
+            A,
+            rblocks_indices,
+            blocks.shape[0],
+            warm_start.support,
+            warm_start.support_counts,
+        )
+    bs_indices = support.indices
+    bs_indptr = support.indptr
 
     # .. diagonal reweighting ..
-    d = np.array(csr_blocks_1.sum(0), dtype=np.float).ravel()
-    idx = d != 0
-    d[idx] = n_samples / d[idx]
-    d[~idx] = 1
+    d = _reweighting(support_counts, n_samples)
+    scaling = _sample_scaling(sample_weight, n_samples)
+    scale, offset = _column_transform(scale, offset, n_features, fit_intercept)
 
     @utils.njit
-    def full_grad(x):
+    def full_grad(x, intercept):
         grad = np.zeros(x.size)
+        grad_intercept = 0.0
         for i in range(n_samples):
-            p = 0.0
+            p = intercept
             for j in range(A_indptr[i], A_indptr[i + 1]):
                 j_idx = A_indices[j]
-                p += x[j_idx] * A_data[j]
-            grad_i = f_deriv(np.array([p]), np.array([b[i]]))[0]
+                a_j = A_data[j]
+                if scale is not None:
+                    a_j *= scale[j_idx]
+                p += x[j_idx] * a_j
+            grad_i = scaling[i] * f_deriv(np.array([p]), np.array([b[i]]))[0]
+            grad_intercept += grad_i / n_samples
             # .. gradient estimate (XXX difference) ..
             for j in range(A_indptr[i], A_indptr[i + 1]):
                 j_idx = A_indices[j]
-                grad[j_idx] += grad_i * A_data[j] / n_samples
-        return grad
+                a_j = A_data[j]
+                if scale is not None:
+                    a_j *= scale[j_idx]
+                grad[j_idx] += grad_i * a_j / n_samples
+        return grad, grad_intercept
 
     @utils.njit(nogil=True)
-    def _svrg_epoch(x, x_snapshot, idx, gradient_average, grad_tmp, step_size):
+    def _svrg_epoch(
+        x,
+        intercept,
+        x_snapshot,
+        intercept_snapshot,
+        idx,
+        gradient_average,
+        intercept_average,
+        grad_tmp,
+        step_size,
+    ):
 
         # .. inner iteration ..
         for i in idx:
-            p = 0.0
-            p_old = 0.0
+            p = intercept[0]
+            p_old = intercept_snapshot
             for j in range(A_indptr[i], A_indptr[i + 1]):
                 j_idx = A_indices[j]
-                p += x[j_idx] * A_data[j]
-                p_old += x_snapshot[j_idx] * A_data[j]
-
-            grad_i = f_deriv(np.array([p]), np.array([b[i]]))[0]
-            old_grad_i = f_deriv(np.array([p_old]), np.array([b[i]]))[0]
+                a_j = A_data[j]
+                if scale is not None:
+                    a_j *= scale[j_idx]
+                p += x[j_idx] * a_j
+                p_old += x_snapshot[j_idx] * a_j
+
+            grad_i = scaling[i] * f_deriv(np.array([p]), np.array([b[i]]))[0]
+            old_grad_i = scaling[i] * f_deriv(np.array([p_old]), np.array([b[i]]))[0]
+            if fit_intercept:
+                intercept[0] -= step_size * (grad_i - old_grad_i + intercept_average)
             for j in range(A_indptr[i], A_indptr[i + 1]):
                 j_idx = A_indices[j]
-                grad_tmp[j_idx] = (grad_i - old_grad_i) * A_data[j]
+                a_j = A_data[j]
+                if scale is not None:
+                    a_j *= scale[j_idx]
+                grad_tmp[j_idx] = (grad_i - old_grad_i) * a_j
 
             # .. update coefficients ..
             # .. first iterate on blocks ..
@@ -386,24 +763,48 @@ def minimize_svrg(
                     x[b_j] -= step_size * (grad_tmp[b_j] + bias_term)
             prox(x, i, bs_indices, bs_indptr, d, step_size)
 
-    idx = np.arange(n_samples)
     grad_tmp = np.zeros(n_features)
+    intercept = np.zeros(1)
+    if block_size is None:
+        block_size = utils.row_block_size(A)
+    if warm_start is not None and fit_intercept:
+        intercept[0] = warm_start.intercept - _offset_shift(x, scale, offset)
     success = False
     if callback is not None:
         callback(locals())
     for it in range(max_iter):
         x_snapshot = x.copy()
-        gradient_average = full_grad(x_snapshot)
-        np.random.shuffle(idx)
-        _svrg_epoch(x, x_snapshot, idx, gradient_average, grad_tmp, step_size)
+        intercept_snapshot = intercept[0]
+        gradient_average, intercept_average = full_grad(x_snapshot, intercept_snapshot)
+        idx = utils.epoch_order(n_samples, order, block_size)
+        _svrg_epoch(
+            x,
+            intercept,
+            x_snapshot,
+            intercept_snapshot,
+            idx,
+            gradient_average,
+            intercept_average,
+            grad_tmp,
+            step_size,
+        )
         if callback is not None:
             callback(locals())
 
-        if np.abs(x - x_snapshot).sum() < tol:
+        diff_norm = np.abs(x - x_snapshot).sum()
+        if diff_norm + abs(intercept[0] - intercept_snapshot) < tol:
             success = True
             break
     message = ""
-    return optimize.OptimizeResult(x=x, success=success, nit=it, message=message)
+    return optimize.OptimizeResult(
+        x=x,
+        intercept=intercept[0] + _offset_shift(x, scale, offset),
+        success=success,
+        nit=it,
+        message=message,
+        support=support,
+        support_counts=support_counts,
+    )
 
 
 def minimize_vrtos(
@@ -419,12 +820,18 @@ def minimize_vrtos(
     tol=1e-6,
     callback=None,
     verbose=0,
+    fit_intercept=False,
+    order="random",
+    block_size=None,
+    sample_weight=None,
+    scale=None,
+    offset=None,
 ):
     r"""Variance-reduced three operator splitting (VRTOS) algorithm.
 
     The VRTOS algorithm can solve optimization problems of the form
 
-        argmin_{x \in R^p} \sum_{i}^n_samples f(A_i^T x, b_i) + alpha *
+        argmin_{x \in R^p} \sum_{i}^n_samples f(A_i^T x + c, b_i) + alpha *
         ||x||_2^2 +
                                             + pen1(x) + pen2(x)
 
@@ -462,12 +869,32 @@ def minimize_vrtos(
         debugging. If ye, the result will have extra members trace_func,
         trace_time.
 
+    fit_intercept: bool
+        Whether to fit an unpenalized intercept c. The intercept is kept as a
+        separate scalar, A is not augmented with a column of ones. If False,
+        c = 0.
+
+    order: {"random", "block", "block_shuffle"}
+        Order in which the samples are visited within an epoch, see
+        :func:`copt.minimize_saga`.
+
+    block_size: int or None, optional
+        Number of rows per block for the block orders. If None, it is chosen
+        so that a block fits in cache.
+
+    sample_weight: array-like or None, optional
+        Nonnegative weights of the samples, see :func:`copt.minimize_saga`.
+
+    scale, offset: array-like or None, optional
+        Standardization of the columns of A, see :func:`copt.minimize_saga`.
+
     Returns
     -------
     opt: OptimizeResult
         The optimization result represented as a
         ``scipy.optimize.OptimizeResult`` object. Important attributes are:
-        ``x`` the solution array, ``success`` a Boolean flag indicating if
+        ``x`` the solution array, ``intercept`` the intercept c,
+        ``success`` a Boolean flag indicating if
         the optimizer exited successfully and ``message`` which describes
         the cause of the termination. See `scipy.optimize.OptimizeResult`
         for a description of other attributes.
@@ -515,15 +942,31 @@ def minimize_vrtos(
             pass
 
     A = sparse.csr_matrix(A)
+    scale, offset = _column_transform(scale, offset, n_features, fit_intercept)
     epoch_iteration = _factory_sparse_vrtos(
-        f_deriv, prox_1, prox_2, blocks_1, blocks_2, A, b, alpha, step_size
+        f_deriv,
+        prox_1,
+        prox_2,
+        blocks_1,
+        blocks_2,
+        A,
+        b,
+        alpha,
+        step_size,
+        fit_intercept,
+        _sample_scaling(sample_weight, n_samples),
+        scale,
     )
 
     # .. memory terms ..
     memory_gradient = np.zeros(n_samples)
     gradient_average = np.zeros(n_features)
+    intercept = np.array([-_offset_shift(x0, scale, offset)])
+    intercept_average = np.zeros(1)
     x1 = x0.copy()
     grad_tmp = np.zeros(n_features)
+    if block_size is None:
+        block_size = utils.row_block_size(A)
 
     # warm up for the JIT
     epoch_iteration(
@@ -531,8 +974,10 @@ def minimize_vrtos(
         x0,
         x1,
         z,
+        intercept,
         memory_gradient,
         gradient_average,
+        intercept_average,
         np.array([0]),
         grad_tmp,
         step_size,
@@ -547,9 +992,11 @@ def minimize_vrtos(
             x0,
             x1,
             z,
+            intercept,
             memory_gradient,
             gradient_average,
-            np.random.permutation(n_samples),
+            intercept_average,
+            utils.epoch_order(n_samples, order, block_size),
             grad_tmp,
             step_size,
         )
@@ -559,18 +1006,35 @@ def minimize_vrtos(
             callback(locals())
 
     return optimize.OptimizeResult(
-        x=z, success=success, nit=it, certificate=certificate
+        x=z,
+        intercept=intercept[0] + _offset_shift(z, scale, offset),
+        success=success,
+        nit=it,
+        certificate=certificate,
     )
 
 
 def _factory_sparse_vrtos(
-    f_deriv, prox_1, prox_2, blocks_1, blocks_2, A, b, alpha, gamma
+    f_deriv,
+    prox_1,
+    prox_2,
+    blocks_1,
+    blocks_2,
+    A,
+    b,
+    alpha,
+    gamma,
+    fit_intercept=False,
+    scaling=None,
+    scale=None,
 ):
 
     A_data = A.data
     A_indices = A.indices
     A_indptr = A.indptr
     n_samples, n_features = A.shape
+    if scaling is None:
+        scaling = np.ones(n_samples)
 
     blocks_1_indptr = blocks_1.indptr
     blocks_2_indptr = blocks_2.indptr
@@ -604,8 +1068,10 @@ def _factory_sparse_vrtos(
         x1,
         x2,
         z,
+        intercept,
         memory_gradient,
         gradient_average,
+        intercept_average,
         sample_indices,
         grad_tmp,
         step_size,
@@ -613,16 +1079,28 @@ def _factory_sparse_vrtos(
 
         # .. iterate on samples ..
         for i in sample_indices:
-            p = 0.0
+            p = intercept[0]
             for j in range(A_indptr[i], A_indptr[i + 1]):
                 j_idx = A_indices[j]
-                p += z[j_idx] * A_data[j]
+                a_j = A_data[j]
+                if scale is not None:
+                    a_j *= scale[j_idx]
+                p += z[j_idx] * a_j
 
             # .. gradient estimate ..
-            grad_i = f_deriv(np.array([p]), np.array([b[i]]))[0]
+            grad_i = scaling[i] * f_deriv(np.array([p]), np.array([b[i]]))[0]
+            if fit_intercept:
+                # .. the intercept is not penalized, plain SAGA step ..
+                intercept[0] -= step_size * (
+                    grad_i - memory_gradient[i] + intercept_average[0]
+                )
+                intercept_average[0] += (grad_i - memory_gradient[i]) / n_samples
             for j in range(A_indptr[i], A_indptr[i + 1]):
                 j_idx = A_indices[j]
-                grad_tmp[j_idx] = (grad_i - memory_gradient[i]) * A_data[j]
+                a_j = A_data[j]
+                if scale is not None:
+                    a_j *= scale[j_idx]
+                grad_tmp[j_idx] = (grad_i - memory_gradient[i]) * a_j
 
             # .. x update ..
             for h_j in range(bs_1_indptr[i], bs_1_indptr[i + 1]):
@@ -687,7 +1165,10 @@ def _factory_sparse_vrtos(
             # .. update memory terms ..
             for j in range(A_indptr[i], A_indptr[i + 1]):
                 j_idx = A_indices[j]
-                tmp = (grad_i - memory_gradient[i]) * A_data[j] / n_samples
+                a_j = A_data[j]
+                if scale is not None:
+                    a_j *= scale[j_idx]
+                tmp = (grad_i - memory_gradient[i]) * a_j / n_samples
                 gradient_average[j_idx] += tmp
                 grad_tmp[j_idx] = 0
             memory_gradient[i] = grad_i
@@ -695,6 +1176,447 @@ def _factory_sparse_vrtos(
     return epoch_iteration_template
 
 
+@utils.njit
+def _no_prox(x, i, indices, indptr, d, step_size):
+    pass
+
+
+@utils.njit(nogil=True)
+def _prox_sgd_chunk(
+    x,
+    A_data,
+    A_indices,
+    A_indptr,
+    b,
+    w,
+    sample_indices,
+    f_deriv,
+    prox,
+    bs_indices,
+    bs_indptr,
+    blocks_indptr,
+    d,
+    alpha,
+    step_size,
+):
+    """Proximal SGD updates on the samples of a CSR chunk."""
+    for i in sample_indices:
+        p = 0.0
+        for j in range(A_indptr[i], A_indptr[i + 1]):
+            j_idx = A_indices[j]
+            p += x[j_idx] * A_data[j]
+        grad_i = w[i] * f_deriv(np.array([p]), np.array([b[i]]))[0]
+
+        # .. the L2 term is applied on the support, reweighted ..
+        for h_j in range(bs_indptr[i], bs_indptr[i + 1]):
+            h = bs_indices[h_j]
+            for b_j in range(blocks_indptr[h], blocks_indptr[h + 1]):
+                x[b_j] -= step_size * d[h] * alpha * x[b_j]
+        for j in range(A_indptr[i], A_indptr[i + 1]):
+            j_idx = A_indices[j]
+            x[j_idx] -= step_size * grad_i * A_data[j]
+        prox(x, i, bs_indices, bs_indptr, d, step_size)
+
+
+def _prefetch(chunks, decode):
+    """Iterate over decode(chunk), decoding the next chunk in a thread.
+
+    Closing the generator stops the thread before it reads another chunk
+    and waits for it.
+    """
+    buffer = queue.Queue(maxsize=1)
+    stop = threading.Event()
+    done = object()
+
+    def _put(item):
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def worker():
+        try:
+            for chunk in chunks:
+                if stop.is_set() or not _put((decode(chunk), None)):
+                    return
+        except Exception as exc:  # pylint: disable=broad-except
+            _put((None, exc))
+            return
+        _put((done, None))
+
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, exc = buffer.get()
+            if exc is not None:
+                raise exc
+            if item is done:
+                return
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+def minimize_prox_sgd(
+    f_deriv,
+    chunks,
+    x0,
+    step_size,
+    prox=None,
+    alpha=0,
+    averaged=False,
+    prefetch=False,
+    max_iter=None,
+    tol=0,
+    verbose=0,
+    callback=None,
+):
+    r"""Proximal stochastic gradient descent over a stream of data chunks.
+
+    This algorithm can solve linearly-parametrized loss functions of the form
+
+        minimize_x E[f(A_i^T x, b_i)] + alpha ||x||_2^2 + g(x)
+
+    where the samples (A_i, b_i) arrive as a stream of chunks and g is a
+    function for which we have access to its proximal operator. Contrary to
+    minimize_saga, memory does not grow with the number of samples: only the
+    current chunk (and the prefetched one) are kept in memory.
+
+    .. warning::
+        This function is experimental, API is likely to change.
+
+
+    Args:
+      f_deriv
+          derivative of f, as given by the partial_deriv attribute of the loss.
+
+      chunks: iterable
+          Iterable (possibly a generator) of tuples (A_chunk, b_chunk), where
+          A_chunk is a matrix with n_features columns (converted to CSR) and
+          b_chunk the corresponding array of targets. It is consumed only
+          once. Tuples (A_chunk, b_chunk, w_chunk) also give the weights of
+          the samples, which multiply their gradients (e.g., the number of
+          copies of a sample divided by the average number of copies).
+
+      x0: np.ndarray
+          Starting point for optimization.
+
+      step_size: float or callable
+          Step size for the optimization. If callable, step_size(t) is the
+          step size used on the chunk that starts after t samples, which
+          allows for decreasing step sizes like
+          ``lambda t: step_size_0 / np.sqrt(1 + t / n_chunk)``.
+
+      prox: tuple or None, optional
+          Output of the prox_factory method of the penalty.
+
+      alpha: float
+          Amount of L2 regularization.
+
+      averaged: bool
+          If True, return the average of the iterates at the end of each
+          chunk (Polyak-Ruppert averaging) instead of the last iterate.
+
+      prefetch: bool
+          If True, a background thread converts the next chunk to CSR and
+          computes its support while the current chunk is being processed.
+
+      max_iter: int or None
+          Maximum number of chunks to process. If None, the whole stream is
+          consumed.
+
+      tol: float
+          Tolerance criterion. The algorithm will stop whenever the
+          difference between the iterates at the end of two successive
+          chunks is below tol.
+
+      verbose: bool
+          Verbosity level. True might print some messages.
+
+      callback: function or None
+          If not None, callback will be called after each chunk.
+
+
+    Returns:
+      opt: OptimizeResult
+          The optimization result represented as a
+          ``scipy.optimize.OptimizeResult`` object. Important attributes are:
+          ``x`` the solution array, ``success`` a Boolean flag indicating if
+          the stream was exhausted or the tolerance criterion was reached and
+          ``n_samples_seen`` the number of samples processed.
+
+
+    References:
+      The sparse (reweighted) updates are those of
+
+      Fabian Pedregosa, Remi Leblond, and Simon Lacoste-Julien.
+      "Breaking the Nonsmooth Barrier: A Scalable Parallel Method
+      for Composite Optimization." Advances in Neural Information
+      Processing Systems (NIPS) 2017.
+
+      where here the reweighting is estimated on each chunk.
+    """
+    x = np.ascontiguousarray(x0, dtype=float).copy()
+    n_features = x.size
+
+    if hasattr(prox, "__len__") and len(prox) == 2:
+        blocks = prox[1]
+        prox = prox[0]
+    else:
+        blocks = sparse.eye(n_features, n_features, format="csr")
+    if prox is None:
+        prox = _no_prox
+    rblocks_indices = blocks.T.tocsr().indices
+    blocks_indptr = blocks.indptr
+
+    def decode(chunk):
+        A_chunk, b_chunk = chunk[:2]
+        A_chunk = sparse.csr_matrix(A_chunk)
+        if A_chunk.shape[1] != n_features:
+            raise ValueError("Dimensions of the chunk and x0 do not coincide")
+        b_chunk = np.ascontiguousarray(b_chunk, dtype=float).ravel()
+        if len(chunk) > 2:
+            w_chunk = np.ascontiguousarray(chunk[2], dtype=float).ravel()
+        else:
+            w_chunk = np.ones(A_chunk.shape[0])
+        support, support_counts = _extend_support(
+            A_chunk, rblocks_indices, blocks.shape[0]
+        )
+        d = _reweighting(support_counts, A_chunk.shape[0])
+        return A_chunk, b_chunk, w_chunk, support, d
+
+    if prefetch:
+        stream = _prefetch(chunks, decode)
+    else:
+        stream = (decode(chunk) for chunk in chunks)
+
+    x_avg = x.copy()
+    n_samples_seen = 0
+    success = False
+    it = 0
+    if callback is not None:
+        callback(locals())
+    # .. closing the stream stops the prefetch thread, also on errors ..
+    try:
+        for A_chunk, b_chunk, w_chunk, support, d in stream:
+            x_prev = x.copy()
+            if callable(step_size):
+                step_size_t = float(step_size(n_samples_seen))
+            else:
+                step_size_t = step_size
+            _prox_sgd_chunk(
+                x,
+                A_chunk.data,
+                A_chunk.indices,
+                A_chunk.indptr,
+                b_chunk,
+                w_chunk,
+                np.random.permutation(A_chunk.shape[0]),
+                f_deriv,
+                prox,
+                support.indices,
+                support.indptr,
+                blocks_indptr,
+                d,
+                alpha,
+                step_size_t,
+            )
+            n_samples_seen += A_chunk.shape[0]
+            it += 1
+            x_avg += (x - x_avg) / it
+            if callback is not None:
+                callback(locals())
+            if np.abs(x - x_prev).sum() < tol:
+                success = True
+                break
+            if max_iter is not None and it >= max_iter:
+                break
+        else:
+            success = True
+    finally:
+        stream.close()
+    return optimize.OptimizeResult(
+        x=x_avg if averaged else x,
+        success=success,
+        nit=it,
+        n_samples_seen=n_samples_seen,
+    )
+
+
+def minimize_sdca(
+    f,
+    A,
+    b,
+    alpha,
+    prox=None,
+    max_iter=500,
+    tol=1e-6,
+    verbose=0,
+    callback=None,
+):
+    r"""Stochastic dual coordinate ascent (SDCA) algorithm.
+
+    This algorithm can solve L2-regularized linearly-parametrized loss
+    functions of the form
+
+        minimize_x (1/n) \sum_{i}^n_samples f(A_i^T x, b_i) + (alpha/2) ||x||_2^2 + g(x)
+
+    where g is a function for which we have access to its proximal operator
+    (the proximal variant, prox-SDCA). It maximizes the dual problem one
+    coordinate at a time, hence it does not need a step size, and the
+    duality gap gives a certificate of optimality.
+
+    .. warning::
+        This function is experimental, API is likely to change.
+
+
+    Args:
+      f: loss object
+          Loss function that implements partial_loss, partial_conjugate and
+          partial_dual_update, like copt.loss.LogLoss and
+          copt.loss.SquareLoss.
+
+      alpha: float
+          Amount of L2 regularization. Needs to be strictly positive.
+
+      prox: tuple or None, optional
+          Output of the prox_factory method of the penalty, like
+          copt.penalty.L1Norm and copt.penalty.GroupL1.
+
+      max_iter: int
+          Maximum number of passes through the data in the optimization.
+
+      tol: float
+          Tolerance criterion. The algorithm will stop whenever the duality
+          gap, computed at the end of each epoch, is below tol.
+
+      verbose: bool
+          Verbosity level. True might print some messages.
+
+      callback: function or None
+          If not None, callback will be called at each epoch.
+
+
+    Returns:
+      opt: OptimizeResult
+          The optimization result represented as a
+          ``scipy.optimize.OptimizeResult`` object. Important attributes are:
+          ``x`` the solution array, ``success`` a Boolean flag indicating if
+          the optimizer exited successfully, ``certificate`` the duality gap,
+          ``trace_certificate`` the duality gap at each epoch and ``dual`` the
+          dual variables.
+
+
+    References:
+      Shalev-Shwartz, Shai, and Tong Zhang. `"Stochastic dual coordinate
+      ascent methods for regularized loss minimization."
+      <https://arxiv.org/abs/1209.1873>`_ Journal of Machine Learning
+      Research (2013).
+
+      Shalev-Shwartz, Shai, and Tong Zhang. `"Accelerated proximal stochastic
+      dual coordinate ascent for regularized loss minimization."
+      <https://arxiv.org/abs/1309.2375>`_ Mathematical Programming (2016).
+    """
+    from sklearn.utils.extmath import row_norms
+
+    if alpha <= 0:
+        raise ValueError("SDCA requires a strictly positive alpha")
+    A = sparse.csr_matrix(A)
+    n_samples, n_features = A.shape
+    b = np.ascontiguousarray(b, dtype=float)
+    if b.size != n_samples:
+        raise ValueError("Dimensions of A and b do not coincide")
+
+    if hasattr(prox, "__len__") and len(prox) == 2:
+        blocks = prox[1]
+        prox = prox[0]
+    else:
+        blocks = sparse.eye(n_features, n_features, format="csr")
+    if prox is None:
+        prox = _no_prox
+
+    A_data = A.data
+    A_indices = A.indices
+    A_indptr = A.indptr
+
+    rblocks_indices = blocks.T.tocsr().indices
+    blocks_indptr = blocks.indptr
+    support, _ = _extend_support(A, rblocks_indices, blocks.shape[0])
+    bs_indices = support.indices
+    bs_indptr = support.indptr
+
+    # .. x = prox(v) is the prox of g / alpha, not reweighted ..
+    d = np.ones(blocks.shape[0])
+    scale = 1.0 / (alpha * n_samples)
+    sq_norms = row_norms(A, squared=True)
+    dual_update = f.partial_dual_update
+    partial_loss = f.partial_loss
+    partial_conjugate = f.partial_conjugate
+
+    @utils.njit(nogil=True)
+    def _sdca_epoch(x, v, dual, idx):
+        for i in idx:
+            p = 0.0
+            for j in range(A_indptr[i], A_indptr[i + 1]):
+                j_idx = A_indices[j]
+                p += x[j_idx] * A_data[j]
+
+            # .. maximize the dual along coordinate i ..
+            dual_i = dual_update(p, b[i], dual[i], sq_norms[i] * scale)
+            incr = (dual_i - dual[i]) * scale
+            dual[i] = dual_i
+            for j in range(A_indptr[i], A_indptr[i + 1]):
+                j_idx = A_indices[j]
+                v[j_idx] += incr * A_data[j]
+
+            # .. primal update, x = prox(v), on the support ..
+            for h_j in range(bs_indptr[i], bs_indptr[i + 1]):
+                h = bs_indices[h_j]
+                for b_j in range(blocks_indptr[h], blocks_indptr[h + 1]):
+                    x[b_j] = v[b_j]
+            prox(x, i, bs_indices, bs_indptr, d, 1.0 / alpha)
+
+    def duality_gap(x, v, dual):
+        z = utils.safe_sparse_dot(A, x, dense_output=True).ravel()
+        gap = np.mean(partial_loss(z, b)) + np.mean(partial_conjugate(-dual, b))
+        return gap + alpha * v.dot(x)
+
+    x = np.zeros(n_features)
+    v = np.zeros(n_features)
+    dual = np.zeros(n_samples)
+    idx = np.arange(n_samples)
+    certificate = np.inf
+    trace_certificate = []
+    success = False
+    if callback is not None:
+        callback(locals())
+    for it in range(max_iter):
+        np.random.shuffle(idx)
+        _sdca_epoch(x, v, dual, idx)
+        certificate = duality_gap(x, v, dual)
+        trace_certificate.append(certificate)
+        if verbose:
+            print("Epoch %s, duality gap %s" % (it, certificate))
+        if callback is not None:
+            callback(locals())
+        if certificate < tol:
+            success = True
+            break
+    return optimize.OptimizeResult(
+        x=x,
+        success=success,
+        nit=it,
+        certificate=certificate,
+        trace_certificate=trace_certificate,
+        dual=dual,
+    )
+
+
 def step_size_sfw(variant):
     if variant in {'SAG', 'SAGA'}:
         def step_sizes_SAG_A(kwargs):
@@ -746,13 +1668,15 @@ def minimize_sfw(
         verbose=False,
         callback=None,
         variant='SAGA',
-        lmo_variant='vanilla'
+        lmo_variant='vanilla',
+        fit_intercept=False,
+        sample_weight=None,
 ):
     r"""Stochastic Frank-Wolfe (SFW) algorithm.
 
     This implementation of SFW algorithms can solve optimization problems of the form
 
-        argmin_{x \in constraint} (1/n)\sum_{i}^n_samples f(A_i^T x, b_i)
+        argmin_{x \in constraint} (1/n)\sum_{i}^n_samples f(A_i^T x + c, b_i)
 
     Args:
       f_deriv
@@ -800,11 +1724,20 @@ def minimize_sfw(
         Controls which variant of the LMO we're using.
         Using 'pairwise' will create and update an active set of vertices.
 
+      fit_intercept: bool
+        Whether to fit an unconstrained intercept c. The intercept is updated
+        with a gradient step of size 1 / lipschitz on the aggregated gradient,
+        so lipschitz must be given. If False, c = 0.
+
+      sample_weight: array-like or None, optional
+        Nonnegative weights of the samples, see :func:`copt.minimize_saga`.
+
     Returns:
       opt: OptimizeResult
           The optimization result represented as a
           ``scipy.optimize.OptimizeResult`` object. Important attributes are:
-          ``x`` the solution array, ``success`` a Boolean flag indicating if
+          ``x`` the solution array, ``intercept`` the intercept c,
+          ``success`` a Boolean flag indicating if
           the optimizer exited successfully and ``message`` which describes
           the cause of the termination. See `scipy.optimize.OptimizeResult`
           for a description of other attributes.
@@ -827,6 +1760,8 @@ From Convex Minimization to Submodular Maximization" <https://arxiv.org/abs/1804
     if lmo_variant not in LMO_VARIANTS:
         raise ValueError(f"This LMO variant is not implemented. "
                          f"Please use one from {LMO_VARIANTS}.")
+    if fit_intercept and lipschitz is None:
+        raise ValueError('lipschitz needs to be specified with fit_intercept=True')
 
     n_samples, n_features = A.shape
     x = np.reshape(x0, n_features).astype(float)
@@ -838,9 +1773,12 @@ From Convex Minimization to Submodular Maximization" <https://arxiv.org/abs/1804
     A_data = A.data
     A_indptr = A.indptr
     A_indices = A.indices
+    scaling = _sample_scaling(sample_weight, n_samples)
 
     dual_var = np.zeros(n_samples)  # alpha_t in [NDTELP2020]
     grad_agg = np.zeros(n_features)  # r_t in [NDTELP2020]
+    intercept = 0.
+    grad_agg_intercept = 0.
 
     if variant == 'LF':
         agg = utils.safe_sparse_dot(A, x)  # sigma_t in [LF2020]
@@ -882,17 +1820,19 @@ From Convex Minimization to Submodular Maximization" <https://arxiv.org/abs/1804
             batch_idx = idx[i: min(i + batch_size, n_samples)]
 
             x_prev = x.copy()
+            intercept_prev = intercept
             if step_size != 'DR':
                 step_size_x, step_size_agg = step_size_fun(locals())
             dual_var_prev = dual_var[batch_idx].copy()
 
             if variant in {'SAG', 'SAGA'}:
-                p = utils.fast_csr_mv(A_data, A_indptr, A_indices, x, batch_idx)
-                dual_var[batch_idx] = (1 / n_samples) * f_deriv(p, b[batch_idx])
+                p = utils.fast_csr_mv(A_data, A_indptr, A_indices, x, batch_idx) + intercept
+                dual_var[batch_idx] = (scaling[batch_idx] / n_samples) * f_deriv(p, b[batch_idx])
 
             elif variant == 'MHK':
-                p = utils.fast_csr_mv(A_data, A_indptr, A_indices, x, batch_idx)
-                dual_var[batch_idx] += step_size_agg * (f_deriv(p, b[batch_idx]) - dual_var[batch_idx])
+                p = utils.fast_csr_mv(A_data, A_indptr, A_indices, x, batch_idx) + intercept
+                dual_var[batch_idx] += step_size_agg * (scaling[batch_idx] * f_deriv(p, b[batch_idx])
+                                                        - dual_var[batch_idx])
 
             elif variant == 'LF':
                 update_direction, fw_vertex_rep, away_vertex_rep, max_step_size = lmo(-grad_agg, x, active_set)
@@ -900,12 +1840,21 @@ From Convex Minimization to Submodular Maximization" <https://arxiv.org/abs/1804
                 agg[batch_idx] += step_size_agg * (utils.fast_csr_mv(A_data, A_indptr, A_indices, extr_point,
                                                                      batch_idx)
                                                    - agg[batch_idx])
-                dual_var[batch_idx] = (1 / n_samples) * f_deriv(agg[batch_idx], b[batch_idx])
+                dual_var[batch_idx] = (scaling[batch_idx] / n_samples) * f_deriv(agg[batch_idx] + intercept,
+                                                                                 b[batch_idx])
 
             # For all variants, update the aggregate gradient
             grad_agg_update = utils.fast_csr_vm(dual_var[batch_idx] - dual_var_prev,
                                                 A_data, A_indptr, A_indices, n_features, batch_idx)
             grad_agg += grad_agg_update
+            if fit_intercept:
+                # .. the intercept is unconstrained, take a gradient step ..
+                grad_agg_intercept += np.sum(dual_var[batch_idx] - dual_var_prev)
+                if variant == 'MHK':
+                    # .. MHK does not scale dual_var by 1 / n_samples ..
+                    intercept -= grad_agg_intercept / (n_samples * lipschitz)
+                else:
+                    intercept -= grad_agg_intercept / lipschitz
 
             if variant in {'SAG', 'MHK'}:
                 update_direction, fw_vertex_rep, away_vertex_rep, max_step_size = lmo(-grad_agg, x, active_set)
@@ -929,11 +1878,11 @@ From Convex Minimization to Submodular Maximization" <https://arxiv.org/abs/1804
             if callback is not None:
                 callback(locals())
 
-            if np.abs(x - x_prev).sum() < tol:
+            if np.abs(x - x_prev).sum() + abs(intercept - intercept_prev) < tol:
                 success = True
                 break
             i += batch_size
             step += 1
 
     message = ""
-    return optimize.OptimizeResult(x=x, success=success, nit=it, message=message)
+    return optimize.OptimizeResult(x=x, intercept=intercept, success=success, nit=it, message=message)
@@ -0,0 +1,533 @@
+"""Gap-safe screening rules and working sets for L1 and group-L1 problems."""
+import copy
+import warnings
+
+import numpy as np
+from scipy import optimize, sparse, special
+
+from copt import loss as loss_module
+from copt import penalty as penalty_module
+from copt import proximal_gradient, randomized, splitting, utils
+
+
+def _check_problem(loss, penalty):
+    if not isinstance(loss, (loss_module.LogLoss, loss_module.SquareLoss)):
+        raise ValueError("Screening is implemented for LogLoss and SquareLoss")
+    if loss.intercept or loss.alpha != 0:
+        raise ValueError("Screening requires a loss without intercept and alpha=0")
+    if utils.is_linear_operator(loss.A):
+        raise ValueError("Screening requires the columns of A, not a linear operator")
+    if isinstance(penalty, penalty_module.GroupL1):
+        n_grouped = sum(len(g) for g in penalty.groups)
+        if n_grouped != loss.A.shape[1] or penalty.groups[0][0] != 0:
+            raise ValueError("Screening requires every feature to be in a group")
+    elif not isinstance(penalty, penalty_module.L1Norm):
+        raise ValueError("Screening is implemented for L1Norm and GroupL1")
+
+
+def _group_starts(penalty):
+    return np.array([g[0] for g in penalty.groups], dtype=np.int64)
+
+
+def _block_starts(penalty, n_features):
+    """First feature of each block: the groups of GroupL1, else each feature."""
+    if isinstance(penalty, penalty_module.GroupL1):
+        return _group_starts(penalty)
+    return np.arange(n_features)
+
+
+def _residual_conjugate(loss, z, s):
+    """Derivative r of the loss at the margins z and conjugate at s r."""
+    b = loss.b
+    if isinstance(loss, loss_module.LogLoss):
+        residual = loss.expit_b(np.asarray(z, dtype=np.float64), b)
+        # .. the conjugate is the negative entropy of s r + b, in [0, 1] ..
+        p = np.clip(s * residual + b, 0, 1)
+        conj = special.xlogy(p, p) + special.xlogy(1 - p, 1 - p)
+    else:
+        residual = np.asarray(z, dtype=np.float64) - b
+        conj = 0.5 * (s * residual) ** 2 + s * residual * b
+    return residual, conj
+
+
+def _column_squared_norms(loss):
+    """Squared euclidean norms of the columns of (A - 1 offset^T) diag(scale)."""
+    A = loss.A
+    if sparse.issparse(A):
+        norms = np.asarray(A.multiply(A).sum(0), dtype=np.float64).ravel()
+    else:
+        A = np.asarray(A, dtype=np.float64)
+        norms = np.einsum("ij,ij->j", A, A)
+    if loss.offset is not None:
+        # .. ||a_j - mu_j||^2 = ||a_j||^2 - 2 mu_j sum_i a_ij + n mu_j^2 ..
+        col_sums = np.asarray(A.sum(0), dtype=np.float64).ravel()
+        mu = loss.offset
+        norms = norms - 2 * mu * col_sums + A.shape[0] * mu * mu
+        norms = np.maximum(norms, 0)
+    if loss.scale is not None:
+        norms = norms * loss.scale ** 2
+    return norms
+
+
+def duality_gap(loss, penalty, x):
+    """Duality gap of loss + penalty at x.
+
+    The dual point is the (weighted, negated) residual -w_i l'(a_i^T x, b_i)
+    / sum(w), rescaled so that the dual norm of A^T theta is at most the
+    regularization parameter. Its computation reuses the product A x of the
+    last loss evaluation at x.
+
+    Args:
+      loss: LogLoss or SquareLoss
+          Loss without intercept and with alpha=0.
+
+      penalty: L1Norm or GroupL1
+          Penalty. With GroupL1, every feature should be in a group.
+
+      x: array of shape (n_features,)
+          Primal point.
+
+    Returns:
+      gap: float
+          Difference between the primal objective at x and the dual
+          objective at theta.
+
+      theta: array of shape (n_samples,)
+          Dual feasible point.
+
+      correlations: array of shape (n_features,)
+          Product A^T theta.
+    """
+    _check_problem(loss, penalty)
+    x = np.asarray(x)
+    z = loss._cached_matvec(x)
+    residual = _residual_conjugate(loss, z, 0.0)[0]
+    weights = loss.sample_weight
+    c = np.full(residual.size, 1.0 / residual.size) if weights is None else (
+        weights / weights.sum()
+    )
+    theta = -c * residual
+    correlations = np.asarray(loss._rmatvec(theta), dtype=np.float64)
+    if isinstance(penalty, penalty_module.GroupL1):
+        dual_norm = np.sqrt(
+            np.add.reduceat(correlations ** 2, _group_starts(penalty))
+        ).max()
+    else:
+        dual_norm = np.abs(correlations).max()
+    # .. rescale into the dual feasible set {theta : dual_norm <= alpha} ..
+    s = 1.0 if dual_norm <= penalty.alpha else penalty.alpha / dual_norm
+    theta *= s
+    correlations *= s
+    primal = loss(x) + penalty(x)
+    conj = _residual_conjugate(loss, z, s)[1]
+    dual = -np.dot(c, conj)
+    return max(primal - dual, 0.0), theta, correlations
+
+
+def gap_safe_screen(loss, penalty, x):
+    """Features that are zero in every solution, by the gap-safe rule.
+
+    The dual objective is strongly concave, so the dual solution is within
+    a ball of radius sqrt(2 L gap) around the dual point of
+    :func:`duality_gap`, L being the largest (weighted) curvature of the
+    loss. A feature (with GroupL1 a group) whose correlation with every
+    point of the ball is below the regularization parameter is zero in
+    every solution.
+
+    Args:
+      loss, penalty, x:
+          As in :func:`duality_gap`.
+
+    Returns:
+      gap: float
+          Duality gap at x.
+
+      screened: boolean array of shape (n_features,)
+          Features that can be discarded.
+    """
+    gap, _, correlations = duality_gap(loss, penalty, x)
+    col_norms = _column_squared_norms(loss)
+    return gap, _safe_rule(loss, penalty, gap, correlations, col_norms)
+
+
+def _safe_rule(loss, penalty, gap, correlations, col_norms):
+    """Mask of the features discarded by the gap-safe sphere test, given the
+    gap, the correlations A^T theta and the squared column norms of A."""
+    weights = loss.sample_weight
+    n_samples = loss.A.shape[0]
+    c_max = 1.0 / n_samples if weights is None else weights.max() / weights.sum()
+    curvature = 0.25 if isinstance(loss, loss_module.LogLoss) else 1.0
+    radius = np.sqrt(2 * curvature * c_max * gap)
+    if isinstance(penalty, penalty_module.GroupL1):
+        starts = _group_starts(penalty)
+        sizes = np.diff(np.append(starts, correlations.size))
+        score = np.sqrt(np.add.reduceat(correlations ** 2, starts))
+        score += radius * np.sqrt(np.add.reduceat(col_norms, starts))
+        screened = np.repeat(score < penalty.alpha, sizes)
+    else:
+        screened = np.abs(correlations) + radius * np.sqrt(col_norms) < penalty.alpha
+    return screened
+
+
+def _restrict(loss, penalty, keep):
+    """Copies of loss and penalty on the features keep."""
+    reduced = copy.copy(loss)
+    scale, offset = loss.scale, loss.offset
+    reduced._scale = reduced._offset = None
+    reduced.A = loss.A[:, keep]
+    if scale is not None:
+        reduced.scale = scale[keep]
+    if offset is not None:
+        reduced.offset = offset[keep]
+    if isinstance(penalty, penalty_module.GroupL1):
+        groups = []
+        start = 0
+        for g in penalty.groups:
+            if keep[g[0]]:
+                groups.append(np.arange(start, start + len(g)))
+                start += len(g)
+        penalty = penalty_module.GroupL1(penalty.alpha, groups)
+    return reduced, penalty
+
+
+def minimize_screened(
+    loss,
+    penalty,
+    x0=None,
+    solver=None,
+    step_size=None,
+    tol=1e-6,
+    max_iter=500,
+    screen_every=10,
+    verbose=0,
+    callback=None,
+):
+    """Minimize loss + penalty, discarding features with gap-safe screening.
+
+    The solver is run for screen_every iterations (epochs for SAGA) at a
+    time. In between, the duality gap is computed and the features that
+    :func:`gap_safe_screen` proves to be zero are permanently removed,
+    so that the next iterations use a copy of A restricted to the
+    remaining columns.
+
+    Args:
+      loss: LogLoss or SquareLoss
+          Loss without intercept and with alpha=0.
+
+      penalty: L1Norm or GroupL1
+          Penalty. With GroupL1, every feature should be in a group.
+
+      x0: array of shape (n_features,), optional
+          Initial guess, zero by default.
+
+      solver: callable, optional
+          One of :func:`copt.minimize_proximal_gradient` (default),
+          :func:`copt.minimize_three_split` or :func:`copt.minimize_saga`.
+          SAGA absorbs the offset of the columns in the intercept, so it
+          does not support losses with an offset here.
+
+      step_size: float, optional
+          Step size of the solver. By default 1 / loss.lipschitz for the
+          proximal gradient, 1 / (3 loss.max_lipschitz) for SAGA and a
+          line search for the three operator splitting.
+
+      tol: float
+          Tolerance on the duality gap.
+
+      max_iter: int
+          Maximum number of iterations (epochs for SAGA) of the solver.
+
+      screen_every: int
+          Number of iterations of the solver between two screenings.
+
+      verbose: int
+          Verbosity level.
+
+      callback: callable, optional
+          Called after each screening with the local variables. The
+          algorithm exits if it returns False.
+
+    Returns:
+      res: OptimizeResult
+          The optimization result, with the solution x, the duality gap
+          (certificate), the number of iterations nit, the features that
+          were not discarded (active, a boolean mask) and the duality gaps
+          and number of active features after each screening
+          (trace_certificate and trace_active).
+
+    References:
+      Ndiaye, Eugene, Olivier Fercoq, Alexandre Gramfort, and Joseph Salmon.
+      `"Gap Safe screening rules for sparsity enforcing penalties."
+      <https://jmlr.org/papers/v18/16-577.html>`_ Journal of Machine Learning
+      Research 18 (2017).
+    """
+    _check_problem(loss, penalty)
+    if solver is None:
+        solver = proximal_gradient.minimize_proximal_gradient
+    supported = (
+        proximal_gradient.minimize_proximal_gradient,
+        splitting.minimize_three_split,
+        randomized.minimize_saga,
+    )
+    if solver not in supported:
+        raise ValueError(
+            "solver should be minimize_proximal_gradient, minimize_three_split "
+            "or minimize_saga"
+        )
+    if solver is randomized.minimize_saga and loss.offset is not None:
+        raise ValueError("minimize_saga supports an offset only with an intercept")
+    n_features = loss.A.shape[1]
+    if x0 is None:
+        x = np.zeros(n_features, dtype=utils.float_dtype(loss.A))
+    else:
+        x = np.asarray(x0)
+        x = x.astype(utils.float_dtype(x)).ravel()
+    # .. the step sizes of the full problem are valid for the reduced ones ..
+    if step_size is None and solver is proximal_gradient.minimize_proximal_gradient:
+        step_size = 1.0 / loss.lipschitz
+    elif step_size is None and solver is randomized.minimize_saga:
+        step_size = 1.0 / (3 * loss.max_lipschitz)
+
+    active = np.arange(n_features)
+    f, h = loss, penalty
+    warm_start = None
+    success = False
+    nit = 0
+    trace_gap, trace_active = [], []
+    while True:
+        gap, screened = gap_safe_screen(f, h, x)
+        trace_gap.append(gap)
+        if verbose:
+            print(
+                "Iteration %s, duality gap %.3e, %s active features"
+                % (nit, gap, active.size)
+            )
+        if screened.any():
+            keep = ~screened
+            active = active[keep]
+            x = x[keep]
+            if warm_start is not None:
+                warm_start.gradient_average = warm_start.gradient_average[keep]
+            if not active.size:
+                # .. all the features are zero in the solution ..
+                trace_active.append(0)
+                success = True
+                break
+            f, h = _restrict(f, h, keep)
+        trace_active.append(active.size)
+        if callback is not None and callback(locals()) is False:
+            break
+        if gap <= tol:
+            success = True
+            break
+        if nit >= max_iter:
+            break
+        n_iter = min(screen_every, max_iter - nit)
+        if solver is randomized.minimize_saga:
+            res = solver(
+                f.partial_deriv,
+                f.A,
+                f.b,
+                x,
+                step_size,
+                prox=h.prox_factory(active.size),
+                max_iter=n_iter,
+                tol=0,
+                verbose=0,
+                warm_start=warm_start,
+                sample_weight=f.sample_weight,
+                scale=f.scale,
+                offset=f.offset,
+            )
+            # .. the support matrix depends on the columns, so that it is ..
+            # .. recomputed from the remaining ones ..
+            warm_start = optimize.OptimizeResult(
+                memory_gradient=res.memory_gradient,
+                gradient_average=res.gradient_average,
+                support=None,
+                support_counts=None,
+            )
+        elif solver is splitting.minimize_three_split:
+            res = solver(
+                f.f_grad, x, prox_1=h.prox, step_size=step_size, max_iter=n_iter, tol=0
+            )
+            step_size = res.step_size
+        else:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)
+                res = solver(
+                    f.f_grad,
+                    x,
+                    prox=h.prox,
+                    jac=True,
+                    step=lambda _: step_size,
+                    # .. which runs max_iter + 1 iterations ..
+                    max_iter=n_iter - 1,
+                    tol=0,
+                )
+        x = res.x
+        nit += n_iter
+
+    x_full = np.zeros(n_features, dtype=x.dtype)
+    x_full[active] = x
+    mask = np.zeros(n_features, dtype=bool)
+    mask[active] = True
+    return optimize.OptimizeResult(
+        x=x_full,
+        success=success,
+        certificate=trace_gap[-1],
+        nit=nit,
+        active=mask,
+        trace_certificate=trace_gap,
+        trace_active=trace_active,
+    )
+
+
+def minimize_working_set(
+    loss,
+    penalty,
+    x0=None,
+    solver=None,
+    step_size=None,
+    tol=1e-6,
+    max_iter=50,
+    working_set_size=10,
+    inner_max_iter=1000,
+    screen_every=10,
+    verbose=0,
+    callback=None,
+):
+    """Minimize loss + penalty on a growing working set of features.
+
+    Each outer iteration computes the duality gap and the correlations
+    A^T theta of the full problem (one product with A and one with A^T),
+    discards the features that :func:`gap_safe_screen` proves to be zero
+    and ranks the remaining features (with GroupL1 the groups) by their
+    distance to the dual constraint (alpha - |a_j^T theta|) / ||a_j||,
+    violated constraints coming first. The working set is the nonzero
+    features of the current iterate plus the best ranked ones, up to
+    twice the size of the support (and at least working_set_size). The
+    problem restricted to the working set is then solved with
+    :func:`minimize_screened` up to a duality gap of 0.3 times the
+    current one.
+
+    Args:
+      loss, penalty, x0, solver, step_size:
+          As in :func:`minimize_screened`. The step sizes are by default
+          those of the restricted problems.
+
+      tol: float
+          Tolerance on the duality gap of the full problem.
+
+      max_iter: int
+          Maximum number of outer iterations.
+
+      working_set_size: int
+          Size of the first working set, in blocks (features, or groups
+          with GroupL1).
+
+      inner_max_iter, screen_every:
+          max_iter and screen_every of the restricted problems.
+
+      verbose: int
+          Verbosity level.
+
+      callback: callable, optional
+          Called at each outer iteration with the local variables. The
+          algorithm exits if it returns False.
+
+    Returns:
+      res: OptimizeResult
+          The optimization result, with the solution x, the duality gap
+          (certificate), the total number of iterations of the solver nit,
+          the last working set (working_set, a boolean mask) and the
+          duality gaps and working set sizes of each outer iteration
+          (trace_certificate and trace_working_set).
+
+    References:
+      Massias, Mathurin, Alexandre Gramfort, and Joseph Salmon.
+      `"Celer: a Fast Solver for the Lasso with Dual Extrapolation."
+      <https://arxiv.org/abs/1802.07481>`_ International Conference on
+      Machine Learning (2018).
+    """
+    _check_problem(loss, penalty)
+    n_features = loss.A.shape[1]
+    if x0 is None:
+        x = np.zeros(n_features, dtype=utils.float_dtype(loss.A))
+    else:
+        x = np.asarray(x0)
+        x = x.astype(utils.float_dtype(x)).ravel()
+    starts = _block_starts(penalty, n_features)
+    sizes = np.diff(np.append(starts, n_features))
+    n_blocks = starts.size
+    col_norms = _column_squared_norms(loss)
+    block_norms = np.sqrt(np.add.reduceat(col_norms, starts))
+    screened = np.zeros(n_blocks, dtype=bool)
+
+    success = False
+    nit = 0
+    trace_gap, trace_ws = [], []
+    working_set = np.zeros(n_features, dtype=bool)
+    for it in range(max_iter + 1):
+        gap, _, correlations = duality_gap(loss, penalty, x)
+        trace_gap.append(gap)
+        if verbose:
+            print(
+                "Iteration %s, duality gap %.3e, working set of %s features"
+                % (it, gap, working_set.sum())
+            )
+        if callback is not None and callback(locals()) is False:
+            break
+        if gap <= tol:
+            success = True
+            break
+        if it == max_iter:
+            break
+        screened |= _safe_rule(loss, penalty, gap, correlations, col_norms)[starts]
+        support = np.add.reduceat(np.abs(x), starts) != 0
+        # .. distance of each block to its dual constraint ..
+        block_corr = np.sqrt(np.add.reduceat(correlations ** 2, starts))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            score = (penalty.alpha - block_corr) / block_norms
+        score[np.isnan(score)] = np.inf
+        score[support] = -np.inf
+        score[screened] = np.inf
+        ws_size = min(
+            max(working_set_size, 2 * support.sum()), n_blocks - screened.sum()
+        )
+        if ws_size == 0:
+            # .. every block is zero in the solution ..
+            x[:] = 0
+            working_set[:] = False
+            success = True
+            break
+        selected = np.argpartition(score, ws_size - 1)[:ws_size]
+        blocks = np.zeros(n_blocks, dtype=bool)
+        blocks[selected] = True
+        working_set = np.repeat(blocks, sizes)
+        x[~working_set] = 0
+
+        f, h = _restrict(loss, penalty, working_set)
+        res = minimize_screened(
+            f,
+            h,
+            x0=x[working_set],
+            solver=solver,
+            step_size=step_size,
+            tol=0.3 * gap,
+            max_iter=inner_max_iter,
+            screen_every=screen_every,
+        )
+        x[working_set] = res.x
+        nit += res.nit
+        trace_ws.append(working_set.sum())
+
+    return optimize.OptimizeResult(
+        x=x,
+        success=success,
+        certificate=trace_gap[-1],
+        nit=nit,
+        working_set=working_set,
+        trace_certificate=trace_gap,
+        trace_working_set=trace_ws,
+    )
@@ -36,7 +36,8 @@ def minimize_three_split(
         With return_gradient=False, returns only the function value.
 
       x0 : array-like
-        Initial guess
+        Initial guess. The iterates are float32 if x0 is float32, and
+        float64 otherwise.
 
       prox_1 : callable or None
         prox_1(x, alpha, *args) returns the proximal operator of g at xa
@@ -110,12 +111,16 @@ def minimize_three_split(
         def prox_2(x, s, *args):
             return x
 
+    x0 = np.asarray(x0)
+    x0 = x0.astype(utils.float_dtype(x0), copy=False)
     if step_size is None:
         line_search = True
         step_size = 1.0 / utils.init_lipschitz(f_grad, x0)
 
     z = prox_2(x0, step_size, *args_prox)
-    LS_EPS = np.finfo(np.float).eps
+    # .. the sufficient decrease condition is checked up to the precision ..
+    # .. of the iterates ..
+    LS_EPS = np.finfo(x0.dtype).eps
 
     fk, grad_fk = f_grad(z)
     x = prox_1(z - step_size * grad_fk, step_size, *args_prox)
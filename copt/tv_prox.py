@@ -9,6 +9,7 @@ These are implementations of some proximal operators
 import numpy as np
 import warnings
 from . import utils
+from .operators import FiniteDifferences
 
 
 def prox_tv1d(w, step_size):
@@ -45,15 +46,17 @@ def prox_tv1d(w, step_size):
 @utils.njit
 def _prox_tv1d(step_size, input, output):
     """low level function call, no checks are performed"""
+    # .. the taut string is computed on the cumulative sums of the input,
+    # which are kept in float64 also for float32 inputs ..
     width = input.size + 1
     index_low = np.zeros(width, dtype=np.int32)
-    slope_low = np.zeros(width, dtype=input.dtype)
+    slope_low = np.zeros(width, dtype=np.float64)
     index_up = np.zeros(width, dtype=np.int32)
-    slope_up = np.zeros(width, dtype=input.dtype)
+    slope_up = np.zeros(width, dtype=np.float64)
     index = np.zeros(width, dtype=np.int32)
-    z = np.zeros(width, dtype=input.dtype)
-    y_low = np.empty(width, dtype=input.dtype)
-    y_up = np.empty(width, dtype=input.dtype)
+    z = np.zeros(width, dtype=np.float64)
+    y_low = np.empty(width, dtype=np.float64)
+    y_up = np.empty(width, dtype=np.float64)
     s_low, c_low, s_up, c_up, c = 0, 0, 0, 0, 0
     y_low[0] = y_up[0] = 0
     y_low[1] = input[0] - step_size
@@ -164,9 +167,8 @@ def c_prox_tv2d(step_size, x, n_rows, n_cols, max_iter, tol):
 
     Reference: Algorithm 7 in https://arxiv.org/abs/1411.0589
     """
-    n_features = n_rows * n_cols
-    p = np.zeros(n_features)
-    q = np.zeros(n_features)
+    p = np.zeros_like(x)
+    q = np.zeros_like(x)
 
     for it in range(max_iter):
         y = x + p
@@ -202,7 +204,7 @@ def prox_tv2d(w, step_size, n_rows, n_cols, max_iter=500, tol=1e-6):
     Parameters
     ----------
     w: array
-        vector of coefficients
+        vector of coefficients. float32 inputs give a float32 output.
 
     step_size: float
         step size (often denoted gamma) in proximal objective function
@@ -221,7 +223,7 @@ def prox_tv2d(w, step_size, n_rows, n_cols, max_iter=500, tol=1e-6):
     arXiv:1411.0589 (2014).
     """
 
-    x = w.copy().astype(np.float64)
+    x = w.astype(utils.float_dtype(w))
     return c_prox_tv2d(step_size, x, n_rows, n_cols, max_iter, tol)
 
 
@@ -236,21 +238,17 @@ def tv2d_linear_operator(n_rows, n_cols):
 
     Returns
     -------
-
+    L: copt.operators.FiniteDifferences
+        Matrix-free operator of the vertical and horizontal differences of
+        the (n_rows, n_cols) image, with O(n_rows * n_cols) products.
+
+    Notes
+    -----
+    Changed in version 0.9.0: this used to return a dense ndarray of shape
+    (2 n_rows n_cols - n_rows - n_cols, n_rows n_cols), with one row per
+    pair of neighbouring pixels. It now returns a LinearOperator, whose rows
+    are the vertical differences followed by the horizontal ones, with the
+    opposite sign. ||L x||_1 is unchanged. Use L.matvec and L.rmatvec for
+    the products, or L.matmat(np.eye(n_rows * n_cols)) for the dense matrix.
     """
-
-    L = []
-    for i in range(n_rows):
-        for j in range(n_cols):
-            if i < n_rows - 1:
-                tmp1 = np.zeros((n_rows, n_cols))
-                tmp1[i, j] = 1
-                tmp1[i + 1, j] = -1
-                L.append(tmp1.ravel())
-
-            if j < n_cols - 1:
-                tmp2 = np.zeros((n_rows, n_cols))
-                tmp2[i, j] = 1
-                tmp2[i, j + 1] = -1
-                L.append(tmp2.ravel())
-    return np.array(L)
+    return FiniteDifferences((n_rows, n_cols))
@@ -1,3 +1,5 @@
+import numbers
+
 import numpy as np
 from scipy import sparse
 from scipy import optimize
@@ -5,7 +7,7 @@ from datetime import datetime
 from sklearn.utils.extmath import safe_sparse_dot
 
 try:
-    from numba import njit, prange
+    from numba import njit, prange, get_num_threads
 except ImportError:
     from functools import wraps
 
@@ -31,6 +33,9 @@ except ImportError:
     
     prange = range
 
+    def get_num_threads():
+        return 1
+
 
 def build_func_grad(jac, fun, args, eps):
     if not callable(jac):
@@ -57,6 +62,42 @@ def build_func_grad(jac, fun, args, eps):
     return func_and_grad
 
 
+def build_line_f_grad(jac, fun, args, func_and_grad):
+    """Restriction of the objective to a line, for line searches.
+
+    Returns a callable line_f_grad(x, direction) that returns
+    phi(t, return_gradient=False), the objective (and gradient) at
+    x + t * direction. If fun is the f_grad method of a loss that
+    implements line_f_grad (see :mod:`copt.loss`), that method is used and
+    trial points do not need products with the data matrix. Otherwise
+    phi evaluates func_and_grad and reuses its result when the gradient is
+    requested at the last trial point.
+    """
+    owner = getattr(fun, "__self__", None)
+    if (
+        jac is True
+        and not args
+        and hasattr(owner, "line_f_grad")
+        and getattr(fun, "__func__", None) is getattr(type(owner), "f_grad", None)
+    ):
+        return owner.line_f_grad
+
+    def line_f_grad(x, direction):
+        last = {}
+
+        def phi(t, return_gradient=False):
+            if last.get("t") != t:
+                last["t"] = t
+                last["f_grad"] = func_and_grad(x + t * direction)
+            if return_gradient:
+                return last["f_grad"]
+            return last["f_grad"][0]
+
+        return phi
+
+    return line_f_grad
+
+
 def safe_sparse_add(a, b):
     if sparse.issparse(a) and sparse.issparse(b):
         # both are sparse, keep the result sparse
@@ -83,6 +124,65 @@ def sample_batches(n_samples, n_batches, batch_size):
     return idx
 
 
+# .. bytes of data we aim to keep resident while sweeping a block of rows,
+# of the order of a per-core L2 cache ..
+CACHE_SIZE = 2 ** 20
+
+
+def row_block_size(A, cache_size=CACHE_SIZE):
+    """Number of consecutive rows of the CSR matrix A that fit in cache.
+
+    The estimate accounts for the CSR slice of the rows (data, indices and
+    indptr) and for two float64 per-sample arrays (e.g. targets and memory
+    terms) that are accessed alongside.
+    """
+    n_samples = A.shape[0]
+    nnz_per_row = A.nnz / max(n_samples, 1)
+    row_bytes = (
+        nnz_per_row * (A.data.itemsize + A.indices.itemsize)
+        + A.indptr.itemsize
+        + 2 * 8
+    )
+    return int(max(1, min(n_samples, cache_size // row_bytes)))
+
+
+def epoch_order(n_samples, order="random", block_size=1):
+    """Order in which the samples are visited during an epoch.
+
+    Args:
+      n_samples: int
+          Number of samples.
+
+      order: {"random", "block", "block_shuffle"}
+          "random" returns a random permutation of the samples. "block"
+          splits the samples into contiguous blocks of block_size rows and
+          visits the blocks in random order, the rows of a block in
+          increasing order. "block_shuffle" additionally shuffles the rows
+          within each block.
+
+      block_size: int
+          Number of rows in a block, see :func:`row_block_size`.
+
+    Returns:
+      idx: np.ndarray
+          Permutation of np.arange(n_samples).
+    """
+    if order == "random":
+        return np.random.permutation(n_samples)
+    if order not in ("block", "block_shuffle"):
+        raise ValueError("Unknown order %s" % order)
+    block_size = int(max(1, min(block_size, n_samples)))
+    n_blocks = -(-n_samples // block_size)
+    starts = np.random.permutation(n_blocks) * block_size
+    if order == "block_shuffle":
+        offsets = np.argsort(np.random.rand(n_blocks, block_size), axis=1)
+    else:
+        offsets = np.broadcast_to(np.arange(block_size), (n_blocks, block_size))
+    idx = (starts[:, None] + offsets).ravel()
+    # .. drop the padding of the last (incomplete) block ..
+    return idx[idx < n_samples]
+
+
 @njit(nogil=True)
 def fast_csr_vm(x, data, indptr, indices, d, idx):
     """
@@ -128,11 +228,418 @@ def fast_csr_mv(data, indptr, indices, x, idx):
     return res
 
 
+@njit(nogil=True, parallel=True)
+def _csr_matvec(data, indices, indptr, x, n_chunks):
+    # .. the dot product of each row is accumulated in float64 and stored
+    # in the dtype of x ..
+    n_rows = indptr.size - 1
+    chunk_size = (n_rows + n_chunks - 1) // n_chunks
+    out = np.zeros(n_rows, dtype=x.dtype)
+    for k in prange(n_chunks):
+        for i in range(k * chunk_size, min((k + 1) * chunk_size, n_rows)):
+            s = 0.0
+            for j in range(indptr[i], indptr[i + 1]):
+                s += data[j] * x[indices[j]]
+            out[i] = s
+    return out
+
+
+@njit(nogil=True, parallel=True)
+def _csr_rmatvec(data, indices, indptr, r, n_cols, n_chunks):
+    n_rows = indptr.size - 1
+    chunk_size = (n_rows + n_chunks - 1) // n_chunks
+    # .. one buffer per chunk of rows, reduced at the end ..
+    buf = np.zeros((n_chunks, n_cols))
+    for k in prange(n_chunks):
+        for i in range(k * chunk_size, min((k + 1) * chunk_size, n_rows)):
+            for j in range(indptr[i], indptr[i + 1]):
+                buf[k, indices[j]] += data[j] * r[i]
+    out = np.zeros(n_cols, dtype=r.dtype)
+    for j in prange(n_cols):
+        for k in range(n_chunks):
+            out[j] += buf[k, j]
+    return out
+
+
+@njit(nogil=True, parallel=True)
+def _dense_matvec(A, x, n_chunks):
+    n_rows = A.shape[0]
+    chunk_size = (n_rows + n_chunks - 1) // n_chunks
+    out = np.zeros(n_rows, dtype=x.dtype)
+    for k in prange(n_chunks):
+        start, stop = k * chunk_size, min((k + 1) * chunk_size, n_rows)
+        if start < stop:
+            out[start:stop] = np.dot(A[start:stop], x)
+    return out
+
+
+@njit(nogil=True, parallel=True)
+def _dense_rmatvec(A, r, n_chunks):
+    n_rows, n_cols = A.shape
+    chunk_size = (n_rows + n_chunks - 1) // n_chunks
+    buf = np.zeros((n_chunks, n_cols))
+    for k in prange(n_chunks):
+        start, stop = k * chunk_size, min((k + 1) * chunk_size, n_rows)
+        if start < stop:
+            buf[k] = np.dot(r[start:stop], A[start:stop])
+    return buf.sum(axis=0).astype(r.dtype)
+
+
+def float_dtype(*arrays):
+    """Floating point dtype in which to compute with the given arrays.
+
+    This is float32 if all the arrays (or sparse matrices) are float32, and
+    float64 otherwise, e.g. for integer or mixed float32 and float64 inputs.
+    Inputs without a dtype (Python scalars, None) are ignored, so that the
+    solvers keep float32 problems in float32.
+    """
+    dtypes = [a.dtype for a in arrays if hasattr(a, "dtype")]
+    if dtypes and all(dt == np.float32 for dt in dtypes):
+        return np.dtype(np.float32)
+    return np.dtype(np.float64)
+
+
+def effective_n_jobs(n_jobs):
+    """Number of threads to use for n_jobs (-1 means all of them)."""
+    if n_jobs is None:
+        return 1
+    if n_jobs < 0:
+        return max(get_num_threads() + 1 + n_jobs, 1)
+    return max(n_jobs, 1)
+
+
+def _parallel_ok(A, n_jobs):
+    if n_jobs <= 1 or getattr(A, "dtype", None) not in (np.float32, np.float64):
+        return False
+    if isinstance(A, np.ndarray):
+        return A.ndim == 2 and A.flags.c_contiguous
+    return sparse.isspmatrix_csr(A)
+
+
+def is_linear_operator(A):
+    """Whether A is a matrix-free linear operator.
+
+    These are objects other than arrays and sparse matrices that have
+    matvec and rmatvec methods and a shape, e.g.
+    scipy.sparse.linalg.LinearOperator.
+    """
+    if isinstance(A, np.ndarray) or sparse.issparse(A):
+        return False
+    return hasattr(A, "matvec") and hasattr(A, "rmatvec")
+
+
+def matvec(A, x, n_jobs=1):
+    """Matrix-vector product A x, splitting the rows of A across threads.
+
+    Args:
+      A: ndarray, sparse matrix or linear operator
+          Parallel products are computed for CSR and C-contiguous float32
+          and float64 arrays, other inputs fall back to safe_sparse_dot.
+          Linear operators (see :func:`is_linear_operator`) are applied
+          through their matvec method.
+
+      x: ndarray
+          1-d array with A.shape[1] elements.
+
+      n_jobs: int
+          Number of threads, -1 means all the threads available to numba.
+
+    Returns:
+      out: ndarray
+          1-d array with A.shape[0] elements, float32 if A and x are
+          float32 (see :func:`float_dtype`) and float64 otherwise.
+    """
+    if is_linear_operator(A):
+        return np.asarray(A.matvec(x), dtype=float_dtype(x)).ravel()
+    n_jobs = min(effective_n_jobs(n_jobs), A.shape[0])
+    if not _parallel_ok(A, n_jobs):
+        out = np.asarray(safe_sparse_dot(A, x, dense_output=True)).ravel()
+        return out.astype(float_dtype(A, x), copy=False)
+    x = np.ascontiguousarray(x, dtype=float_dtype(A, x)).ravel()
+    if sparse.issparse(A):
+        return _csr_matvec(A.data, A.indices, A.indptr, x, n_jobs)
+    return _dense_matvec(A, x, n_jobs)
+
+
+def rmatvec(A, r, n_jobs=1, A_T=None):
+    """Product A^T r, splitting the rows of A across threads.
+
+    Each thread accumulates the product of its rows in its own buffer and
+    the buffers are reduced at the end.
+
+    Args:
+      A: ndarray, sparse matrix or linear operator
+          See :func:`matvec`. Linear operators are applied through their
+          rmatvec method.
+
+      r: ndarray
+          1-d array with A.shape[0] elements.
+
+      n_jobs: int
+          Number of threads, -1 means all the threads available to numba.
+
+      A_T: sparse matrix or None
+          Optional CSR copy of A^T (i.e., A in CSC format, transposed). If
+          given, the product is computed as a row-parallel matvec with A_T,
+          which needs no per-thread buffers.
+
+    Returns:
+      out: ndarray
+          1-d array with A.shape[1] elements.
+    """
+    if is_linear_operator(A):
+        return np.asarray(A.rmatvec(r), dtype=float_dtype(r)).ravel()
+    if A_T is not None:
+        return matvec(A_T, r, n_jobs)
+    n_jobs = min(effective_n_jobs(n_jobs), A.shape[0])
+    if not _parallel_ok(A, n_jobs):
+        out = np.asarray(safe_sparse_dot(A.T, r, dense_output=True)).ravel()
+        return out.astype(float_dtype(A, r), copy=False)
+    r = np.ascontiguousarray(r, dtype=float_dtype(A, r)).ravel()
+    if sparse.issparse(A):
+        return _csr_rmatvec(A.data, A.indices, A.indptr, r, A.shape[1], n_jobs)
+    return _dense_rmatvec(A, r, n_jobs)
+
+
+def power_iteration(
+    A, v0=None, tol=1e-4, max_iter=1000, n_jobs=1, sample_weight=None
+):
+    """Upper bound on the squared spectral norm of A, by power iteration.
+
+    The Rayleigh quotient of the iterate is a lower bound on the largest
+    eigenvalue of A^T A. Adding the norm of its residual gives an upper
+    bound once the iterate is aligned with the top eigenvector, which is
+    what step sizes of the form 1 / L need.
+
+    Args:
+      A: ndarray or sparse matrix
+
+      v0: ndarray or None
+          Starting vector. Passing the vector returned by a previous call
+          (e.g. on a slightly different A) typically converges in a few
+          iterations. If None, a random vector is used.
+
+      tol: float
+          Relative tolerance on the residual ||A^T A v - s2 v|| / s2.
+
+      max_iter: int
+          Maximum number of iterations.
+
+      n_jobs: int
+          Number of threads used in the products with A, see :func:`matvec`.
+
+      sample_weight: ndarray or None
+          Nonnegative weights w of the rows of A. If given, the iteration is
+          on A^T diag(w) A, i.e., it estimates the squared spectral norm of
+          diag(sqrt(w)) A.
+
+    Returns:
+      s2: float
+          Rayleigh quotient plus the norm of its residual, an upper bound
+          on the largest eigenvalue of A^T A.
+
+      v: ndarray
+          Estimate of the associated (right) singular vector.
+    """
+    n_features = A.shape[1]
+    if v0 is None or np.size(v0) != n_features or not np.any(v0):
+        v = np.random.randn(n_features)
+    else:
+        v = np.array(v0, dtype=np.float64).ravel()
+    v /= np.linalg.norm(v)
+    s2 = residual = 0.0
+    for _ in range(max_iter):
+        Av = matvec(A, v, n_jobs)
+        if sample_weight is not None:
+            Av *= sample_weight
+        w = rmatvec(A, Av, n_jobs)
+        # .. Rayleigh quotient and its residual ..
+        s2 = v.dot(w)
+        residual = np.linalg.norm(w - s2 * v)
+        norm_w = np.linalg.norm(w)
+        if norm_w == 0:
+            return 0.0, v
+        v = w / norm_w
+        if residual <= tol * s2:
+            break
+    return s2 + residual, v
+
+
+def gram_matrix(A, b, n_jobs=1, chunk_size=10000):
+    """Compute A^T A, A^T b and ||b||^2 in a single pass over the rows of A.
+
+    The rows are split in chunks of chunk_size rows whose contributions are
+    computed by n_jobs threads and added up.
+
+    Returns:
+      gram: ndarray of shape (n_features, n_features)
+      Atb: ndarray of shape (n_features,)
+      bb: float
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    if sparse.issparse(A):
+        A = sparse.csr_matrix(A)
+    b = np.asarray(b, dtype=np.float64).ravel()
+    n_samples = A.shape[0]
+
+    def _chunk(start):
+        A_k = A[start:start + chunk_size]
+        b_k = b[start:start + chunk_size]
+        gram_k = safe_sparse_dot(A_k.T, A_k, dense_output=True)
+        Atb_k = safe_sparse_dot(A_k.T, b_k, dense_output=True)
+        return np.asarray(gram_k), np.asarray(Atb_k).ravel(), b_k.dot(b_k)
+
+    starts = range(0, n_samples, chunk_size)
+    with ThreadPoolExecutor(max_workers=effective_n_jobs(n_jobs)) as executor:
+        gram, Atb, bb = 0.0, 0.0, 0.0
+        for gram_k, Atb_k, bb_k in executor.map(_chunk, starts):
+            gram = gram + gram_k
+            Atb = Atb + Atb_k
+            bb += bb_k
+    return gram, Atb, bb
+
+
+def _splitmix64(z):
+    """Mix the bits of an array of uint64 (the splitmix64 finalizer)."""
+    z = z + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+@njit(nogil=True)
+def _csr_rows_equal(data, indices, indptr, labels, rows, reference):
+    # .. whether row rows[k] equals row reference[k] (and has the same label) ..
+    out = np.ones(rows.size, dtype=np.bool_)
+    for k in range(rows.size):
+        i, j = rows[k], reference[k]
+        nnz = indptr[i + 1] - indptr[i]
+        if labels[i] != labels[j] or nnz != indptr[j + 1] - indptr[j]:
+            out[k] = False
+            continue
+        for t in range(nnz):
+            ii, jj = indptr[i] + t, indptr[j] + t
+            if indices[ii] != indices[jj] or data[ii] != data[jj]:
+                out[k] = False
+                break
+    return out
+
+
+def collapse_duplicates(A, b=None, sample_weight=None, by_label=False):
+    """Collapse the duplicated rows of A into unique rows with weights.
+
+    Rows are hashed from their (column, value) pairs in a single vectorized
+    pass over the nonzeros and grouped by hash, and each row is then
+    compared with the first row of its group, so hash collisions never
+    merge different rows.
+
+    Args:
+      A: sparse matrix or ndarray, shape (n_samples, n_features)
+
+      b: array-like or None
+          Labels of the samples.
+
+      sample_weight: array-like or None
+          Weights of the samples, by default 1.
+
+      by_label: bool
+          If True, rows are only merged with copies that have the same
+          label. Otherwise the label of a unique row is the weighted mean
+          of the labels of its copies, which leaves the gradient of the
+          logistic and squared losses unchanged (the squared loss changes
+          by a constant), but not that of e.g. the Huber loss or the
+          multinomial loss, that need by_label=True.
+
+    Returns:
+      A_unique: sparse matrix or ndarray, shape (n_unique, n_features)
+          Unique rows, in the order of their first occurrence in A.
+
+      b_unique: ndarray or None
+          Weighted mean of the labels of the copies of each unique row.
+
+      weights: ndarray of shape (n_unique,)
+          Sum of the weights of the copies of each unique row.
+
+      inverse: ndarray of shape (n_samples,)
+          Index of the unique row of each sample, so that A_unique[inverse]
+          equals A.
+    """
+    is_sparse = sparse.issparse(A)
+    A_csr = sparse.csr_matrix(A, dtype=np.float64, copy=True)
+    # .. canonical format: sorted indices, no duplicates, no explicit zeros ..
+    A_csr.sum_duplicates()
+    A_csr.eliminate_zeros()
+    n_samples = A_csr.shape[0]
+    if b is not None:
+        b = np.asarray(b, dtype=np.float64).ravel()
+    if sample_weight is None:
+        sample_weight = np.ones(n_samples)
+    sample_weight = np.asarray(sample_weight, dtype=np.float64).ravel()
+    labels = b if (by_label and b is not None) else np.zeros(n_samples)
+
+    # .. the hash of a row is the (wrapping) sum of the hashes of its ..
+    # .. nonzeros, computed with a cumulative sum over the nonzeros ..
+    entry_hash = _splitmix64(
+        _splitmix64(A_csr.indices.astype(np.uint64)) ^ A_csr.data.view(np.uint64)
+    )
+    cumsum = np.zeros(entry_hash.size + 1, dtype=np.uint64)
+    np.cumsum(entry_hash, out=cumsum[1:])
+    row_hash = cumsum[A_csr.indptr[1:]] - cumsum[A_csr.indptr[:-1]]
+    row_hash = _splitmix64(row_hash ^ _splitmix64(labels.view(np.uint64)))
+
+    _, first, inverse = np.unique(row_hash, return_index=True, return_inverse=True)
+    inverse = inverse.ravel()
+    equal = _csr_rows_equal(
+        A_csr.data,
+        A_csr.indices,
+        A_csr.indptr,
+        labels,
+        np.arange(n_samples),
+        first[inverse],
+    )
+    if not np.all(equal):
+        # .. hash collisions, split the groups involved by their content ..
+        n_groups = first.size
+        for group in np.unique(inverse[~equal]):
+            groups = {}
+            for i in np.flatnonzero(inverse == group):
+                start, end = A_csr.indptr[i], A_csr.indptr[i + 1]
+                key = (
+                    A_csr.indices[start:end].tobytes(),
+                    A_csr.data[start:end].tobytes(),
+                    labels[i],
+                )
+                if key not in groups:
+                    groups[key] = group if not groups else n_groups
+                    n_groups += len(groups) > 1
+                inverse[i] = groups[key]
+        _, first, inverse = np.unique(inverse, return_index=True, return_inverse=True)
+        inverse = inverse.ravel()
+
+    # .. number the unique rows by their first occurrence ..
+    order = np.argsort(first, kind="stable")
+    rank = np.empty_like(order)
+    rank[order] = np.arange(order.size)
+    inverse = rank[inverse]
+    first = first[order]
+
+    weights = np.bincount(inverse, weights=sample_weight, minlength=first.size)
+    b_unique = None
+    if b is not None:
+        b_unique = np.bincount(inverse, weights=sample_weight * b, minlength=first.size)
+        nonzero = weights > 0
+        b_unique[nonzero] /= weights[nonzero]
+        b_unique[~nonzero] = b[first[~nonzero]]
+    A_unique = A_csr[first] if is_sparse else np.asarray(A)[first]
+    return A_unique, b_unique, weights, inverse
+
+
 def parse_step_size(step_size):
     if hasattr(step_size, "__len__") and len(step_size) == 2:
         return step_size[0], step_size[1]
-    elif isinstance(step_size, float):
-        return step_size, "fixed"
+    elif isinstance(step_size, numbers.Real) and not isinstance(step_size, bool):
+        return float(step_size), "fixed"
     elif hasattr(step_size, "__call__") or step_size == "adaptive":
         # without other information start with a step-size of one
         return 1, step_size
@@ -0,0 +1,80 @@
+"""
+Cache-blocked sample ordering in SAGA
+=====================================
+
+By default :func:`copt.minimize_saga` visits the samples in a random order,
+so that every update reads a random row of the data matrix and random
+entries of the targets and memory terms. On datasets that do not fit in
+cache this makes the epoch bound by cache misses.
+
+With ``order="block"`` the rows are split into contiguous blocks that fit in
+cache (see :func:`copt.utils.row_block_size`) and the blocks are visited in
+random order, with ``order="block_shuffle"`` the rows inside each block are
+shuffled as well. This example compares the throughput (epochs per second)
+against the convergence per epoch of the three orderings.
+"""
+import copt as cp
+import matplotlib.pyplot as plt
+import numpy as np
+from scipy import sparse
+
+import copt.loss
+import copt.penalty
+
+# .. construct a (random) dataset larger than the last level cache ..
+n_samples, n_features, nnz_per_row = 500000, 10000, 5
+np.random.seed(0)
+X = sparse.csr_matrix(
+    (
+        np.random.randn(n_samples * nnz_per_row),
+        np.random.randint(n_features, size=n_samples * nnz_per_row),
+        np.arange(0, n_samples * nnz_per_row + 1, nnz_per_row),
+    ),
+    shape=(n_samples, n_features),
+)
+w = np.random.randn(n_features)
+y = (X.dot(w) + 0.1 * np.random.randn(n_samples) > 0).astype(float)
+
+# .. objective function and regularizer ..
+f = copt.loss.LogLoss(X, y)
+g = copt.penalty.L1Norm(1.0 / n_samples)
+step_size = 1.0 / (3 * f.max_lipschitz)
+print("Rows per block: %s" % cp.utils.row_block_size(X))
+
+results = {}
+for order in ("random", "block", "block_shuffle"):
+    cb = cp.utils.Trace(lambda x: f(x) + g(x))
+    cp.minimize_saga(
+        f.partial_deriv,
+        X,
+        y,
+        np.zeros(n_features),
+        prox=g.prox_factory(n_features),
+        step_size=step_size,
+        callback=cb,
+        tol=0,
+        max_iter=20,
+        order=order,
+    )
+    results[order] = cb
+
+# .. plot the result ..
+fmin = min(np.min(cb.trace_fx) for cb in results.values())
+fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(10, 4))
+for order, cb in results.items():
+    # .. the first epoch also includes the JIT compilation ..
+    epoch_time = np.median(np.diff(cb.trace_time)[1:])
+    label = "%s (%.2fs / epoch)" % (order, epoch_time)
+    subopt = np.array(cb.trace_fx) - fmin + 1e-12
+    ax1.plot(subopt, lw=3, label=label)
+    ax2.plot(cb.trace_time, subopt, lw=3, label=label)
+
+ax1.set_xlabel("Epochs")
+ax2.set_xlabel("Time (in seconds)")
+for ax in (ax1, ax2):
+    ax.set_yscale("log")
+    ax.set_ylabel("Function suboptimality")
+    ax.grid()
+ax1.legend()
+plt.tight_layout()
+plt.show()
@@ -0,0 +1,76 @@
+"""Tests for the coordinate descent solver."""
+import numpy as np
+import pytest
+from numpy import testing
+from scipy import sparse
+
+import copt as cp
+import copt.loss
+import copt.penalty
+
+np.random.seed(0)
+n_samples, n_features = 60, 30
+A = sparse.random(n_samples, n_features, density=0.3, format="csr")
+b = np.random.randn(n_samples)
+groups = [np.arange(i, i + 3) for i in range(3, n_features - 6, 3)]
+
+all_losses = [
+    copt.loss.SquareLoss(A, b, alpha=0.01),
+    copt.loss.SquareLoss(A.toarray(), b, sample_weight=np.random.rand(n_samples)),
+    copt.loss.LogLoss(A, (b > 0).astype(float), scale=np.random.rand(n_features) + 0.5),
+]
+all_penalties = [None, copt.penalty.L1Norm(0.01), copt.penalty.GroupL1(0.02, groups)]
+
+
+def _solve(f, prox):
+    return cp.minimize_proximal_gradient(
+        f.f_grad, np.zeros(n_features), prox=prox, jac=True, tol=1e-12,
+        max_iter=50000,
+    ).x
+
+
+@pytest.mark.parametrize("f", all_losses)
+@pytest.mark.parametrize("h", all_penalties)
+@pytest.mark.parametrize("selection", ["cyclic", "shuffle", "greedy"])
+def test_coordinate_descent(f, h, selection):
+    if isinstance(f, copt.loss.LogLoss) and h is None:
+        # .. the unregularized logistic regression of separable data ..
+        # .. has no solution ..
+        h = copt.penalty.L1Norm(1e-3)
+    x_opt = _solve(f, None if h is None else h.prox)
+    opt = cp.minimize_coordinate_descent(
+        f, h, selection=selection, tol=1e-10, max_iter=10000
+    )
+    assert opt.success
+    testing.assert_allclose(opt.x, x_opt, atol=1e-5)
+
+
+def test_coordinate_descent_bounds():
+    f = copt.loss.SquareLoss(A, b)
+    h = copt.penalty.L1Norm(0.01)
+
+    def prox(x, step_size):
+        return np.clip(h.prox(x, step_size), 0, 0.5)
+
+    x_opt = _solve(f, prox)
+    for selection in ["cyclic", "greedy"]:
+        opt = cp.minimize_coordinate_descent(
+            f, h, bounds=(0, 0.5), selection=selection, tol=1e-12, max_iter=10000
+        )
+        assert opt.success
+        assert np.all(opt.x >= 0) and np.all(opt.x <= 0.5)
+        testing.assert_allclose(opt.x, x_opt, atol=1e-8)
+
+
+def test_coordinate_descent_errors():
+    f = copt.loss.SquareLoss(A, b)
+    with pytest.raises(ValueError):
+        cp.minimize_coordinate_descent(copt.loss.HuberLoss(A, b))
+    with pytest.raises(ValueError):
+        cp.minimize_coordinate_descent(f, selection="random")
+    with pytest.raises(ValueError):
+        cp.minimize_coordinate_descent(f, copt.penalty.TraceNorm(1, (5, 6)))
+    with pytest.raises(ValueError):
+        cp.minimize_coordinate_descent(
+            f, copt.penalty.GroupL1(0.1, groups), bounds=(0, 1)
+        )
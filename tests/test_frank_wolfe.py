@@ -64,6 +64,20 @@ def test_fw_l1(loss_grad, alpha):
     assert np.linalg.norm(grad_map) < 0.3
 
 
+def test_fw_float32():
+    """Float32 problems are solved with float32 iterates."""
+    l1ball = cp.constraint.L1Ball(1.0)
+    x = {}
+    for dtype in (np.float32, np.float64):
+        f = cp.loss.LogLoss(A.astype(dtype), b, 1.0 / n_samples)
+        opt = cp.minimize_frank_wolfe(
+            f.f_grad, np.zeros(n_features, dtype=dtype), l1ball.lmo, tol=1e-6
+        )
+        assert opt.x.dtype == dtype
+        x[dtype] = opt.x
+    np.testing.assert_allclose(x[np.float32], x[np.float64], atol=1e-4)
+
+
 def test_callback():
     """Make sure that the algorithm exists when the callback returns False."""
 
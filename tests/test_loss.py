@@ -1,7 +1,9 @@
 import numpy as np
+import pytest
 import copt as cp
-from scipy import optimize
+from scipy import optimize, special
 from scipy import sparse
+from scipy.sparse import linalg as splinalg
 
 import copt.loss
 
@@ -35,3 +37,396 @@ def test_log_hess():
 
         err = optimize.check_grad(obj, grad, np.random.randn(n_features))
         assert err < 1e-6
+
+
+def test_conjugate():
+    """Fenchel-Young equality f(p) + f^*(f'(p)) = p f'(p)."""
+    p = np.random.randn(n_samples)
+    for loss in [copt.loss.LogLoss, copt.loss.SquareLoss]:
+        f = loss(A_dense, b)
+        u = f.partial_deriv(p, b)
+        lhs = f.partial_loss(p, b) + f.partial_conjugate(u, b)
+        np.testing.assert_allclose(lhs, p * u, atol=1e-10)
+
+
+def test_logloss_sparse_dense():
+    """The fused CSR and dense code paths agree, also for large margins."""
+    A = A_sparse.toarray()
+    for scale in (1, 100):
+        x = scale * np.random.randn(n_features)
+        z = A.dot(x)
+        loss_ref = np.mean(np.logaddexp(0, z) - b * z)
+        for A_ in (A, A_sparse, sparse.coo_matrix(A_sparse)):
+            f = copt.loss.LogLoss(A_, b)
+            f.intercept = True
+            loss, grad = f.f_grad(np.concatenate((x, [0.0])))
+            np.testing.assert_allclose(loss, loss_ref)
+            np.testing.assert_allclose(grad[:-1], A.T.dot(special.expit(z) - b) / n_samples)
+            np.testing.assert_allclose(grad[-1], np.mean(special.expit(z) - b))
+
+
+def test_line_f_grad():
+    """line_f_grad agrees with f_grad and reuses the products with A."""
+    x = np.random.randn(n_features)
+    d = np.random.randn(n_features)
+    for A in (A_dense, A_sparse):
+        for loss in [copt.loss.LogLoss, copt.loss.SquareLoss, copt.loss.HuberLoss]:
+            f = loss(A, b, 0.1)
+            phi = f.line_f_grad(x, d)
+            for t in (0.0, 0.5, 2.0):
+                f_t, grad_t = loss(A, b, 0.1).f_grad(x + t * d)
+                np.testing.assert_allclose(phi(t), f_t)
+                loss_t, grad = phi(t, return_gradient=True)
+                np.testing.assert_allclose(grad, grad_t)
+
+            # .. the last accepted point is cached, no new product ..
+            n_calls = []
+            f._matvec = lambda z: n_calls.append(1)
+            f(x + 2.0 * d)
+            assert len(n_calls) == 0
+
+    f = copt.loss.LogLoss(A_sparse, b)
+    f.intercept = True
+    x_c, d_c = np.append(x, 0.3), np.append(d, -1.0)
+    np.testing.assert_allclose(
+        f.line_f_grad(x_c, d_c)(0.7, return_gradient=True)[1],
+        f.f_grad(x_c + 0.7 * d_c)[1],
+    )
+
+
+def test_square_gram():
+    """The Gram mode of SquareLoss agrees with the products with A."""
+    x = np.random.randn(n_features)
+    d = np.random.randn(n_features)
+    for A in (A_dense, A_sparse):
+        f_gram = copt.loss.SquareLoss(A, b, 0.1, gram=True)
+        f = copt.loss.SquareLoss(A, b, 0.1, gram=False)
+        for f_x, f_gram_x in zip(f.f_grad(x), f_gram.f_grad(x)):
+            np.testing.assert_allclose(f_x, f_gram_x)
+        phi, phi_gram = f.line_f_grad(x, d), f_gram.line_f_grad(x, d)
+        np.testing.assert_allclose(phi(0.3), phi_gram(0.3))
+        # .. power iteration bounds the exact value of the Gram mode from above ..
+        assert f.lipschitz >= f_gram.lipschitz
+        np.testing.assert_allclose(f.lipschitz, f_gram.lipschitz, rtol=1e-3)
+    assert not copt.loss.SquareLoss(A_dense, b)._use_gram()
+    assert copt.loss.SquareLoss(A_dense, b, gram="auto")._use_gram()
+    assert not copt.loss.SquareLoss(A_dense.T, b[:n_features], gram="auto")._use_gram()
+
+
+def test_lipschitz_cache():
+    """Lipschitz constants are cached and recomputed when A changes."""
+    from scipy.sparse import linalg as splinalg
+
+    for A in (A_dense, A_sparse):
+        s2 = splinalg.svds(A, k=1, return_singular_vectors=False)[0] ** 2
+        for loss, factor in [(copt.loss.LogLoss, 0.25), (copt.loss.HuberLoss, 1)]:
+            f = loss(A, b, 0.1)
+            np.testing.assert_allclose(f.lipschitz, factor * s2 / n_samples + 0.1, rtol=1e-3)
+            # .. alpha is not part of the cache ..
+            f.alpha = 1.0
+            np.testing.assert_allclose(f.lipschitz, factor * s2 / n_samples + 1.0, rtol=1e-3)
+
+            # .. the cached singular vector warm-starts the new estimate ..
+            f.A = 2 * A
+            np.testing.assert_allclose(f.lipschitz, 4 * factor * s2 / n_samples + 1.0, rtol=1e-3)
+
+    f = copt.loss.LogLoss(A_sparse, b)
+    max_lipschitz = f.max_lipschitz
+    f.A = 2 * A_sparse
+    np.testing.assert_allclose(f.max_lipschitz, 4 * max_lipschitz)
+
+
+def test_log_hess_intercept():
+    """Hessian-vector products and trace against finite differences."""
+    for A in (A_dense, A_sparse):
+        f = copt.loss.LogLoss(A, b, 0.1)
+        f.intercept = True
+        x = np.random.randn(n_features + 1)
+        Hs = f.hessian_mv(x)
+        H = np.empty((n_features + 1, n_features + 1))
+        for i in range(n_features + 1):
+            e = np.eye(n_features + 1)[i]
+            H[:, i] = (f.f_grad(x + 1e-6 * e)[1] - f.f_grad(x - 1e-6 * e)[1]) / 2e-6
+            np.testing.assert_allclose(Hs(e), H[:, i], rtol=1e-5, atol=1e-8)
+        np.testing.assert_allclose(f.hessian_trace(x), np.trace(H), rtol=1e-6)
+
+
+def test_log_hess_subsample():
+    """The sub-sampled Hessian is the Hessian of the loss on the rows."""
+    idx = np.array([0, 3, 3, 10, 42])
+    x = np.random.randn(n_features)
+    s = np.random.randn(n_features)
+    for A in (A_dense, A_sparse):
+        f = copt.loss.LogLoss(A, b, 0.1)
+        f_sub = copt.loss.LogLoss(A[idx], b[idx], 0.1)
+        np.testing.assert_allclose(
+            f.hessian_mv(x, idx)(s), f_sub.hessian_mv(x)(s), rtol=1e-10
+        )
+
+
+def test_multinomial():
+    """Multinomial loss against a reference implementation."""
+    n_classes = 4
+    labels = np.random.randint(n_classes, size=n_samples)
+    for A in (A_dense, A_sparse):
+        f = copt.loss.MultinomialLogLoss(A, labels, 0.1)
+        X = np.random.randn(n_features, n_classes)
+        Z = A.dot(X)
+        loss_ref = np.mean(
+            special.logsumexp(Z, axis=1) - Z[np.arange(n_samples), labels]
+        ) + 0.05 * np.sum(X * X)
+        np.testing.assert_allclose(f(X.ravel()), loss_ref)
+        # .. large margins ..
+        assert np.isfinite(f(1e3 * X.ravel()))
+
+        for intercept in (False, True):
+            f.intercept = intercept
+            x = np.random.randn((n_features + intercept) * n_classes)
+            err = optimize.check_grad(f, lambda x: f.f_grad(x)[1], x)
+            assert err < 1e-5
+
+            d = np.random.randn(x.size)
+            np.testing.assert_allclose(f.line_f_grad(x, d)(0.5), f(x + 0.5 * d))
+
+
+def test_huber_sparse_dense():
+    """The fused CSR and dense code paths of the Huber loss agree."""
+    A = A_sparse.toarray()
+    x = np.random.randn(n_features)
+    for delta in (0.1, 1.0, 10.0):
+        r = A.dot(x) - b
+        huber = np.where(
+            np.abs(r) <= delta, 0.5 * r * r, delta * (np.abs(r) - 0.5 * delta)
+        )
+        for A_ in (A, A_sparse):
+            f = copt.loss.HuberLoss(A_, b, delta=delta)
+            loss, grad = f.f_grad(x)
+            np.testing.assert_allclose(loss, huber.mean())
+            np.testing.assert_allclose(
+                grad, A.T.dot(np.clip(r, -delta, delta)) / n_samples
+            )
+            np.testing.assert_allclose(f.partial_loss(A.dot(x), b), huber)
+            np.testing.assert_allclose(
+                f.partial_deriv(A.dot(x), b), np.clip(r, -delta, delta)
+            )
+
+
+class _Operator:
+    """Minimal matrix-free operator, only shape, matvec and rmatvec."""
+
+    def __init__(self, A):
+        self.A = A
+        self.shape = A.shape
+
+    def matvec(self, x):
+        return self.A.dot(x)
+
+    def rmatvec(self, r):
+        return self.A.T.dot(r)
+
+
+def test_linear_operator():
+    """Losses give the same results with A as a linear operator."""
+    x = np.random.randn(n_features)
+    d = np.random.randn(n_features)
+    for op in (splinalg.aslinearoperator(A_dense), _Operator(A_dense)):
+        assert cp.utils.is_linear_operator(op)
+        for loss in [copt.loss.LogLoss, copt.loss.SquareLoss, copt.loss.HuberLoss]:
+            f, f_op = loss(A_dense, b, 0.1), loss(op, b, 0.1)
+            for a, a_op in zip(f.f_grad(x), f_op.f_grad(x)):
+                np.testing.assert_allclose(a, a_op)
+            np.testing.assert_allclose(
+                f.line_f_grad(x, d)(0.5), f_op.line_f_grad(x, d)(0.5)
+            )
+            np.testing.assert_allclose(f.lipschitz, f_op.lipschitz, rtol=1e-3)
+            if hasattr(f, "max_lipschitz"):
+                assert f_op.max_lipschitz >= f.max_lipschitz
+        f, f_op = copt.loss.LogLoss(A_dense, b), copt.loss.LogLoss(op, b)
+        idx = np.array([0, 3, 3, 10, 42])
+        np.testing.assert_allclose(f.hessian_mv(x)(d), f_op.hessian_mv(x)(d))
+        np.testing.assert_allclose(
+            f.hessian_mv(x, idx)(d), f_op.hessian_mv(x, idx)(d)
+        )
+
+
+def test_f_grad_batch():
+    """The loss on a batch is the loss of the selected rows."""
+    idx = np.array([0, 3, 3, 10, 42, 99])
+    labels = np.random.randint(3, size=n_samples)
+    for A in (A_dense, A_sparse, splinalg.aslinearoperator(A_dense)):
+        A_idx = A_dense[idx] if cp.utils.is_linear_operator(A) else A[idx]
+        losses = [
+            (copt.loss.LogLoss(A, b, 0.1), copt.loss.LogLoss(A_idx, b[idx], 0.1)),
+            (
+                copt.loss.SquareLoss(A, b, 0.1),
+                copt.loss.SquareLoss(A_idx, b[idx], 0.1),
+            ),
+            (copt.loss.HuberLoss(A, b, 0.1), copt.loss.HuberLoss(A_idx, b[idx], 0.1)),
+        ]
+        if not cp.utils.is_linear_operator(A):
+            losses.append(
+                (
+                    copt.loss.MultinomialLogLoss(A, labels, 0.1),
+                    copt.loss.MultinomialLogLoss(A_idx, labels[idx], 0.1, n_classes=3),
+                )
+            )
+        for f, f_idx in losses:
+            # .. SquareLoss has no intercept ..
+            square = isinstance(f, copt.loss.SquareLoss)
+            for intercept in [False] if square else [False, True]:
+                f.intercept = f_idx.intercept = intercept
+                n_classes = getattr(f, "n_classes", 1)
+                x = np.random.randn((n_features + intercept) * n_classes)
+                for a, a_idx in zip(f.f_grad_batch(x, idx), f_idx.f_grad(x)):
+                    np.testing.assert_allclose(a, a_idx)
+                np.testing.assert_allclose(f.loss_batch(x, idx), f_idx(x))
+            # .. boolean masks select the same samples ..
+            mask = np.zeros(n_samples, dtype=bool)
+            mask[idx] = True
+            np.testing.assert_allclose(
+                f.loss_batch(x, mask), f.loss_batch(x, np.unique(idx))
+            )
+
+
+def test_sample_weight():
+    """Integer weights are equivalent to repeated samples."""
+    counts = np.random.randint(1, 4, size=n_samples)
+    copies = np.repeat(np.arange(n_samples), counts)
+    labels = np.random.randint(3, size=n_samples)
+    x = np.random.randn(n_features)
+    d = np.random.randn(n_features)
+    for A in (A_dense, A_sparse):
+        for loss in [copt.loss.LogLoss, copt.loss.SquareLoss, copt.loss.HuberLoss]:
+            f = loss(A, b, 0.1, sample_weight=counts)
+            f_dup = loss(A[copies], b[copies], 0.1)
+            for a, a_dup in zip(f.f_grad(x), f_dup.f_grad(x)):
+                np.testing.assert_allclose(a, a_dup)
+            np.testing.assert_allclose(
+                f.line_f_grad(x, d)(0.5), f_dup.line_f_grad(x, d)(0.5)
+            )
+            np.testing.assert_allclose(f.lipschitz, f_dup.lipschitz, rtol=1e-3)
+            np.testing.assert_allclose(
+                f.f_grad_batch(x, np.arange(n_samples))[1], f.f_grad(x)[1]
+            )
+        f = copt.loss.LogLoss(A, b, sample_weight=counts)
+        f_dup = copt.loss.LogLoss(A[copies], b[copies])
+        np.testing.assert_allclose(f.hessian_mv(x)(d), f_dup.hessian_mv(x)(d))
+        np.testing.assert_allclose(f.hessian_trace(x), f_dup.hessian_trace(x))
+
+        X = np.random.randn(n_features * 3)
+        f = copt.loss.MultinomialLogLoss(A, labels, sample_weight=counts)
+        f_dup = copt.loss.MultinomialLogLoss(A[copies], labels[copies])
+        for a, a_dup in zip(f.f_grad(X), f_dup.f_grad(X)):
+            np.testing.assert_allclose(a, a_dup)
+
+    with pytest.raises(ValueError):
+        copt.loss.LogLoss(A_dense, b, sample_weight=-np.ones(n_samples))
+
+
+def test_scale_offset():
+    """Columns standardized on the fly, against the standardized matrix."""
+    scale = np.random.uniform(0.5, 2, size=n_features)
+    offset = np.random.randn(n_features)
+    sample_weight = np.random.uniform(0.5, 2, size=n_samples)
+    labels = np.random.randint(3, size=n_samples)
+    idx = np.array([3, 0, 3, 50])
+    losses = [
+        (copt.loss.LogLoss, b, 1),
+        (copt.loss.SquareLoss, b, 1),
+        (copt.loss.HuberLoss, b, 1),
+        (copt.loss.MultinomialLogLoss, labels, 3),
+    ]
+    for A in (A_dense, A_sparse):
+        A_std = ((A.toarray() if sparse.issparse(A) else A) - offset) * scale
+        for loss, y, n_classes in losses:
+            kwargs = dict(sample_weight=sample_weight)
+            f = loss(A, y, 0.1, scale=scale, offset=offset, **kwargs)
+            f_std = loss(A_std, y, 0.1, **kwargs)
+            for intercept in (False, True):
+                if intercept and loss is copt.loss.SquareLoss:
+                    continue
+                f.intercept = f_std.intercept = intercept
+                x = np.random.randn((n_features + intercept) * n_classes)
+                for a, a_std in zip(f.f_grad(x), f_std.f_grad(x)):
+                    np.testing.assert_allclose(a, a_std)
+                batch = f.f_grad_batch(x, idx)
+                for a, a_std in zip(batch, f_std.f_grad_batch(x, idx)):
+                    np.testing.assert_allclose(a, a_std)
+            np.testing.assert_allclose(f.lipschitz, f_std.lipschitz, rtol=1e-3)
+            if hasattr(f, "max_lipschitz"):
+                np.testing.assert_allclose(f.max_lipschitz, f_std.max_lipschitz)
+
+        x = np.random.randn(n_features)
+        d = np.random.randn(n_features)
+        f = copt.loss.LogLoss(A, b, scale=scale, offset=offset)
+        f_std = copt.loss.LogLoss(A_std, b)
+        np.testing.assert_allclose(f.hessian_mv(x)(d), f_std.hessian_mv(x)(d))
+        np.testing.assert_allclose(f.hessian_trace(x), f_std.hessian_trace(x))
+        # .. the Gram matrix is formed from A, scale and offset ..
+        f = copt.loss.SquareLoss(A, b, gram=True, scale=scale, offset=offset)
+        f_std = copt.loss.SquareLoss(A_std, b, gram=False)
+        for a, a_std in zip(f.f_grad(x), f_std.f_grad(x)):
+            np.testing.assert_allclose(a, a_std)
+
+    with pytest.raises(ValueError):
+        copt.loss.LogLoss(A_dense, b, scale=np.ones(n_features + 1))
+
+
+def test_float32():
+    """Float32 data and coefficients give float32 margins and gradients."""
+    labels = np.random.randint(3, size=n_samples)
+    losses = [
+        (copt.loss.LogLoss, b, 1),
+        (copt.loss.SquareLoss, b, 1),
+        (copt.loss.HuberLoss, b, 1),
+        (copt.loss.MultinomialLogLoss, labels, 3),
+    ]
+    for A in (A_dense, A_sparse):
+        for loss, y, n_classes in losses:
+            f = loss(A, y, 0.1)
+            f32 = loss(A.astype(np.float32), y, 0.1)
+            x = np.random.randn(n_features * n_classes)
+            x32 = x.astype(np.float32)
+            loss_32, grad_32 = f32.f_grad(x32)
+            assert grad_32.dtype == np.float32
+            assert f32.f_grad_batch(x32, [0, 3, 3])[1].dtype == np.float32
+            loss_64, grad_64 = f.f_grad(x)
+            np.testing.assert_allclose(loss_32, loss_64, rtol=1e-5)
+            np.testing.assert_allclose(grad_32, grad_64, rtol=1e-4, atol=1e-6)
+            # .. float64 coefficients promote the computations ..
+            assert f32.f_grad(x)[1].dtype == np.float64
+
+    f = copt.loss.LogLoss(A_sparse.astype(np.float32), b)
+    f.intercept = True
+    x = np.random.randn(n_features + 1).astype(np.float32)
+    assert f.f_grad(x)[1].dtype == np.float32
+    assert f.hessian_mv(x)(x).dtype == np.float32
+
+
+def test_collapse_duplicates():
+    copies = np.random.randint(n_samples, size=3 * n_samples)
+    A_dup, b_dup = A_sparse[copies], b[copies]
+    for A in (A_dup, A_dup.toarray()):
+        A_unique, b_unique, counts, inverse = cp.utils.collapse_duplicates(A, b_dup)
+        assert A_unique.shape[0] == np.unique(copies).size
+        assert counts.sum() == copies.size
+        np.testing.assert_array_equal(
+            sparse.csr_matrix(A_unique[inverse]).toarray(), A_dup.toarray()
+        )
+        # .. unique rows are in the order of their first occurrence ..
+        assert np.all(np.diff(np.unique(inverse, return_index=True)[1]) > 0)
+        # .. the labels are the same since all the copies have the same ..
+        np.testing.assert_allclose(b_unique[inverse], b_dup)
+
+    # .. copies with different labels are averaged, or kept apart ..
+    b_noisy = np.random.uniform(0, 1, size=copies.size)
+    A_unique, b_unique, counts, inverse = cp.utils.collapse_duplicates(A_dup, b_noisy)
+    x = np.random.randn(n_features)
+    f = copt.loss.LogLoss(A_unique, b_unique, sample_weight=counts)
+    f_dup = copt.loss.LogLoss(A_dup, b_noisy)
+    for a, a_dup in zip(f.f_grad(x), f_dup.f_grad(x)):
+        np.testing.assert_allclose(a, a_dup)
+    A_unique, b_unique, counts, inverse = cp.utils.collapse_duplicates(
+        A_dup, b_noisy, by_label=True
+    )
+    assert A_unique.shape[0] == copies.size
@@ -21,3 +21,24 @@ def test_fast_csr_mv():
     res = cp.utils.fast_csr_mv(A_sparse.data, A_sparse.indptr, A_sparse.indices,
                                x, idx)
     assert np.allclose(res, cp.utils.safe_sparse_dot(A_sparse[idx], x))
+
+
+def test_parallel_matvec():
+    r = np.random.rand(n_samples)
+    A_dense = A_sparse.toarray()
+    for A in (A_sparse, A_dense, A_sparse.tocsc()):
+        for n_jobs in (1, 3, -1):
+            assert np.allclose(cp.utils.matvec(A, x, n_jobs), A_dense.dot(x))
+            assert np.allclose(cp.utils.rmatvec(A, r, n_jobs), A_dense.T.dot(r))
+    A_T = A_sparse.T.tocsr()
+    assert np.allclose(cp.utils.rmatvec(A_sparse, r, 3, A_T), A_dense.T.dot(r))
+
+
+def test_loss_n_jobs():
+    b = np.random.rand(n_samples)
+    for loss in [cp.loss.LogLoss, cp.loss.SquareLoss, cp.loss.HuberLoss]:
+        for A in (A_sparse, A_sparse.toarray()):
+            f1, grad1 = loss(A, b, 0.1).f_grad(x)
+            f4, grad4 = loss(A, b, 0.1, n_jobs=4).f_grad(x)
+            assert np.allclose(f1, f4)
+            assert np.allclose(grad1, grad4)
@@ -0,0 +1,110 @@
+"""Tests for Newton-type methods."""
+import copt as cp
+import numpy as np
+import pytest
+from scipy import sparse
+
+import copt.constraint
+import copt.loss
+import copt.penalty
+
+np.random.seed(0)
+n_samples, n_features = 100, 10
+A_dense = np.random.randn(n_samples, n_features)
+A_sparse = sparse.random(n_samples, n_features, density=0.5, format="csr")
+w = np.random.randn(n_features)
+b = (A_dense.dot(w) + np.random.randn(n_samples) > 0).astype(float)
+
+
+@pytest.mark.parametrize("A", [A_dense, A_sparse])
+@pytest.mark.parametrize("intercept", [False, True])
+def test_newton_cg(A, intercept):
+    f = cp.loss.LogLoss(A, b, 1e-2)
+    f.intercept = intercept
+    x0 = np.zeros(n_features + intercept)
+    opt = cp.minimize_newton_cg(f.f_grad, x0, f.hessian_mv, tol=1e-10)
+    assert opt.success
+    assert opt.nit < 20
+    assert np.linalg.norm(f.f_grad(opt.x)[1]) < 1e-10
+
+
+@pytest.mark.parametrize("A", [A_dense, A_sparse])
+@pytest.mark.parametrize(
+    "penalty",
+    [
+        cp.penalty.L1Norm(1e-2),
+        cp.penalty.GroupL1(1e-2, np.array_split(np.arange(n_features), 5)),
+    ],
+)
+@pytest.mark.parametrize("use_lipschitz", [False, True])
+def test_proximal_newton(A, penalty, use_lipschitz):
+    f = cp.loss.LogLoss(A, b, 1e-3)
+    lipschitz = f.lipschitz if use_lipschitz else None
+    opt = cp.minimize_newton_cg(
+        f.f_grad,
+        np.zeros(n_features),
+        f.hessian_mv,
+        prox=penalty.prox,
+        tol=1e-10,
+        lipschitz=lipschitz,
+    )
+    assert opt.success
+    assert opt.nit < 30
+
+    ref = cp.minimize_proximal_gradient(
+        f.f_grad, np.zeros(n_features), penalty.prox, jac=True, tol=1e-12,
+        max_iter=10000
+    )
+    np.testing.assert_allclose(
+        f(opt.x) + penalty(opt.x), f(ref.x) + penalty(ref.x), rtol=1e-10
+    )
+    np.testing.assert_allclose(opt.x, ref.x, atol=1e-6)
+
+
+@pytest.mark.parametrize("loss", [cp.loss.LogLoss, cp.loss.SquareLoss])
+@pytest.mark.parametrize(
+    "penalty",
+    [
+        None,
+        cp.penalty.L1Norm(1e-2),
+        cp.penalty.GroupL1(1e-2, np.array_split(np.arange(n_features), 5)),
+        cp.constraint.LinfBall(0.1),
+    ],
+)
+def test_proximal_lbfgs(loss, penalty):
+    f = loss(A_dense, b, 1e-3)
+    prox = None if penalty is None else penalty.prox
+    opt = cp.minimize_proximal_lbfgs(
+        f.f_grad, np.zeros(n_features), prox, jac=True, tol=1e-10
+    )
+    assert opt.success
+
+    ref = cp.minimize_proximal_gradient(
+        f.f_grad, np.zeros(n_features), prox, jac=True, tol=1e-12,
+        max_iter=10000
+    )
+    assert opt.nit <= ref.nit
+    np.testing.assert_allclose(opt.x, ref.x, atol=1e-6)
+
+
+@pytest.mark.parametrize("A", [A_dense, A_sparse])
+@pytest.mark.parametrize("penalty", [None, cp.penalty.L1Norm(1e-2)])
+def test_subsampled_newton(A, penalty):
+    f = cp.loss.LogLoss(A, b, 1e-2)
+    prox = None if penalty is None else penalty.prox
+    opt = cp.minimize_subsampled_newton(
+        f.f_grad,
+        np.zeros(n_features),
+        f.hessian_mv,
+        n_samples,
+        prox=prox,
+        sample_size=20,
+        tol=1e-10,
+    )
+    assert opt.success
+    assert 20 <= opt.sample_size <= n_samples
+
+    ref = cp.minimize_newton_cg(
+        f.f_grad, np.zeros(n_features), f.hessian_mv, prox=prox, tol=1e-10
+    )
+    np.testing.assert_allclose(opt.x, ref.x, atol=1e-8)
@@ -0,0 +1,119 @@
+"""Tests for the structured linear operators."""
+import numpy as np
+import pytest
+from numpy import testing
+from scipy import ndimage, signal, sparse
+
+import copt as cp
+import copt.loss
+import copt.penalty
+from copt import operators
+
+np.random.seed(0)
+kernel_2d = np.random.rand(3, 5)
+
+all_operators = [
+    operators.FiniteDifferences(7),
+    operators.FiniteDifferences((6, 5)),
+    operators.FiniteDifferences((4, 3, 5)),
+    operators.Convolution(np.random.rand(4), 9),
+    operators.Convolution(kernel_2d, (6, 7)),
+    operators.Convolution(kernel_2d, (6, 7), mode="zero"),
+    operators.Convolution(np.random.rand(2, 3, 2), (4, 5, 3), mode="zero"),
+    operators.Kronecker(np.random.randn(3, 4), sparse.random(5, 2, density=0.5)),
+    operators.Kronecker(
+        operators.FiniteDifferences(4), operators.Convolution(kernel_2d[0], 6)
+    ),
+    operators.RowSubsampling(10, [3, 1, 1, 7]),
+    operators.RowSubsampling(
+        operators.Convolution(kernel_2d, (6, 7), mode="zero"), [0, 5, 41, 12]
+    ),
+]
+
+
+def _dense(L):
+    return L.matmat(np.eye(L.shape[1]))
+
+
+@pytest.mark.parametrize("L", all_operators)
+def test_adjoint(L):
+    x = np.random.randn(L.shape[1])
+    r = np.random.randn(L.shape[0])
+    assert L.matvec(x).shape == (L.shape[0],)
+    assert L.rmatvec(r).shape == (L.shape[1],)
+    testing.assert_allclose(L.matvec(x).dot(r), x.dot(L.rmatvec(r)))
+
+
+@pytest.mark.parametrize("L", all_operators)
+def test_norm(L):
+    norm = np.linalg.norm(_dense(L), 2)
+    assert L.norm() >= norm * (1 - 1e-3)
+    is_exact = not isinstance(L, operators.RowSubsampling) and not (
+        isinstance(L, operators.Convolution) and L.mode == "zero"
+    )
+    if is_exact:
+        testing.assert_allclose(L.norm(), norm, rtol=1e-3)
+
+
+def test_finite_differences():
+    x = np.random.randn(4, 3, 5)
+    L = operators.FiniteDifferences(x.shape)
+    expected = np.concatenate([np.diff(x, axis=k).ravel() for k in range(3)])
+    testing.assert_allclose(L.matvec(x.ravel()), expected)
+
+    n_rows, n_cols = 20, 10
+    img = np.random.randn(n_rows, n_cols)
+    L = cp.tv_prox.tv2d_linear_operator(n_rows, n_cols)
+    tv = np.abs(np.diff(img, axis=0)).sum() + np.abs(np.diff(img, axis=1)).sum()
+    testing.assert_allclose(np.abs(L.dot(img.ravel())).sum(), tv)
+
+
+def test_convolution():
+    img = np.random.randn(8, 9)
+    L = operators.Convolution(kernel_2d, img.shape)
+    expected = ndimage.convolve(img, kernel_2d, mode="wrap")
+    testing.assert_allclose(L.matvec(img.ravel()), expected.ravel())
+
+    L = operators.Convolution(kernel_2d, img.shape, mode="zero")
+    expected = signal.convolve(img, kernel_2d, mode="same")
+    testing.assert_allclose(L.matvec(img.ravel()), expected.ravel())
+
+    with pytest.raises(ValueError):
+        operators.Convolution(kernel_2d, img.shape, mode="reflect")
+
+
+def test_loss_operator():
+    # .. the losses use the norm of the operator in their step sizes ..
+    shape = (8, 9)
+    L = operators.Convolution(kernel_2d, shape, mode="zero")
+    L_dense = _dense(L)
+    b = np.random.randn(L.shape[0])
+    x = np.random.randn(L.shape[1])
+    f = copt.loss.SquareLoss(L, b)
+    f_dense = copt.loss.SquareLoss(L_dense, b)
+    for a, b_ in zip(f.f_grad(x), f_dense.f_grad(x)):
+        testing.assert_allclose(a, b_)
+    testing.assert_allclose(f.lipschitz, L.norm() ** 2 / L.shape[0])
+    assert f.lipschitz >= f_dense.lipschitz * (1 - 1e-3)
+
+
+def test_primal_dual_tv():
+    # .. 2D total variation denoising with the matrix-free difference ..
+    # .. operator, against the same problem with its dense counterpart ..
+    img = np.random.randn(10, 10)
+    n_features = img.size
+    f = copt.loss.SquareLoss(np.eye(n_features), img.ravel())
+    h = copt.penalty.L1Norm(0.1)
+    L = operators.FiniteDifferences(img.shape)
+    opt1 = cp.minimize_primal_dual(
+        f.f_grad, np.zeros(n_features), prox_2=h.prox, L=L, tol=1e-12, max_iter=5000
+    )
+    opt2 = cp.minimize_primal_dual(
+        f.f_grad,
+        np.zeros(n_features),
+        prox_2=h.prox,
+        L=_dense(L),
+        tol=1e-12,
+        max_iter=5000,
+    )
+    testing.assert_allclose(opt1.x, opt2.x, rtol=1e-6, atol=1e-8)
@@ -0,0 +1,105 @@
+"""Tests for the regularization paths."""
+import numpy as np
+import pytest
+from numpy import testing
+from scipy import sparse
+
+import copt as cp
+import copt.loss
+import copt.path
+import copt.penalty
+
+def _with_intercept(f):
+    f.intercept = True
+    return f
+
+
+np.random.seed(0)
+n_samples, n_features = 50, 20
+A = sparse.random(n_samples, n_features, density=0.5, format="csr")
+b = (np.random.rand(n_samples) > 0.5).astype(float)
+groups = [np.arange(i, i + 4) for i in range(0, n_features, 4)]
+
+
+@pytest.mark.parametrize(
+    "f",
+    [
+        copt.loss.SquareLoss(A, b),
+        copt.loss.LogLoss(A, b),
+        _with_intercept(copt.loss.LogLoss(A, b)),
+    ],
+)
+@pytest.mark.parametrize(
+    "penalty, penalty_args",
+    [
+        (copt.penalty.L1Norm, ()),
+        (copt.penalty.GroupL1, (groups,)),
+        # .. the features of the first group are not penalized ..
+        (copt.penalty.GroupL1, (groups[1:],)),
+    ],
+)
+def test_alpha_max(f, penalty, penalty_args):
+    alpha_max = copt.path.alpha_max(f, penalty, penalty_args)
+    penalized = np.ones(n_features, dtype=bool)
+    if penalty is copt.penalty.GroupL1:
+        penalized[:] = False
+        for grp in penalty_args[0]:
+            penalized[grp] = True
+    for ratio, is_zero in [(1.01, True), (0.9, False)]:
+        path = copt.path.regularization_path(
+            f, penalty, [ratio * alpha_max], penalty_args, tol=1e-10, max_iter=5000
+        )
+        x = path.coefs[0, :n_features]
+        assert np.all(x[penalized] == 0) == is_zero
+
+
+@pytest.mark.parametrize("solver", [cp.minimize_proximal_gradient, cp.minimize_saga])
+def test_path(solver):
+    f = copt.loss.LogLoss(A, b)
+    path = copt.path.regularization_path(
+        f, copt.penalty.L1Norm, n_alphas=5, eps=1e-2, solver=solver, tol=1e-10,
+        max_iter=5000
+    )
+    assert path.coefs.shape == (5, n_features)
+    assert np.all(np.diff(path.alphas) < 0)
+    testing.assert_allclose(path.coefs[0], 0, atol=1e-6)
+    nnz = np.count_nonzero(path.coefs, axis=1)
+    assert nnz[-1] > nnz[0]
+    for alpha, x in zip(path.alphas, path.coefs):
+        h = copt.penalty.L1Norm(alpha)
+        opt = cp.minimize_proximal_gradient(
+            f.f_grad, np.zeros(n_features), prox=h.prox, jac=True, tol=1e-10,
+            max_iter=5000
+        )
+        testing.assert_allclose(x, opt.x, atol=1e-5)
+
+    # .. the segments solved in parallel give the same solutions ..
+    path_parallel = copt.path.regularization_path(
+        f, copt.penalty.L1Norm, path.alphas, solver=solver, tol=1e-10,
+        max_iter=5000, n_jobs=2
+    )
+    testing.assert_allclose(path_parallel.coefs, path.coefs, atol=1e-5)
+
+
+def test_saga_prox_scale():
+    f = copt.loss.LogLoss(A, b)
+    step_size = 1.0 / (3 * f.max_lipschitz)
+    prox = copt.penalty.L1Norm(1.0).prox_factory(n_features)
+    opt1 = cp.minimize_saga(
+        f.partial_deriv, A, b, np.zeros(n_features), step_size,
+        prox=prox, prox_scale=0.01, tol=1e-10, max_iter=2000
+    )
+    opt2 = cp.minimize_saga(
+        f.partial_deriv, A, b, np.zeros(n_features), step_size,
+        prox=copt.penalty.L1Norm(0.01).prox_factory(n_features), tol=1e-10,
+        max_iter=2000
+    )
+    testing.assert_allclose(opt1.x, opt2.x, atol=1e-8)
+
+
+def test_path_errors():
+    f = copt.loss.SquareLoss(A, b)
+    with pytest.raises(ValueError):
+        copt.path.regularization_path(f, copt.penalty.L1Norm, [0.1, 0.2])
+    with pytest.raises(ValueError):
+        copt.path.alpha_max(f, copt.penalty.FusedLasso)
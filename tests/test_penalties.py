@@ -106,6 +106,20 @@ def test_tv2_prox():
         )
 
 
+def test_tv_prox_float32():
+    """The TV proxes keep float32 inputs in float32."""
+    n_rows, n_cols = 10, 15
+    x = np.random.randn(n_rows * n_cols)
+    for prox, args in [
+        (tv_prox.prox_tv1d, ()),
+        (tv_prox.prox_tv2d, (n_rows, n_cols)),
+    ]:
+        out = prox(x, 0.5, *args)
+        out_32 = prox(x.astype(np.float32), 0.5, *args)
+        assert out_32.dtype == np.float32
+        np.testing.assert_allclose(out_32, out, atol=1e-5)
+
+
 def test_tv2d_linear_operator():
     n_rows, n_cols = 20, 10
 
@@ -109,6 +109,23 @@ def test_callback(solver):
     assert opt.nit < 2
 
 
+@pytest.mark.parametrize(
+    "solver",
+    [cp.minimize_proximal_gradient, minimize_accelerated, cp.minimize_three_split],
+)
+def test_float32(solver):
+    """Float32 problems are solved with float32 iterates."""
+    f = copt.loss.SquareLoss(A, b)
+    f_32 = copt.loss.SquareLoss(A.astype(np.float32), b)
+    pen = copt.penalty.L1Norm(0.1)
+    opt = solver(f.f_grad, np.zeros(n_features), pen.prox, tol=1e-6)
+    opt_32 = solver(
+        f_32.f_grad, np.zeros(n_features, dtype=np.float32), pen.prox, tol=1e-5
+    )
+    assert opt_32.x.dtype == np.float32
+    np.testing.assert_allclose(opt_32.x, opt.x, atol=1e-4)
+
+
 @pytest.mark.parametrize(
     "solver", [cp.minimize_proximal_gradient, minimize_accelerated]
 )
@@ -142,3 +159,34 @@ def test_line_search(solver):
         f_grad, np.zeros(n_features), step=exact_ls, args=(None, None), jac=True
     )
     assert opt.success
+
+
+def test_step_size():
+    """Test a fixed step size and a line search with a given initial step."""
+    f = copt.loss.SquareLoss(A, b)
+    step_size = 1.0 / f.lipschitz
+    opt = cp.minimize_proximal_gradient(
+        f.f_grad, np.zeros(n_features), jac=True, step=step_size, tol=1e-8
+    )
+    assert opt.success
+    assert opt.step_size == step_size
+
+    opt_ls = cp.minimize_proximal_gradient(
+        f.f_grad, np.zeros(n_features), jac=True, step=(step_size, "backtracking"),
+        tol=1e-8
+    )
+    assert opt_ls.success
+    np.testing.assert_allclose(opt_ls.x, opt.x, rtol=1e-5)
+
+    opt_acc = cp.minimize_proximal_gradient(
+        f.f_grad, np.zeros(n_features), jac=True, step=step_size, tol=1e-8,
+        accelerated=True
+    )
+    assert opt_acc.success
+    np.testing.assert_allclose(opt_acc.x, opt.x, atol=1e-6)
+
+    # .. any real number is a fixed step size ..
+    assert cp.utils.parse_step_size(1) == (1.0, "fixed")
+    assert cp.utils.parse_step_size(np.float32(0.5)) == (0.5, "fixed")
+    with pytest.raises(ValueError):
+        cp.utils.parse_step_size(True)
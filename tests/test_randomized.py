@@ -1,3 +1,5 @@
+import threading
+
 import numpy as np
 from scipy import sparse
 import copt as cp
@@ -44,6 +46,80 @@ def test_optimize(name_solver, solver, tol):
         assert np.linalg.norm(grad) < tol, name_solver
 
 
+@pytest.mark.parametrize("name_solver, solver, tol", all_solvers_unconstrained)
+def test_huber(name_solver, solver, tol):
+    alpha = 0.1
+    f = copt.loss.HuberLoss(A, b, alpha, delta=0.1)
+    opt = solver(
+        f.partial_deriv,
+        A,
+        b,
+        np.zeros(n_features),
+        1 / (3 * f.max_lipschitz),
+        alpha=alpha,
+        max_iter=200,
+        tol=1e-10,
+    )
+    assert np.linalg.norm(f.f_grad(opt.x)[1]) < tol, name_solver
+
+
+@pytest.mark.parametrize("name_solver, solver, tol", all_solvers_unconstrained)
+def test_fit_intercept(name_solver, solver, tol):
+    alpha = 0.1
+    f = copt.loss.LogLoss(A, b, alpha)
+    f.intercept = True
+    L = cp.utils.get_max_lipschitz(A, "logloss") + alpha / density
+    opt = solver(
+        f.partial_deriv,
+        A,
+        b,
+        np.zeros(n_features),
+        1 / (3 * L),
+        alpha=alpha,
+        max_iter=200,
+        tol=1e-10,
+        fit_intercept=True,
+    )
+    grad = f.f_grad(np.concatenate((opt.x, [opt.intercept])))[1]
+    assert np.linalg.norm(grad) < tol, name_solver
+    assert opt.intercept != 0, name_solver
+
+
+@pytest.mark.parametrize("order", ["block", "block_shuffle"])
+def test_epoch_order(order):
+    n, block_size = 103, 10
+    idx = cp.utils.epoch_order(n, order, block_size)
+    assert np.all(np.sort(idx) == np.arange(n))
+    # .. every block of rows is visited contiguously ..
+    blocks = idx // block_size
+    assert np.sum(np.diff(blocks) != 0) == n // block_size
+    if order == "block":
+        assert np.all(np.diff(idx)[np.diff(blocks) == 0] == 1)
+    assert cp.utils.row_block_size(sparse.csr_matrix(A), cache_size=1) == 1
+    assert cp.utils.row_block_size(sparse.csr_matrix(A)) == n_samples
+
+
+@pytest.mark.parametrize("order", ["block", "block_shuffle"])
+@pytest.mark.parametrize("name_solver, solver, tol", all_solvers_unconstrained)
+def test_block_order(name_solver, solver, tol, order):
+    alpha = 0.1
+    L = cp.utils.get_max_lipschitz(A, "logloss") + alpha / density
+    opt = solver(
+        copt.loss.LogLoss(A, b).partial_deriv,
+        A,
+        b,
+        np.zeros(n_features),
+        1 / (3 * L),
+        alpha=alpha,
+        max_iter=200,
+        tol=1e-10,
+        order=order,
+        block_size=3,
+    )
+    grad = copt.loss.LogLoss(A, b, alpha).f_grad(opt.x)[1]
+    assert np.linalg.norm(grad) < tol, name_solver
+
+
 def test_saga_l1():
     alpha = 1.0 / n_samples
     f = copt.loss.LogLoss(A, b, alpha)
@@ -258,3 +334,265 @@ def test_vrtos_fl(A_data):
         grad = f.f_grad(opt_vrtos.x)[1]
         grad_map = (opt_vrtos.x - pen.prox(opt_vrtos.x - ss * grad, ss)) / ss
         assert np.linalg.norm(grad_map) < 1e-6
+
+
+@pytest.mark.parametrize("solver", [cp.minimize_saga, cp.minimize_svrg])
+def test_warm_start_new_rows(solver):
+    """Refit after appending rows, reusing the state of the first fit."""
+    alpha = 1.0 / n_samples
+    f = copt.loss.LogLoss(A, b, alpha)
+    pen = copt.penalty.L1Norm(1e-3)
+    L = cp.utils.get_max_lipschitz(A, "logloss") + alpha / density
+    n_prev = 15
+    A_prev = sparse.csr_matrix(A)[:n_prev]
+    opt_prev = solver(
+        f.partial_deriv,
+        A_prev,
+        b[:n_prev],
+        np.zeros(n_features),
+        1 / (3 * L),
+        alpha=alpha,
+        max_iter=50,
+        tol=0,
+        prox=pen.prox_factory(n_features),
+    )
+    opt = solver(
+        f.partial_deriv,
+        A,
+        b,
+        opt_prev.x,
+        1 / (3 * L),
+        alpha=alpha,
+        max_iter=500,
+        tol=1e-8,
+        prox=pen.prox_factory(n_features),
+        warm_start=opt_prev,
+    )
+    assert opt.support.shape[0] == n_samples
+    cold = solver(
+        f.partial_deriv,
+        A,
+        b,
+        np.zeros(n_features),
+        1 / (3 * L),
+        alpha=alpha,
+        max_iter=1,
+        prox=pen.prox_factory(n_features),
+    )
+    assert np.allclose(opt.support_counts, cold.support_counts)
+    grad = f.f_grad(opt.x)[1]
+    ss = 1.0 / L
+    grad_map = (opt.x - pen.prox(opt.x - ss * grad, ss)) / ss
+    assert np.linalg.norm(grad_map) < 1e-6
+    if solver is cp.minimize_saga:
+        # .. the gradient average is the average of the memory terms ..
+        avg = A.T.dot(opt.memory_gradient) / n_samples
+        assert np.allclose(avg, opt.gradient_average)
+
+
+@pytest.mark.parametrize("solver", [cp.minimize_saga, cp.minimize_svrg])
+def test_warm_start_errors(solver):
+    """A warm_start from a problem with other columns or blocks is rejected."""
+    f = copt.loss.LogLoss(A, b)
+    step_size = 1.0 / (3 * f.max_lipschitz)
+    A_csr = sparse.csr_matrix(A)
+    opt = solver(f.partial_deriv, A_csr, b, np.zeros(n_features), step_size, max_iter=1)
+    # .. fewer columns ..
+    with pytest.raises(ValueError):
+        solver(
+            f.partial_deriv, A_csr[:, 1:], b, np.zeros(n_features - 1), step_size,
+            max_iter=1, warm_start=opt
+        )
+    # .. other block structure ..
+    groups = [np.arange(i, min(i + 2, n_features)) for i in range(0, n_features, 2)]
+    prox = copt.penalty.GroupL1(1e-3, groups).prox_factory(n_features)
+    with pytest.raises(ValueError):
+        solver(
+            f.partial_deriv, A_csr, b, opt.x, step_size, prox=prox, max_iter=1,
+            warm_start=opt
+        )
+    # .. support counts of another problem ..
+    opt.support_counts = opt.support_counts + 1
+    with pytest.raises(ValueError):
+        solver(f.partial_deriv, A_csr, b, opt.x, step_size, max_iter=1, warm_start=opt)
+
+
+@pytest.mark.parametrize("name_solver, solver, tol", all_solvers_unconstrained)
+def test_sample_weight(name_solver, solver, tol):
+    """Weighted samples, and duplicated samples collapsed into weighted ones."""
+    alpha = 0.1
+    sample_weight = np.random.uniform(0.5, 2, size=n_samples)
+    f = copt.loss.LogLoss(A, b, alpha, sample_weight=sample_weight)
+    L = copt.loss.LogLoss(A, b, sample_weight=sample_weight).max_lipschitz
+    opt = solver(
+        f.partial_deriv,
+        A,
+        b,
+        np.zeros(n_features),
+        1 / (3 * (L + alpha / density)),
+        alpha=alpha,
+        max_iter=200,
+        tol=1e-10,
+        sample_weight=sample_weight,
+    )
+    assert np.linalg.norm(f.f_grad(opt.x)[1]) < tol, name_solver
+
+    copies = np.random.randint(n_samples, size=3 * n_samples)
+    A_dup, b_dup = sparse.csr_matrix(A)[copies], b[copies]
+    A_unique, b_unique, counts, _ = cp.utils.collapse_duplicates(A_dup, b_dup)
+    f_unique = copt.loss.LogLoss(A_unique, b_unique, sample_weight=counts)
+    L = f_unique.max_lipschitz + alpha / density
+    opt = solver(
+        f.partial_deriv,
+        A_unique,
+        b_unique,
+        np.zeros(n_features),
+        1 / (3 * L),
+        alpha=alpha,
+        max_iter=200,
+        tol=1e-10,
+        sample_weight=counts,
+    )
+    grad = copt.loss.LogLoss(A_dup, b_dup, alpha).f_grad(opt.x)[1]
+    assert np.linalg.norm(grad) < tol, name_solver
+
+
+@pytest.mark.parametrize("name_solver, solver, tol", all_solvers_unconstrained)
+def test_scale_offset(name_solver, solver, tol):
+    """Standardized columns, against the explicitly standardized matrix."""
+    alpha = 0.1
+    scale = np.random.uniform(0.5, 2, size=n_features)
+    offset = np.asarray(A.mean(0)).ravel()
+    A_std = sparse.csr_matrix((A.toarray() - offset) * scale)
+    f = copt.loss.LogLoss(A, b, scale=scale, offset=offset)
+    step_size = 1 / (3 * (f.max_lipschitz + alpha))
+    kwargs = dict(alpha=alpha, max_iter=500, tol=1e-12, fit_intercept=True)
+    opt = solver(
+        f.partial_deriv,
+        A,
+        b,
+        np.zeros(n_features),
+        step_size,
+        scale=scale,
+        offset=offset,
+        **kwargs
+    )
+    opt_std = solver(
+        f.partial_deriv, A_std, b, np.zeros(n_features), step_size, **kwargs
+    )
+    np.testing.assert_allclose(opt.x, opt_std.x, atol=1e-6)
+    np.testing.assert_allclose(opt.intercept, opt_std.intercept, atol=1e-6)
+
+    with pytest.raises(ValueError):
+        solver(f.partial_deriv, A, b, np.zeros(n_features), step_size, offset=offset)
+
+
+@pytest.mark.parametrize("prefetch", [False, True])
+def test_prox_sgd_stream(prefetch):
+    """Averaged proximal SGD over a stream of chunks."""
+    alpha = 1.0 / n_samples
+    f = copt.loss.LogLoss(A, b, alpha)
+    pen = copt.penalty.L1Norm(1e-3)
+    opt = cp.minimize_proximal_gradient(
+        f.f_grad, np.zeros(n_features), prox=pen.prox, jac=True, tol=1e-10
+    )
+    A_csr = sparse.csr_matrix(A)
+
+    def chunks(n_epochs, chunk_size=5):
+        for _ in range(n_epochs):
+            for start in range(0, n_samples, chunk_size):
+                yield A_csr[start:start + chunk_size], b[start:start + chunk_size]
+
+    L = f.max_lipschitz
+    opt_sgd = cp.minimize_prox_sgd(
+        f.partial_deriv,
+        chunks(500),
+        np.zeros(n_features),
+        lambda t: 1.0 / (L * np.sqrt(1 + t / n_samples)),
+        prox=pen.prox_factory(n_features),
+        alpha=alpha,
+        averaged=True,
+        prefetch=prefetch,
+    )
+    assert opt_sgd.success
+    assert opt_sgd.n_samples_seen == 500 * n_samples
+    fmin = f(opt.x) + pen(opt.x)
+    assert f(opt_sgd.x) + pen(opt_sgd.x) - fmin < 1e-3
+
+    opt_sgd = cp.minimize_prox_sgd(
+        f.partial_deriv,
+        chunks(500),
+        np.zeros(n_features),
+        1.0 / L,
+        alpha=alpha,
+        max_iter=3,
+        prefetch=prefetch,
+    )
+    assert opt_sgd.nit == 3
+    assert not opt_sgd.success
+
+
+def test_prox_sgd_prefetch_stops():
+    """The prefetch thread stops reading chunks when the solver raises."""
+    f = copt.loss.LogLoss(A, b)
+    A_csr = sparse.csr_matrix(A)
+    n_read = [0]
+
+    def chunks():
+        while True:
+            n_read[0] += 1
+            yield A_csr[:5], b[:5]
+
+    def callback(kw):
+        if kw["it"] == 2:
+            raise RuntimeError
+
+    n_threads = threading.active_count()
+    with pytest.raises(RuntimeError) as excinfo:
+        cp.minimize_prox_sgd(
+            f.partial_deriv, chunks(), np.zeros(n_features), 0.1,
+            callback=callback, prefetch=True
+        )
+    # .. the thread was joined, although the traceback still references ..
+    # .. the stream, after reading at most the chunk in the queue and the ..
+    # .. one being decoded ..
+    assert excinfo.traceback
+    assert threading.active_count() == n_threads
+    assert n_read[0] <= 4
+
+
+@pytest.mark.parametrize("loss", [copt.loss.LogLoss, copt.loss.SquareLoss])
+@pytest.mark.parametrize("penalty", [None, copt.penalty.L1Norm, copt.penalty.GroupL1])
+def test_sdca(loss, penalty):
+    alpha = 1.0 / n_samples
+    f = loss(A, b, alpha)
+    if penalty is None:
+        pen = None
+    elif penalty is copt.penalty.GroupL1:
+        pen = penalty(1e-2, [np.arange(5), np.arange(5, 10)])
+    else:
+        pen = penalty(1e-2)
+    opt = cp.minimize_sdca(
+        f,
+        A,
+        b,
+        alpha,
+        prox=None if pen is None else pen.prox_factory(n_features),
+        tol=1e-12,
+    )
+    assert opt.success
+    assert len(opt.trace_certificate) == opt.nit + 1
+    assert opt.certificate < 1e-12
+    grad = f.f_grad(opt.x)[1]
+    if pen is None:
+        assert np.linalg.norm(grad) < 1e-5
+    else:
+        ss = 1.0 / f.lipschitz
+        grad_map = (opt.x - pen.prox(opt.x - ss * grad, ss)) / ss
+        assert np.linalg.norm(grad_map) < 1e-5
+
+
+def test_sdca_alpha():
+    f = copt.loss.LogLoss(A, b)
+    with pytest.raises(ValueError):
+        cp.minimize_sdca(f, A, b, 0.0)
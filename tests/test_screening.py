@@ -0,0 +1,122 @@
+"""Tests for the gap-safe screening rules."""
+import numpy as np
+import pytest
+from numpy import testing
+from scipy import sparse
+
+import copt as cp
+import copt.loss
+import copt.penalty
+from copt import screening
+
+np.random.seed(0)
+n_samples, n_features = 40, 60
+A = np.random.randn(n_samples, n_features)
+w = np.zeros(n_features)
+w[:5] = np.random.randn(5)
+b = A.dot(w) + 0.1 * np.random.randn(n_samples)
+groups = [np.arange(i, i + 3) for i in range(0, n_features, 3)]
+
+
+def _problems():
+    b_log = (b > 0).astype(float)
+    sw = np.random.rand(n_samples) + 0.5
+    scale = np.random.rand(n_features) + 0.5
+    yield copt.loss.SquareLoss(A, b), copt.penalty.L1Norm(0.2)
+    yield copt.loss.SquareLoss(A, b), copt.penalty.GroupL1(0.3, groups)
+    yield (
+        copt.loss.LogLoss(sparse.csr_matrix(A), b_log, sample_weight=sw, scale=scale),
+        copt.penalty.L1Norm(0.05),
+    )
+    yield (
+        copt.loss.LogLoss(A, b_log, offset=A.mean(0)),
+        copt.penalty.GroupL1(0.1, groups),
+    )
+
+
+def _solve(f, h):
+    return cp.minimize_proximal_gradient(
+        f.f_grad, np.zeros(n_features), prox=h.prox, jac=True, tol=1e-12, max_iter=10000
+    ).x
+
+
+@pytest.mark.parametrize("f, h", list(_problems()))
+def test_duality_gap(f, h):
+    x_opt = _solve(f, h)
+    # .. the gap bounds the suboptimality and vanishes at the solution ..
+    x = np.random.randn(n_features)
+    gap = screening.duality_gap(f, h, x)[0]
+    assert gap >= f(x) + h(x) - f(x_opt) - h(x_opt)
+    assert screening.duality_gap(f, h, x_opt)[0] < 1e-6
+
+    # .. the screened features are zero in the solution ..
+    x = x_opt + 1e-3 * np.random.randn(n_features)
+    _, screened = screening.gap_safe_screen(f, h, x)
+    assert screened.any()
+    assert np.all(x_opt[screened] == 0)
+
+
+@pytest.mark.parametrize("f, h", list(_problems()))
+@pytest.mark.parametrize(
+    "solver", [cp.minimize_proximal_gradient, cp.minimize_three_split]
+)
+def test_minimize_screened(f, h, solver):
+    x_opt = _solve(f, h)
+    opt = screening.minimize_screened(f, h, solver=solver, tol=1e-10, max_iter=5000)
+    assert opt.success
+    assert opt.certificate < 1e-10
+    assert opt.active.sum() < n_features
+    assert np.all(np.diff(opt.trace_active) <= 0)
+    testing.assert_allclose(opt.x, x_opt, atol=1e-4)
+
+
+def test_minimize_screened_saga():
+    f = copt.loss.LogLoss(sparse.csr_matrix(A), (b > 0).astype(float))
+    h = copt.penalty.L1Norm(0.05)
+    x_opt = _solve(f, h)
+    opt = screening.minimize_screened(
+        f, h, solver=cp.minimize_saga, tol=1e-8, max_iter=2000, screen_every=50
+    )
+    assert opt.success
+    assert opt.active.sum() < n_features
+    testing.assert_allclose(opt.x, x_opt, atol=1e-3)
+
+
+def test_screening_errors():
+    f = copt.loss.SquareLoss(A, b)
+    with pytest.raises(ValueError):
+        screening.minimize_screened(f, copt.penalty.GroupL1(0.1, groups[1:]))
+    with pytest.raises(ValueError):
+        screening.minimize_screened(copt.loss.HuberLoss(A, b), copt.penalty.L1Norm(1))
+    with pytest.raises(ValueError):
+        screening.minimize_screened(
+            f, copt.penalty.L1Norm(1), solver=cp.minimize_primal_dual
+        )
+    # .. SAGA absorbs an offset in the intercept, which is not fitted here ..
+    with pytest.raises(ValueError):
+        screening.minimize_screened(
+            copt.loss.LogLoss(A, (b > 0).astype(float), offset=A.mean(0)),
+            copt.penalty.L1Norm(0.01),
+            solver=cp.minimize_saga,
+        )
+
+
+@pytest.mark.parametrize("f, h", list(_problems()))
+def test_minimize_working_set(f, h):
+    x_opt = _solve(f, h)
+    opt = screening.minimize_working_set(f, h, tol=1e-10, working_set_size=2)
+    assert opt.success
+    assert opt.certificate < 1e-10
+    assert opt.trace_working_set[0] < n_features
+    testing.assert_allclose(opt.x, x_opt, atol=1e-4)
+
+
+def test_minimize_working_set_saga():
+    f = copt.loss.LogLoss(sparse.csr_matrix(A), (b > 0).astype(float))
+    h = copt.penalty.L1Norm(0.05)
+    x_opt = _solve(f, h)
+    opt = screening.minimize_working_set(
+        f, h, solver=cp.minimize_saga, tol=1e-8, screen_every=50
+    )
+    assert opt.success
+    testing.assert_allclose(opt.x, x_opt, atol=1e-3)
@@ -122,3 +122,36 @@ def test_sfw_sparse(variant, A):
         variant=variant
         )
 
+
+
+@pytest.mark.parametrize("variant", VARIANTS)
+def test_sfw_intercept(variant):
+    """Check that the intercept fitted by SFW improves the objective."""
+    # .. MHK is noisy, make the test independent of the order of the tests ..
+    np.random.seed(0)
+    f = copt.loss.LogLoss(A, b)
+    f.intercept = True
+    l1ball = copt.constraint.L1Ball(1.0)
+    L = f.lipschitz
+    opt = cp.randomized.minimize_sfw(
+        f.partial_deriv,
+        A,
+        b,
+        np.zeros(n_features),
+        l1ball.lmo,
+        lipschitz=L,
+        max_iter=100,
+        tol=0,
+        variant=variant,
+        fit_intercept=True,
+    )
+    x_c = np.concatenate((opt.x, [opt.intercept]))
+    x_0 = np.concatenate((opt.x, [0.0]))
+    assert f(x_c) < f(x_0)
+    # .. the partial derivative wrt the intercept is driven towards zero ..
+    assert abs(f.f_grad(x_c)[1][-1]) < 0.5 * abs(f.f_grad(x_0)[1][-1])
+
+    with pytest.raises(ValueError):
+        cp.randomized.minimize_sfw(
+            f.partial_deriv, A, b, np.zeros(n_features), l1ball.lmo,
+            fit_intercept=True)